@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+# Antes de cargar settings: bajo ASGI las conexiones no son persistentes por defecto (ver DB_CONN_MAX_AGE).
+os.environ.setdefault('SERVIDOR_ASGI', 'True')
 
 application = get_asgi_application()
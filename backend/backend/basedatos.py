@@ -0,0 +1,81 @@
+"""Enrutamiento a réplicas de lectura.
+
+Las lecturas van a una réplica salvo que la petición (o una escritura reciente del mismo
+cliente) haya fijado el primario; las escrituras y migraciones van siempre al primario.
+"""
+import contextvars
+import random
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+COOKIE_PRIMARIO = 'leer_primario'
+METODOS_SEGUROS = ('GET', 'HEAD', 'OPTIONS')
+
+usar_primario = contextvars.ContextVar('usar_primario', default=False)
+
+
+@contextmanager
+def primario():
+    token = usar_primario.set(True)
+    try:
+        yield
+    finally:
+        usar_primario.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replicas = settings.DATABASE_REPLICAS
+        if not replicas or usar_primario.get():
+            return 'default'
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Las réplicas tienen los mismos datos que el primario.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
+
+
+class PrimarioMiddleware:
+    """Las peticiones que escriben leen del primario, y el cliente sigue leyendo de él unos
+    segundos después para ver sus propios cambios pese al retraso de replicación."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.usa_primario(request):
+            return self.get_response(request)
+        with primario():
+            response = self.get_response(request)
+        return self.fijar(request, response)
+
+    async def __acall__(self, request):
+        # Sin saltos a un hilo: las vistas asíncronas heredan el contextvar.
+        if not self.usa_primario(request):
+            return await self.get_response(request)
+        with primario():
+            response = await self.get_response(request)
+        return self.fijar(request, response)
+
+    def usa_primario(self, request):
+        return request.method not in METODOS_SEGUROS or COOKIE_PRIMARIO in request.COOKIES
+
+    def fijar(self, request, response):
+        if request.method not in METODOS_SEGUROS and settings.DATABASE_REPLICA_FIJACION:
+            response.set_cookie(COOKIE_PRIMARIO, '1', max_age=settings.DATABASE_REPLICA_FIJACION, httponly=True, samesite='Lax')
+        return response
@@ -0,0 +1,41 @@
+from django.conf import settings
+from django.core import checks
+
+# Backends que guardan los datos en la memoria de cada proceso.
+CACHES_LOCALES = {
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+}
+
+
+def requerir_cache_compartida(uso, alias_de, codigo, pista='Defina CACHE_URL (o el alias específico) con una cache compartida, p. ej. redis://.'):
+    """Registra un check que avisa si `alias_de()` apunta a una cache local al proceso (None lo es siempre).
+
+    Con varios workers cada uno vería su propia copia, así que es un aviso en desarrollo y un
+    error con `check --deploy`. `codigo` es el número del check, p. ej. 'usuarios.001'.
+    """
+    app, numero = codigo.split('.')
+
+    def revisar(nivel, letra):
+        alias = alias_de()
+        if alias is None:
+            descripcion = 'un LRU en memoria'
+        elif alias not in settings.CACHES:
+            return [checks.Error(f'{uso} usa el alias de cache "{alias}", que no está en CACHES.', id=f'{app}.E{numero}')]
+        elif settings.CACHES[alias]['BACKEND'] not in CACHES_LOCALES:
+            return []
+        else:
+            descripcion = f'la cache "{alias}"'
+        return [nivel(
+            f'{uso} usa {descripcion}, que es local a cada proceso: con más de un worker no se comparte.',
+            hint=pista,
+            id=f'{app}.{letra}{numero}',
+        )]
+
+    @checks.register(checks.Tags.caches)
+    def aviso(app_configs, **kwargs):
+        return revisar(checks.Warning, 'W')
+
+    @checks.register(checks.Tags.caches, deploy=True)
+    def error(app_configs, **kwargs):
+        return revisar(checks.Error, 'E')
@@ -0,0 +1,258 @@
+"""Instrumentación opcional por petición: Server-Timing, métricas Prometheus y perfiles muestreados.
+
+Se activa con INSTRUMENTACION=True; las métricas son por proceso.
+"""
+import bisect
+import contextvars
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, HttpResponseForbidden, HttpResponseNotFound
+
+BUCKETS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BUCKETS_CONSULTAS = (1, 2, 3, 5, 10, 20, 50, 100)
+BUCKETS_BYTES = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+medicion_actual = contextvars.ContextVar('medicion_actual', default=None)
+bd_actual = contextvars.ContextVar('bd_actual', default=None)
+
+
+class Histograma:
+    def __init__(self, nombre, ayuda, buckets, etiquetas):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.buckets = buckets
+        self.etiquetas = etiquetas
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observar(self, valor, *etiquetas):
+        with self.lock:
+            serie = self.series.get(etiquetas)
+            if serie is None:
+                serie = self.series[etiquetas] = {'cuentas': [0] * len(self.buckets), 'suma': 0.0, 'total': 0}
+            indice = bisect.bisect_left(self.buckets, valor)
+            if indice < len(self.buckets):
+                serie['cuentas'][indice] += 1
+            serie['suma'] += valor
+            serie['total'] += 1
+
+    def exponer(self):
+        lineas = [f'# HELP {self.nombre} {self.ayuda}', f'# TYPE {self.nombre} histogram']
+        with self.lock:
+            series = {etiquetas: {**serie, 'cuentas': list(serie['cuentas'])} for etiquetas, serie in self.series.items()}
+        for etiquetas, serie in sorted(series.items()):
+            base = ','.join(f'{nombre}="{valor}"' for nombre, valor in zip(self.etiquetas, etiquetas))
+            separador = ',' if base else ''
+            for limite, acumulado in zip(self.buckets, itertools.accumulate(serie['cuentas'])):
+                lineas.append(f'{self.nombre}_bucket{{{base}{separador}le="{limite}"}} {acumulado}')
+            lineas.append(f'{self.nombre}_bucket{{{base}{separador}le="+Inf"}} {serie["total"]}')
+            lineas.append(f'{self.nombre}_sum{{{base}}} {serie["suma"]}')
+            lineas.append(f'{self.nombre}_count{{{base}}} {serie["total"]}')
+        return lineas
+
+    def reiniciar(self):
+        with self.lock:
+            self.series = {}
+
+
+duracion = Histograma('peticion_duracion_segundos', 'Tiempo total de la vista.', BUCKETS_SEGUNDOS, ('vista', 'metodo', 'estado'))
+consultas = Histograma('peticion_consultas_bd', 'Consultas SQL por petición.', BUCKETS_CONSULTAS, ('vista', 'metodo'))
+tiempo_bd = Histograma('peticion_bd_segundos', 'Tiempo en la base de datos por petición.', BUCKETS_SEGUNDOS, ('vista', 'metodo'))
+bytes_respuesta = Histograma('peticion_respuesta_bytes', 'Tamaño del cuerpo de la respuesta.', BUCKETS_BYTES, ('vista', 'metodo'))
+componentes = Histograma('componente_duracion_segundos', 'Tiempo en serialización y servicios externos.', BUCKETS_SEGUNDOS, ('componente',))
+HISTOGRAMAS = [duracion, consultas, tiempo_bd, bytes_respuesta, componentes]
+
+
+@contextmanager
+def medir(componente):
+    """Suma el tiempo del bloque al componente de la petición en curso y a su histograma global."""
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        transcurrido = time.perf_counter() - inicio
+        componentes.observar(transcurrido, componente)
+        medicion = medicion_actual.get()
+        if medicion is not None:
+            medicion[componente] += transcurrido
+
+
+class Perfilador:
+    """Perfila una muestra de peticiones y conserva en disco sólo las más lentas."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.lentas = []
+        self.secuencia = itertools.count()
+
+    @property
+    def config(self):
+        return settings.INSTRUMENTACION
+
+    def iniciar(self):
+        if random.random() >= self.config['MUESTREO']:
+            return None
+        if self.config['PERFILADOR'] == 'pyinstrument':
+            try:
+                from pyinstrument import Profiler
+            except ImportError:
+                return None
+            perfil = Profiler()
+            perfil.start()
+            return perfil
+        import cProfile
+        perfil = cProfile.Profile()
+        try:
+            perfil.enable()
+        except ValueError:
+            # Otro perfilador ya está activo en este hilo.
+            return None
+        return perfil
+
+    def terminar(self, perfil, vista, segundos):
+        if hasattr(perfil, 'disable'):
+            perfil.disable()
+        else:
+            perfil.stop()
+        with self.lock:
+            if len(self.lentas) >= self.config['PERFILES_MAXIMOS'] and segundos <= self.lentas[0][0]:
+                return
+            directorio = self.config['DIRECTORIO']
+            os.makedirs(directorio, exist_ok=True)
+            extension = 'html' if self.config['PERFILADOR'] == 'pyinstrument' else 'prof'
+            nombre = f'{segundos * 1000:08.1f}ms-{vista.replace("/", "_")}-{next(self.secuencia)}.{extension}'
+            ruta = os.path.join(directorio, nombre)
+            heapq.heappush(self.lentas, (segundos, ruta))
+            if len(self.lentas) > self.config['PERFILES_MAXIMOS']:
+                _, descartada = heapq.heappop(self.lentas)
+                if os.path.exists(descartada):
+                    os.remove(descartada)
+        if extension == 'prof':
+            perfil.dump_stats(ruta)
+        else:
+            with open(ruta, 'w') as archivo:
+                archivo.write(perfil.output_html())
+
+
+perfilador = Perfilador()
+
+
+class Medicion:
+    """Componentes y consultas de una petición, visibles desde sync_to_async por las contextvars."""
+
+    def __init__(self):
+        self.componentes = defaultdict(float)
+        self.bd = {'consultas': 0, 'segundos': 0.0}
+        self.tokens = (medicion_actual.set(self.componentes), bd_actual.set(self.bd))
+
+    def cerrar(self):
+        medicion_actual.reset(self.tokens[0])
+        bd_actual.reset(self.tokens[1])
+
+
+def contar_consulta(execute, sql, params, many, context):
+    bd = bd_actual.get()
+    if bd is None:
+        return execute(sql, params, many, context)
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        bd['consultas'] += 1
+        bd['segundos'] += time.perf_counter() - inicio
+
+
+def instalar_contador(connection, **kwargs):
+    # Se instala en la conexión y no alrededor de la vista: bajo ASGI las consultas corren en
+    # los hilos de sync_to_async, con sus propias conexiones.
+    if contar_consulta not in connection.execute_wrappers:
+        connection.execute_wrappers.append(contar_consulta)
+
+
+class InstrumentacionMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        connection_created.connect(instalar_contador, dispatch_uid='instrumentacion')
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        for conexion in connections.all(initialized_only=True):
+            instalar_contador(conexion)
+        medicion, perfil, inicio = Medicion(), perfilador.iniciar(), time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            medicion.cerrar()
+        return self.registrar(request, response, medicion, perfil, time.perf_counter() - inicio)
+
+    async def __acall__(self, request):
+        medicion, perfil, inicio = Medicion(), perfilador.iniciar(), time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            medicion.cerrar()
+        return self.registrar(request, response, medicion, perfil, time.perf_counter() - inicio)
+
+    def registrar(self, request, response, medicion, perfil, total):
+        vista = _vista(request)
+        if perfil is not None:
+            perfilador.terminar(perfil, vista, total)
+        bd = medicion.bd
+        duracion.observar(total, vista, request.method, str(response.status_code))
+        consultas.observar(bd['consultas'], vista, request.method)
+        tiempo_bd.observar(bd['segundos'], vista, request.method)
+        if not response.streaming:
+            bytes_respuesta.observar(len(response.content), vista, request.method)
+
+        entradas = [f'app;dur={total * 1000:.1f}', f'db;dur={bd["segundos"] * 1000:.1f};desc="{bd["consultas"]} consultas"']
+        entradas += [f'{nombre};dur={segundos * 1000:.1f}' for nombre, segundos in medicion.componentes.items()]
+        response['Server-Timing'] = ', '.join(entradas)
+        return response
+
+    def process_template_response(self, request, response):
+        # Se llama justo antes de renderizar: el callback posterior mide la codificación JSON.
+        inicio = time.perf_counter()
+        medicion = medicion_actual.get()
+
+        def registrar(respuesta):
+            transcurrido = time.perf_counter() - inicio
+            componentes.observar(transcurrido, 'render')
+            if medicion is not None:
+                medicion['render'] += transcurrido
+
+        response.add_post_render_callback(registrar)
+        return response
+
+
+def _vista(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'sin_ruta'
+    return match.view_name or match.route
+
+
+def metricas(request):
+    config = settings.INSTRUMENTACION
+    if not config['ACTIVA']:
+        return HttpResponseNotFound()
+    if config['TOKEN'] and request.headers.get('Authorization') != f'Bearer {config["TOKEN"]}':
+        return HttpResponseForbidden()
+    lineas = list(itertools.chain.from_iterable(histograma.exponer() for histograma in HISTOGRAMAS))
+    return HttpResponse('\n'.join(lineas) + '\n', content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -13,6 +13,7 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'rest_framework',
+    'django_filters',
     'inventario',
     'usuarios',
     'drf_yasg',
@@ -34,12 +35,28 @@ MIDDLEWARE = [
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.SessionAuthentication',
-        'rest_framework.authentication.BasicAuthentication',
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'usuarios.authentication.BasicAuthenticationLimitada',
+        'usuarios.authentication.JWTRevocableAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'inventario.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_FILTER_BACKENDS': [
+        'django_filters.rest_framework.DjangoFilterBackend',
+        'rest_framework.filters.SearchFilter',
+        'rest_framework.filters.OrderingFilter',
+    ],
+}
+
+SIMPLE_JWT = {
+    'TOKEN_OBTAIN_SERIALIZER': 'usuarios.serializers.TokenRolSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'usuarios.serializers.TokenRefreshRevocableSerializer',
+    'TOKEN_USER_CLASS': 'usuarios.authentication.UsuarioToken',
+    'ROTATE_REFRESH_TOKENS': True,
 }
 
 ROOT_URLCONF = 'backend.urls'
@@ -74,6 +91,125 @@ ALLOWED_HOSTS = env.list('ALLOWED_HOSTS')
 DATABASES = {
     'default': env.db(),  
 }
+# Conexiones persistentes con chequeo de salud antes de reutilizarlas. Bajo ASGI (backend/asgi.py
+# define SERVIDOR_ASGI) cada sync_to_async puede correr en otro hilo y dejar su conexión abierta
+# sin volver a usarla, así que el valor por defecto es 0; use DB_POOL para reutilizarlas.
+DATABASES['default']['CONN_MAX_AGE'] = env.int('DB_CONN_MAX_AGE', default=0 if env.bool('SERVIDOR_ASGI', default=False) else 60)
+DATABASES['default']['CONN_HEALTH_CHECKS'] = env.bool('DB_CONN_HEALTH_CHECKS', default=True)
+if env.bool('DB_POOL', default=False):
+    # Pool de psycopg 3 (requiere psycopg[pool]); reemplaza a las conexiones persistentes.
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    DATABASES['default'].setdefault('OPTIONS', {})['pool'] = {
+        'min_size': env.int('DB_POOL_MIN', default=2),
+        'max_size': env.int('DB_POOL_MAX', default=10),
+        'timeout': env.float('DB_POOL_TIMEOUT', default=10.0),
+    }
+
+DATABASE_REPLICAS = []
+for numero, url in enumerate(env.list('DATABASE_REPLICA_URLS', default=[])):
+    alias = f'replica_{numero}'
+    DATABASES[alias] = {
+        **env.db_url_config(url),
+        'CONN_MAX_AGE': DATABASES['default']['CONN_MAX_AGE'],
+        'CONN_HEALTH_CHECKS': DATABASES['default']['CONN_HEALTH_CHECKS'],
+        'TEST': {'MIRROR': 'default'},
+    }
+    if 'OPTIONS' in DATABASES['default']:
+        DATABASES[alias]['OPTIONS'] = dict(DATABASES['default']['OPTIONS'])
+    DATABASE_REPLICAS.append(alias)
+DATABASE_REPLICA_FIJACION = env.int('DATABASE_REPLICA_FIJACION', default=5)
+if DATABASE_REPLICAS:
+    DATABASE_ROUTERS = ['backend.basedatos.ReplicaRouter']
+    MIDDLEWARE.insert(MIDDLEWARE.index('django.contrib.sessions.middleware.SessionMiddleware'), 'backend.basedatos.PrimarioMiddleware')
+
+PRODUCTOS_PAGE_SIZE = env.int('PRODUCTOS_PAGE_SIZE', default=50)
+PRODUCTOS_MAX_PAGE_SIZE = env.int('PRODUCTOS_MAX_PAGE_SIZE', default=200)
+PRODUCTOS_LOTE_IMPORTACION = env.int('PRODUCTOS_LOTE_IMPORTACION', default=1000)
+PRODUCTOS_LOTE_EXPORTACION = env.int('PRODUCTOS_LOTE_EXPORTACION', default=2000)
+PRODUCTOS_RANGOS_PRECIO = env.list('PRODUCTOS_RANGOS_PRECIO', cast=int, default=[1000, 2500, 5000, 10000])
+USUARIOS_LOTE_IMPORTACION = env.int('USUARIOS_LOTE_IMPORTACION', default=1000)
+USUARIOS_PROCESOS_HASH = env.int('USUARIOS_PROCESOS_HASH', default=0) or None
+# Contraseñas en texto plano que /auth/usuarios/importar/ hashea por petición; el resto, con el comando.
+USUARIOS_MAX_CLAVES_HTTP = env.int('USUARIOS_MAX_CLAVES_HTTP', default=100)
+RESERVAS_DURACION_MINUTOS = env.int('RESERVAS_DURACION_MINUTOS', default=15)
+RESERVAS_INTERVALO_BARRIDO = env.int('RESERVAS_INTERVALO_BARRIDO', default=30)
+
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://'),
+}
+if env('CATALOGO_CACHE_URL', default=None):
+    CACHES['catalogo'] = env.cache('CATALOGO_CACHE_URL')
+
+LIMITES_CREDENCIALES = {
+    'ACTIVO': env.bool('LIMITES_ACTIVO', default=True),
+    'ALIAS': env('LIMITES_CACHE_ALIAS', default='default'),
+    'VENTANA': env.int('LIMITES_VENTANA', default=300),
+    'FALLOS_IP': env.int('LIMITES_FALLOS_IP', default=30),
+    'FALLOS_EMAIL': env.int('LIMITES_FALLOS_EMAIL', default=10),
+    'REGISTROS_IP': env.int('LIMITES_REGISTROS_IP', default=10),
+    'RAFAGA': env.int('LIMITES_RAFAGA', default=10),
+    'RITMO': env.float('LIMITES_RITMO', default=0.2),
+    'HUELLAS_TTL': env.int('LIMITES_HUELLAS_TTL', default=900),
+    'MAX_IPS_LOCALES': env.int('LIMITES_MAX_IPS_LOCALES', default=10000),
+}
+
+TOKENS_REVOCADOS = {
+    'ALIAS': env('TOKENS_CACHE_ALIAS', default='default'),
+    'BLOOM_BITS': env.int('TOKENS_BLOOM_BITS', default=2 ** 20),
+    'BLOOM_HASHES': env.int('TOKENS_BLOOM_HASHES', default=7),
+    'REFRESCO': env.float('TOKENS_REFRESCO', default=1.0),
+    'PODA': env.int('TOKENS_PODA', default=300),
+}
+
+CARRITOS = {
+    'ALIAS': env('CARRITOS_CACHE_ALIAS', default='default'),
+    'TTL': env.int('CARRITOS_TTL', default=60 * 60 * 24 * 7),
+    'INTERVALO_PERSISTENCIA': env.int('CARRITOS_INTERVALO_PERSISTENCIA', default=30),
+    'SINCRONO': env.bool('CARRITOS_SINCRONO', default=False),
+    'MAX_ITEMS': env.int('CARRITOS_MAX_ITEMS', default=100),
+    # Candado por carrito en la cache: cuánto se espera a otra petición y cuánto dura si su dueño muere.
+    'ESPERA_CANDADO': env.float('CARRITOS_ESPERA_CANDADO', default=2.0),
+    'DURACION_CANDADO': env.int('CARRITOS_DURACION_CANDADO', default=10),
+}
+
+CAMBIOS = {
+    'LIMITE': env.int('CAMBIOS_LIMITE', default=1000),
+    'ESPERA_HUECOS': env.float('CAMBIOS_ESPERA_HUECOS', default=5.0),
+    'COMPACTAR_DESPUES': env.int('CAMBIOS_COMPACTAR_DESPUES', default=60 * 60),
+    'RETENCION_BORRADOS': env.int('CAMBIOS_RETENCION_BORRADOS', default=60 * 60 * 24 * 7),
+    'SSE_INTERVALO': env.float('CAMBIOS_SSE_INTERVALO', default=2.0),
+    'SSE_LATIDO': env.int('CAMBIOS_SSE_LATIDO', default=15),
+    'SSE_DURACION': env.int('CAMBIOS_SSE_DURACION', default=300),
+}
+
+INSTANTANEAS = {
+    'ACTIVAS': env.bool('INSTANTANEAS_ACTIVAS', default=False),
+    'SINCRONO': env.bool('INSTANTANEAS_SINCRONO', default=False),
+    'DIRECTORIO': env('INSTANTANEAS_DIRECTORIO', default=os.path.join(BASE_DIR, 'instantaneas')),
+    'DEMORA': env.float('INSTANTANEAS_DEMORA', default=1.0),
+    # Reconstrucciones seguidas si el catálogo cambia mientras se construye; después se reagenda.
+    'INTENTOS': env.int('INSTANTANEAS_INTENTOS', default=3),
+    'NIVEL_GZIP': env.int('INSTANTANEAS_NIVEL_GZIP', default=9),
+    'NIVEL_BROTLI': env.int('INSTANTANEAS_NIVEL_BROTLI', default=11),
+}
+
+ENVIOS = {
+    # Cada cuántos segundos se compara la versión de zonas y tarifas para ver importaciones de otros procesos.
+    'REVISAR_CADA': env.float('ENVIOS_REVISAR_CADA', default=30.0),
+    # Sólo si las cantidades del carrito son kilos su suma es un peso: entonces el carrito cotiza envíos con ?envio=1.
+    'CARRITO_CANTIDADES_EN_KILOS': env.bool('ENVIOS_CARRITO_CANTIDADES_EN_KILOS', default=False),
+}
+
+REGISTRO_CATEGORIAS = {
+    # Cada cuántos segundos se compara la versión de la tabla para ver escrituras de otros procesos.
+    'REVISAR_CADA': env.float('CATEGORIAS_REVISAR_CADA', default=5.0),
+}
+
+CATALOGO_CACHE = {
+    'ALIAS': 'catalogo' if 'catalogo' in CACHES else None,
+    'MAX_ENTRADAS': env.int('CATALOGO_CACHE_MAX_ENTRADAS', default=1024),
+    'TTL': env.int('CATALOGO_CACHE_TTL', default=300),
+}
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
@@ -86,6 +222,27 @@ cloudinary.config(
 )
 DEFAULT_FILE_STORAGE = 'cloudinary_storage.storage.MediaCloudinaryStorage'
 
+INVENTARIO_IMAGENES = {
+    'UPLOADER': env('IMAGENES_UPLOADER', default='inventario.imagenes.CloudinaryUploader'),
+    'HILOS': env.int('IMAGENES_HILOS', default=4),
+    'REINTENTOS': env.int('IMAGENES_REINTENTOS', default=4),
+    'ESPERA': env.float('IMAGENES_ESPERA', default=1.0),
+    'SINCRONO': env.bool('IMAGENES_SINCRONO', default=False),
+    'DIRECTORIO': os.path.join(MEDIA_ROOT, 'pendientes'),
+    'VARIANTES': {'miniatura': 160, 'tarjeta': 480, 'detalle': 1200},
+}
+
+INSTRUMENTACION = {
+    'ACTIVA': env.bool('INSTRUMENTACION', default=False),
+    'MUESTREO': env.float('INSTRUMENTACION_MUESTREO', default=0.0),
+    'PERFILADOR': env('INSTRUMENTACION_PERFILADOR', default='cprofile'),
+    'PERFILES_MAXIMOS': env.int('INSTRUMENTACION_PERFILES_MAXIMOS', default=20),
+    'DIRECTORIO': env('INSTRUMENTACION_DIRECTORIO', default=os.path.join(BASE_DIR, 'perfiles')),
+    'TOKEN': env('METRICAS_TOKEN', default=None),
+}
+if INSTRUMENTACION['ACTIVA']:
+    MIDDLEWARE.insert(0, 'backend.instrumentacion.InstrumentacionMiddleware')
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
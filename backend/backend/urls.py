@@ -4,6 +4,7 @@ from drf_yasg import openapi
 from drf_yasg.views import get_schema_view
 from django.conf import settings
 from django.conf.urls.static import static
+from .instrumentacion import metricas
 
 schema_view = get_schema_view(
    openapi.Info(
@@ -20,6 +21,7 @@ urlpatterns = [
     path('admin/', admin.site.urls),  
     path('api/',include('inventario.urls')), 
     path('auth/', include('usuarios.urls')),
+    path('metrics', metricas, name='metricas'),
     path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='swagger-schema'), 
 ]
 
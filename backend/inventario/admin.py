@@ -1,6 +1,8 @@
 from django.contrib import admin
-from .models import Producto, Categoria
+from .models import Producto, Categoria, Reserva, Carrito
 # Register your models here.
 
 admin.site.register(Producto)
-admin.site.register(Categoria)
\ No newline at end of file
+admin.site.register(Categoria)
+admin.site.register(Reserva)
+admin.site.register(Carrito)
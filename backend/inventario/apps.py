@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class InventarioConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'inventario'
+
+    def ready(self):
+        from . import signals, cambios, instantaneas, categorias, checks
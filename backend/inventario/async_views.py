@@ -0,0 +1,87 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+
+from . import cambios
+from .categorias import registro_categorias
+from .filters import ProductoFilter
+from .models import Producto
+from .renderers import json_compacto
+from .serializacion import producto_a_dict, valores_productos, filas_a_dicts
+from .views import seq_de
+
+# Ruta de lectura nativa para ASGI: ORM asíncrono y serialización sin DRF,
+# con el mismo formato de salida que ProductoViewSet.
+def respuesta(datos, status=200):
+    return HttpResponse(json_compacto(datos), status=status, content_type='application/json')
+
+
+def filtro_productos(request, categorias):
+    return ProductoFilter(request.GET, queryset=Producto.objects.order_by('id'), categorias=categorias)
+
+
+def errores_filtro(filtro):
+    # Mismo cuerpo que el 400 de DjangoFilterBackend en la ruta DRF.
+    return respuesta({campo: list(errores) for campo, errores in filtro.errors.items()}, status=400)
+
+
+async def paginar(request, queryset, categorias):
+    page_size = request.GET.get('page_size')
+    if page_size is None:
+        return respuesta(filas_a_dicts([fila async for fila in valores_productos(queryset).aiterator()], categorias=categorias))
+    try:
+        page_size = min(int(page_size), settings.PRODUCTOS_MAX_PAGE_SIZE)
+        despues = int(request.GET.get('despues', 0))
+    except ValueError:
+        return respuesta({'detail': 'page_size y despues deben ser enteros'}, status=400)
+    if page_size < 1:
+        return respuesta({'detail': 'page_size debe ser mayor que 0'}, status=400)
+    filas = valores_productos(queryset.filter(id__gt=despues)[:page_size])
+    resultados = filas_a_dicts([fila async for fila in filas.aiterator()], categorias=categorias)
+    siguiente = None
+    if len(resultados) == page_size:
+        parametros = request.GET.copy()
+        parametros['despues'] = resultados[-1]['id']
+        siguiente = request.build_absolute_uri(f'{request.path}?{parametros.urlencode()}')
+    return respuesta({'next': siguiente, 'results': resultados})
+
+
+async def productos(request):
+    categorias = await registro_categorias.avigentes()
+    filtro = filtro_productos(request, categorias)
+    if not filtro.is_valid():
+        return errores_filtro(filtro)
+    return await paginar(request, filtro.qs, categorias)
+
+
+async def producto_detalle(request, pk):
+    try:
+        producto = await Producto.objects.aget(pk=pk)
+    except Producto.DoesNotExist:
+        return respuesta({'detail': 'No encontrado.'}, status=404)
+    return respuesta(producto_a_dict(producto, await registro_categorias.avigentes()))
+
+
+async def filtrado_categoria(request):
+    categoria_nombre = request.GET.get('categoria')
+    if not categoria_nombre:
+        return respuesta({'detail': 'Debe proporcionar un nombre de categoría'}, status=400)
+    categorias = await registro_categorias.avigentes()
+    categoria_id = categorias.id_de(categoria_nombre)
+    if categoria_id is None:
+        return respuesta({'detail': 'Categoría no encontrada'}, status=404)
+    filtro = filtro_productos(request, categorias)
+    if not filtro.is_valid():
+        return errores_filtro(filtro)
+    return await paginar(request, filtro.qs.filter(categoria_id=categoria_id), categorias)
+
+
+async def cambios_stream(request):
+    desde = seq_de(request.headers.get('Last-Event-ID', request.GET.get('since')))
+    if desde is None:
+        desde = await sync_to_async(cambios.ultimo_seq)()
+    response = StreamingHttpResponse(cambios.eventos_stock(desde), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Evita que nginx acumule los eventos en su buffer.
+    response['X-Accel-Buffering'] = 'no'
+    return response
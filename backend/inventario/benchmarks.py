@@ -0,0 +1,67 @@
+import os
+import random
+import statistics
+import tempfile
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.db import connection
+from .models import Producto, Categoria
+
+NOMBRES = [
+    'Almendra', 'Nuez', 'Maní', 'Castaña', 'Pistacho', 'Chía', 'Linaza', 'Maravilla',
+    'Pasas', 'Ciruela', 'Avena', 'Granola', 'Quinoa', 'Huevo', 'Pepinillo', 'Aceituna',
+    'Cacao', 'Chocolate', 'Mix',
+]
+
+
+@contextmanager
+def bd_temporal(conservar=False):
+    """Crea una base de datos de prueba aislada para no ensuciar la real."""
+    nombre_original = connection.settings_dict['NAME']
+    if connection.vendor == 'sqlite' and not connection.settings_dict['TEST'].get('NAME'):
+        # En archivo y no en memoria compartida: así los hilos esperan el lock en vez de fallar.
+        connection.settings_dict['TEST']['NAME'] = os.path.join(tempfile.gettempdir(), 'benchmark.sqlite3')
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=conservar)
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(nombre_original, verbosity=0, keepdb=conservar)
+
+
+def sembrar_catalogo(cantidad, lote=10000, semilla=0):
+    azar = random.Random(semilla)
+    categorias = [
+        Categoria.objects.get_or_create(nombre=nombre)[0].id
+        for nombre, _ in Categoria.CATEGORIAS_CHOICES
+    ]
+    creados = Producto.objects.count()
+    while creados < cantidad:
+        n = min(lote, cantidad - creados)
+        Producto.objects.bulk_create([
+            Producto(
+                nombre=f'{azar.choice(NOMBRES)} {creados + i}',
+                descripcion=f'{azar.choice(NOMBRES)} seleccionada, {azar.randint(100, 1000)} g',
+                precio=Decimal(azar.randint(500, 50000)) / 10,
+                stock=Decimal(azar.choice([0, 0, azar.randint(1, 500)])),
+                categoria_id=azar.choice(categorias),
+            )
+            for i in range(n)
+        ], batch_size=lote)
+        creados += n
+    analizar()
+    return creados
+
+
+def analizar():
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE productos' if connection.vendor == 'postgresql' else 'ANALYZE')
+
+
+def percentiles(muestras):
+    if not muestras:
+        return {'p50': 0, 'p95': 0, 'p99': 0}
+    if len(muestras) == 1:
+        return {'p50': muestras[0], 'p95': muestras[0], 'p99': muestras[0]}
+    cortes = statistics.quantiles(muestras, n=100, method='inclusive')
+    return {'p50': cortes[49], 'p95': cortes[94], 'p99': cortes[98]}
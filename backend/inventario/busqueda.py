@@ -0,0 +1,242 @@
+import bisect
+import heapq
+import math
+import re
+import threading
+import unicodedata
+from collections import defaultdict
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connection
+from django.db.models import F, Func
+
+from .models import Producto
+
+PESO_NOMBRE = 2.0
+PESO_DESCRIPCION = 1.0
+MAX_TERMINOS_PREFIJO = 200
+TOP_POR_TERMINO = 20
+
+SUFIJOS = sorted([
+    'amientos', 'imientos', 'amiento', 'imiento', 'aciones', 'uciones', 'acion', 'ucion',
+    'mente', 'idades', 'idad', 'ables', 'ibles', 'able', 'ible', 'istas', 'ista',
+    'osos', 'osas', 'oso', 'osa', 'ados', 'idos', 'adas', 'idas', 'ado', 'ido', 'ada', 'ida',
+    'es', 's', 'a', 'o', 'e',
+], key=len, reverse=True)
+
+VECTOR_PRODUCTO = (
+    SearchVector(Func(F('nombre'), function='unaccent'), weight='A', config='spanish')
+    + SearchVector(Func(F('descripcion'), function='unaccent'), weight='B', config='spanish')
+)
+
+
+def plegar(texto):
+    """Minúsculas y sin tildes: "Castaña" y "castana" indexan igual."""
+    descompuesto = unicodedata.normalize('NFKD', texto.lower())
+    return ''.join(c for c in descompuesto if not unicodedata.combining(c))
+
+
+def tokenizar(texto):
+    return re.findall(r'[a-z0-9]+', plegar(texto))
+
+
+def raiz(token):
+    """Stemmer liviano para español: quita sufijos flexivos dejando al menos 3 letras.
+
+    Se aplica dos veces para que singular y plural ("almendra", "almendras") compartan raíz.
+    """
+    for _ in range(2):
+        for sufijo in SUFIJOS:
+            if token.endswith(sufijo) and len(token) - len(sufijo) >= 3:
+                token = token[:-len(sufijo)]
+                break
+    return token
+
+
+def usa_postgres():
+    return connection.vendor == 'postgresql'
+
+
+class IndiceInvertido:
+    """Índice de texto en memoria para motores sin búsqueda full-text (SQLite).
+
+    Se construye perezosamente desde la base y se mantiene con las señales de Producto
+    del propio proceso.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.construido = False
+        self.limpiar()
+
+    def limpiar(self):
+        self.postings = defaultdict(dict)
+        self.terminos_por_producto = {}
+        self.nombres = {}
+        self.terminos = []
+        self.top = {}
+
+    def construir(self):
+        with self.lock:
+            self.limpiar()
+            for producto_id, nombre, descripcion in Producto.objects.values_list('id', 'nombre', 'descripcion').iterator():
+                self.agregar(producto_id, nombre, descripcion)
+            self.reordenar()
+            self.construido = True
+
+    def asegurar(self):
+        if not self.construido:
+            self.construir()
+
+    def agregar(self, producto_id, nombre, descripcion):
+        pesos = defaultdict(float)
+        for token in tokenizar(nombre):
+            pesos[raiz(token)] += PESO_NOMBRE
+        for token in tokenizar(descripcion):
+            pesos[raiz(token)] += PESO_DESCRIPCION
+        for termino, peso in pesos.items():
+            self.postings[termino][producto_id] = peso
+        self.terminos_por_producto[producto_id] = list(pesos)
+        self.nombres[producto_id] = nombre
+
+    def quitar(self, producto_id):
+        for termino in self.terminos_por_producto.pop(producto_id, []):
+            self.postings[termino].pop(producto_id, None)
+            if not self.postings[termino]:
+                del self.postings[termino]
+        self.nombres.pop(producto_id, None)
+
+    def reordenar(self):
+        self.terminos = sorted(self.postings)
+        self.top = {
+            termino: heapq.nlargest(TOP_POR_TERMINO, docs.items(), key=lambda item: (item[1], -item[0]))
+            for termino, docs in self.postings.items()
+        }
+
+    def actualizar(self, producto_id, nombre, descripcion):
+        with self.lock:
+            if not self.construido:
+                return
+            anteriores = self.terminos_por_producto.get(producto_id, [])
+            self.quitar(producto_id)
+            self.agregar(producto_id, nombre, descripcion)
+            self.reordenar_terminos({*anteriores, *self.terminos_por_producto[producto_id]})
+
+    def eliminar(self, producto_id):
+        with self.lock:
+            if not self.construido:
+                return
+            terminos = self.terminos_por_producto.get(producto_id, [])
+            self.quitar(producto_id)
+            self.reordenar_terminos(terminos)
+
+    def reordenar_terminos(self, terminos):
+        """Actualiza el vocabulario ordenado y el top sólo de `terminos`, sin reordenar todo."""
+        for termino in terminos:
+            i = bisect.bisect_left(self.terminos, termino)
+            presente = i < len(self.terminos) and self.terminos[i] == termino
+            docs = self.postings.get(termino)
+            if docs:
+                if not presente:
+                    self.terminos.insert(i, termino)
+                self.top[termino] = heapq.nlargest(TOP_POR_TERMINO, docs.items(), key=lambda item: (item[1], -item[0]))
+            else:
+                if presente:
+                    del self.terminos[i]
+                self.top.pop(termino, None)
+
+    def invalidar(self):
+        with self.lock:
+            self.construido = False
+            self.limpiar()
+
+    def idf(self, termino):
+        return math.log(1 + len(self.nombres) / (1 + len(self.postings.get(termino, ()))))
+
+    def buscar(self, consulta, limite):
+        self.asegurar()
+        terminos = {raiz(token) for token in tokenizar(consulta)}
+        if not terminos:
+            return []
+        with self.lock:
+            # Se intersecta desde la lista de postings más corta.
+            ordenados = sorted(terminos, key=lambda t: len(self.postings.get(t, ())))
+            candidatos = set(self.postings.get(ordenados[0], ()))
+            for termino in ordenados[1:]:
+                candidatos.intersection_update(self.postings.get(termino, ()))
+            pesos = {termino: self.idf(termino) for termino in terminos}
+            puntajes = (
+                (sum(self.postings[t][doc] * pesos[t] for t in terminos), doc) for doc in candidatos
+            )
+            return [doc for _, doc in heapq.nlargest(limite, puntajes, key=lambda item: (item[0], -item[1]))]
+
+    def terminos_con_prefijo(self, prefijo):
+        inicio = bisect.bisect_left(self.terminos, prefijo)
+        tope = min(len(self.terminos), inicio + MAX_TERMINOS_PREFIJO)
+        fin = bisect.bisect_left(self.terminos, prefijo + '\uffff', inicio, tope)
+        return self.terminos[inicio:fin]
+
+    def autocompletar(self, consulta, limite):
+        self.asegurar()
+        tokens = tokenizar(consulta)
+        if not tokens:
+            return []
+        completos, prefijo = [raiz(token) for token in tokens[:-1]], raiz(tokens[-1])
+        with self.lock:
+            puntajes = defaultdict(float)
+            for termino in self.terminos_con_prefijo(prefijo):
+                for doc, peso in self.top.get(termino, ()):
+                    puntajes[doc] = max(puntajes[doc], peso)
+            for termino in completos:
+                docs = self.postings.get(termino, {})
+                puntajes = {doc: puntaje + docs[doc] for doc, puntaje in puntajes.items() if doc in docs}
+            mejores = heapq.nlargest(limite, puntajes.items(), key=lambda item: (item[1], -item[0]))
+            return [{'id': doc, 'nombre': self.nombres[doc]} for doc, _ in mejores]
+
+
+indice_productos = IndiceInvertido()
+
+
+def consulta_postgres(consulta, prefijo=False):
+    tokens = tokenizar(consulta)
+    if not tokens:
+        return None
+    if prefijo:
+        return SearchQuery(' & '.join(tokens[:-1] + [f'{tokens[-1]}:*']), search_type='raw', config='spanish')
+    return SearchQuery(' '.join(tokens), search_type='plain', config='spanish')
+
+
+def buscar(consulta, limite):
+    """Devuelve los ids de productos ordenados por relevancia."""
+    if not usa_postgres():
+        return indice_productos.buscar(consulta, limite)
+    query = consulta_postgres(consulta)
+    if query is None:
+        return []
+    return list(
+        Producto.objects.filter(busqueda=query)
+        .annotate(rank=SearchRank(F('busqueda'), query))
+        .order_by('-rank', 'id')
+        .values_list('id', flat=True)[:limite]
+    )
+
+
+def autocompletar(consulta, limite):
+    if not usa_postgres():
+        return indice_productos.autocompletar(consulta, limite)
+    query = consulta_postgres(consulta, prefijo=True)
+    if query is None:
+        return []
+    return list(
+        Producto.objects.filter(busqueda=query)
+        .annotate(rank=SearchRank(F('busqueda'), query))
+        .order_by('-rank', 'id')
+        .values('id', 'nombre')[:limite]
+    )
+
+
+def actualizar_vectores(ids=None):
+    if not usa_postgres():
+        return
+    queryset = Producto.objects.all() if ids is None else Producto.objects.filter(pk__in=ids)
+    queryset.update(busqueda=VECTOR_PRODUCTO)
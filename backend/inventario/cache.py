@@ -0,0 +1,158 @@
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.response import Response
+
+CLAVE_VERSION = 'catalogo:version'
+
+
+class CacheLocalLRU:
+    """LRU en memoria del proceso con expiración por entrada."""
+
+    def __init__(self, max_entradas, ttl):
+        self.max_entradas = max_entradas
+        self.ttl = ttl
+        self.entradas = OrderedDict()
+        self.contadores = {}
+        self.expulsiones = 0
+        self.lock = threading.Lock()
+
+    def get(self, clave):
+        with self.lock:
+            if clave in self.contadores:
+                return self.contadores[clave]
+            entrada = self.entradas.get(clave)
+            if entrada is None:
+                return None
+            expira, valor = entrada
+            if expira is not None and expira < time.monotonic():
+                del self.entradas[clave]
+                return None
+            self.entradas.move_to_end(clave)
+            return valor
+
+    def set(self, clave, valor, timeout=-1):
+        ttl = self.ttl if timeout == -1 else timeout
+        expira = time.monotonic() + ttl if ttl is not None else None
+        with self.lock:
+            self.entradas[clave] = (expira, valor)
+            self.entradas.move_to_end(clave)
+            while len(self.entradas) > self.max_entradas:
+                self.entradas.popitem(last=False)
+                self.expulsiones += 1
+
+    def incr(self, clave):
+        # Los contadores viven fuera del LRU para que una expulsión nunca reinicie la versión.
+        with self.lock:
+            self.contadores[clave] = self.contadores.get(clave, 0) + 1
+            return self.contadores[clave]
+
+    def __len__(self):
+        return len(self.entradas)
+
+
+class CacheDjango:
+    """Adaptador sobre un alias de CACHES (p. ej. Redis) para compartir entre procesos."""
+
+    def __init__(self, alias, ttl):
+        self.cache = caches[alias]
+        self.ttl = ttl
+        self.expulsiones = None
+
+    def get(self, clave):
+        return self.cache.get(clave)
+
+    def set(self, clave, valor, timeout=-1):
+        self.cache.set(clave, valor, self.ttl if timeout == -1 else timeout)
+
+    def incr(self, clave):
+        self.cache.add(clave, 0, None)
+        return self.cache.incr(clave)
+
+    def __len__(self):
+        return 0
+
+
+class CatalogoCache:
+    """Respuestas del catálogo bajo una versión que catalogo_modificado incrementa.
+
+    Sin CATALOGO_CACHE_URL usa un LRU del proceso, cuya versión sólo cambia con las escrituras
+    de ese mismo proceso: con varios workers hay que configurar una cache compartida.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.aciertos = 0
+        self.fallos = 0
+
+    @classmethod
+    def desde_settings(cls):
+        config = settings.CATALOGO_CACHE
+        if config['ALIAS']:
+            return cls(CacheDjango(config['ALIAS'], config['TTL']))
+        return cls(CacheLocalLRU(config['MAX_ENTRADAS'], config['TTL']))
+
+    def version(self):
+        return self.backend.get(CLAVE_VERSION) or 0
+
+    def clave(self, request, variante=None):
+        # lists() conserva los parámetros repetidos: ?categoria=a&categoria=b no comparte clave con ?categoria=b.
+        parametros = urlencode(sorted(request.query_params.lists()), doseq=True)
+        clave = f'catalogo:{self.version()}:{request.get_host()}{request.path}?{parametros}'
+        return f'{clave}#{variante}' if variante else clave
+
+    def obtener(self, request, variante=None):
+        valor = self.backend.get(self.clave(request, variante))
+        if valor is None:
+            self.fallos += 1
+        else:
+            self.aciertos += 1
+        return valor
+
+    def guardar(self, request, valor, variante=None):
+        self.backend.set(self.clave(request, variante), valor)
+
+    def invalidar(self):
+        return self.backend.incr(CLAVE_VERSION)
+
+    def estadisticas(self):
+        return {
+            'aciertos': self.aciertos,
+            'fallos': self.fallos,
+            'expulsiones': self.backend.expulsiones,
+            'entradas': len(self.backend),
+            'version': self.version(),
+        }
+
+
+catalogo_cache = CatalogoCache.desde_settings()
+
+
+class CatalogoCacheMixin:
+    """Cachea las lecturas anónimas del catálogo; se invalida con la señal catalogo_modificado.
+
+    Con GetCondicionalMixin la clave incluye el ETag vigente, así que un cambio de stock (que no
+    invalida la cache) sólo descarta las respuestas de los productos que cambiaron.
+    """
+
+    def respuesta_cacheada(self, request, generar):
+        if request.user.is_authenticated:
+            return generar()
+        variante = getattr(self, 'etag_vigente', None)
+        datos = catalogo_cache.obtener(request, variante)
+        if datos is not None:
+            return Response(datos)
+        response = generar()
+        if response.status_code == 200:
+            catalogo_cache.guardar(request, response.data, variante)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.respuesta_cacheada(request, lambda: super(CatalogoCacheMixin, self).list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.respuesta_cacheada(request, lambda: super(CatalogoCacheMixin, self).retrieve(request, *args, **kwargs))
@@ -0,0 +1,170 @@
+import asyncio
+import time
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Max, Subquery
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Cambio, Categoria, Producto, VersionTabla
+from .renderers import json_compacto
+from .serializacion import valores_productos, filas_a_dicts
+from .signals import catalogo_modificado
+
+MODELOS = {modelo._meta.db_table: modelo for modelo in (Producto, Categoria)}
+CAMPOS_EVENTO = ['id', 'precio', 'stock']
+
+
+def registrar(modelo, ids, borrado=False):
+    tabla = modelo._meta.db_table
+    Cambio.objects.bulk_create([Cambio(tabla=tabla, objeto_id=objeto_id, borrado=borrado) for objeto_id in ids])
+
+
+@receiver(post_save, sender=Producto)
+@receiver(post_save, sender=Categoria)
+def registrar_guardado(sender, instance, **kwargs):
+    registrar(sender, [instance.pk])
+
+
+@receiver(post_delete, sender=Producto)
+@receiver(post_delete, sender=Categoria)
+def registrar_borrado(sender, instance, **kwargs):
+    registrar(sender, [instance.pk], borrado=True)
+
+
+@receiver(catalogo_modificado)
+def registrar_masivo(sender, ids=None, **kwargs):
+    # Las escrituras sin ids ya quedaron registradas por post_save/post_delete.
+    if ids and sender in MODELOS.values():
+        registrar(sender, ids)
+
+
+def ultimo_seq():
+    return Cambio.objects.aggregate(ultimo=Max('seq'))['ultimo'] or 0
+
+
+def compactado_hasta():
+    # Las lápidas con seq <= a este valor ya se borraron: un cliente más atrasado debe resincronizar.
+    version = VersionTabla.objects.de(Cambio._meta.db_table)
+    return version[0] if version else 0
+
+
+def leer(desde, limite):
+    """Cambios posteriores a `desde` y hasta dónde puede avanzar el cliente.
+
+    Los seq se asignan al insertar pero se ven al hacer commit, así que un hueco reciente puede
+    ser una transacción todavía abierta: el cursor se detiene antes de él hasta que tenga
+    ESPERA_HUECOS segundos (los de rollbacks y compactación quedan atrás solos).
+    """
+    filas = list(
+        Cambio.objects.filter(seq__gt=desde).order_by('seq')
+        .values_list('seq', 'tabla', 'objeto_id', 'borrado', 'fecha')[:limite + 1]
+    )
+    mas = len(filas) > limite
+    filas = filas[:limite]
+    reciente = timezone.now() - timedelta(seconds=settings.CAMBIOS['ESPERA_HUECOS'])
+    cursor = desde
+    for seq, _, _, _, fecha in filas:
+        if seq != cursor + 1 and fecha > reciente:
+            break
+        cursor = seq
+    return filas, cursor, mas and bool(filas) and cursor == filas[-1][0]
+
+
+def ultimos_estados(filas):
+    # Si una fila cambió varias veces sólo importa su último registro.
+    estados = {tabla: {} for tabla in MODELOS}
+    for _, tabla, objeto_id, borrado, _ in filas:
+        if tabla in estados:
+            estados[tabla][objeto_id] = borrado
+    return estados
+
+
+def filas_productos(ids, campos=None):
+    queryset = Producto.objects.filter(pk__in=ids).order_by('id')
+    return filas_a_dicts(valores_productos(queryset, campos), campos)
+
+
+def filas_categorias(ids):
+    return list(Categoria.objects.filter(pk__in=ids).order_by('id').values('id', 'nombre'))
+
+
+def delta(desde):
+    """Upserts y lápidas desde `desde`, con una consulta por tabla para el contenido actual."""
+    filas, cursor, mas = leer(desde, settings.CAMBIOS['LIMITE'])
+    resultado = {'cursor': cursor, 'mas': mas}
+    for tabla, estados in ultimos_estados(filas).items():
+        vigentes = [objeto_id for objeto_id, borrado in estados.items() if not borrado]
+        upserts = filas_productos(vigentes) if MODELOS[tabla] is Producto else filas_categorias(vigentes)
+        encontrados = {fila['id'] for fila in upserts}
+        # Lo que ya no existe se informa como borrado aunque su lápida caiga en una página posterior.
+        borrados = sorted(objeto_id for objeto_id in estados if objeto_id not in encontrados)
+        resultado[tabla] = {'upserts': upserts, 'borrados': borrados}
+    return resultado
+
+
+def compactar():
+    """Deja sólo el último registro de cada fila y borra las lápidas vencidas."""
+    config = settings.CAMBIOS
+    ahora = timezone.now()
+    ultimos = Cambio.objects.values('tabla', 'objeto_id').annotate(ultimo=Max('seq')).values('ultimo')
+    _, superados = (
+        Cambio.objects.filter(fecha__lt=ahora - timedelta(seconds=config['COMPACTAR_DESPUES']))
+        .exclude(seq__in=Subquery(ultimos)).delete()
+    )
+    lapidas = Cambio.objects.filter(borrado=True, fecha__lt=ahora - timedelta(seconds=config['RETENCION_BORRADOS']))
+    hasta = lapidas.aggregate(hasta=Max('seq'))['hasta']
+    borradas = {}
+    if hasta is not None:
+        VersionTabla.objects.update_or_create(tabla=Cambio._meta.db_table, defaults={'version': hasta, 'modificado': ahora})
+        _, borradas = lapidas.filter(seq__lte=hasta).delete()
+    return superados.get(Cambio._meta.label, 0), borradas.get(Cambio._meta.label, 0)
+
+
+def evento(nombre, cursor, datos):
+    return b'id: %d\nevent: %s\ndata: %s\n\n' % (cursor, nombre.encode(), json_compacto(datos))
+
+
+def eventos_pendientes(desde):
+    """Eventos de precio y stock posteriores a `desde` y el nuevo cursor.
+
+    Sólo se emiten las filas hasta el cursor: las que siguen a un hueco reciente se enviarían
+    con el id anterior y se repetirían en cada consulta hasta que el hueco se cierre.
+    """
+    filas, cursor, _ = leer(desde, settings.CAMBIOS['LIMITE'])
+    estados = ultimos_estados([fila for fila in filas if fila[0] <= cursor])[Producto._meta.db_table]
+    if not estados:
+        return [], cursor
+    vigentes = filas_productos([objeto_id for objeto_id, borrado in estados.items() if not borrado], CAMPOS_EVENTO)
+    bloques = [evento('producto', cursor, producto) for producto in vigentes]
+    encontrados = {producto['id'] for producto in vigentes}
+    bloques.extend(evento('producto_borrado', cursor, {'id': objeto_id}) for objeto_id in sorted(set(estados) - encontrados))
+    return bloques, cursor
+
+
+async def eventos_stock(desde):
+    """Server-sent events con precio y stock de los productos que cambian.
+
+    Consulta el registro cada SSE_INTERVALO segundos y corta a los SSE_DURACION segundos;
+    EventSource reconecta solo y retoma desde Last-Event-ID. Entre consultas espera con
+    asyncio.sleep, así que bajo ASGI una conexión abierta no ocupa un hilo.
+    """
+    config = settings.CAMBIOS
+    yield b'retry: %d\n\n' % int(config['SSE_INTERVALO'] * 1000)
+    inicio = ultimo_envio = time.monotonic()
+    while True:
+        bloques, desde = await sync_to_async(eventos_pendientes)(desde)
+        if bloques:
+            for bloque in bloques:
+                yield bloque
+            ultimo_envio = time.monotonic()
+        elif time.monotonic() - ultimo_envio >= config['SSE_LATIDO']:
+            # Comentario SSE: mantiene viva la conexión a través de proxies.
+            yield b': latido\n\n'
+            ultimo_envio = time.monotonic()
+        if time.monotonic() - inicio >= config['SSE_DURACION']:
+            return
+        await asyncio.sleep(config['SSE_INTERVALO'])
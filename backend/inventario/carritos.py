@@ -0,0 +1,233 @@
+import atexit
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from backend.basedatos import primario
+from .models import Carrito, CarritoItem, Producto
+from .serializacion import decimal_a_texto
+
+logger = logging.getLogger(__name__)
+
+PREFIJO_USUARIO = 'carrito:usuario:'
+PREFIJO_SESION = 'carrito:sesion:'
+PREFIJO_PENDIENTES = 'carritos:pendientes:'
+
+
+def clave_usuario(usuario_id):
+    return f'{PREFIJO_USUARIO}{usuario_id}'
+
+
+def clave_sesion(sesion):
+    return f'{PREFIJO_SESION}{sesion}'
+
+
+def filtro_de(clave):
+    if clave.startswith(PREFIJO_USUARIO):
+        return {'usuario_id': int(clave[len(PREFIJO_USUARIO):])}
+    return {'sesion': clave[len(PREFIJO_SESION):]}
+
+
+class CarritoOcupado(Exception):
+    """Otra petición está modificando el mismo carrito y no lo soltó a tiempo."""
+
+
+class AlmacenCarritos:
+    """Estado de los carritos en la cache compartida, con escritura diferida a la base.
+
+    Las lecturas salen de la cache (y de la base sólo si la entrada venció). Cada cambio se
+    anota en un registro de pendientes numerado, también en la cache, y un hilo por proceso
+    persiste cada INTERVALO_PERSISTENCIA segundos lo anotado por cualquier proceso: un
+    reinicio no pierde los cambios todavía sin persistir. Un carrito es un dict {producto_id: cantidad}.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.hilo = None
+        self.detener = threading.Event()
+        self.hueco = None
+
+    @property
+    def config(self):
+        return settings.CARRITOS
+
+    @property
+    def cache(self):
+        return caches[self.config['ALIAS']]
+
+    def obtener(self, clave):
+        lineas = self.cache.get(clave)
+        if lineas is None:
+            # También se cachea el carrito vacío, para no volver a consultar la base.
+            lineas = self.cargar(clave)
+            self.cache.set(clave, lineas, self.config['TTL'])
+        return lineas
+
+    def cargar(self, clave):
+        filas = CarritoItem.objects.filter(**{f'carrito__{campo}': valor for campo, valor in filtro_de(clave).items()})
+        return dict(filas.values_list('producto_id', 'cantidad'))
+
+    @contextmanager
+    def bloqueado(self, *claves):
+        """Candado en la cache compartida para leer, modificar y guardar un carrito sin perder cambios concurrentes."""
+        tomados = []
+        limite = time.monotonic() + self.config['ESPERA_CANDADO']
+        try:
+            # Siempre en el mismo orden, para que dos fusiones no se esperen mutuamente.
+            for clave in sorted(claves):
+                while not self.cache.add(f'{clave}:candado', 1, self.config['DURACION_CANDADO']):
+                    if time.monotonic() > limite:
+                        raise CarritoOcupado(clave)
+                    time.sleep(0.005)
+                tomados.append(clave)
+            yield
+        finally:
+            self.cache.delete_many([f'{clave}:candado' for clave in tomados])
+
+    def anotar(self, clave):
+        self.cache.add(f'{PREFIJO_PENDIENTES}total', 0, None)
+        numero = self.cache.incr(f'{PREFIJO_PENDIENTES}total')
+        self.cache.set(f'{PREFIJO_PENDIENTES}{numero}', clave, self.config['TTL'])
+
+    def guardar(self, clave, lineas):
+        self.cache.set(clave, lineas, self.config['TTL'])
+        self.anotar(clave)
+        if self.config['SINCRONO']:
+            self.persistir()
+        else:
+            self.iniciar()
+
+    def fusionar(self, clave_anonima, clave):
+        """Suma el carrito de la sesión anónima al del usuario y deja vacío el anónimo."""
+        if not self.obtener(clave_anonima):
+            # Caso común: no hay nada que fusionar y no hace falta tomar el candado.
+            return None
+        with self.bloqueado(clave_anonima, clave):
+            anonimo = self.obtener(clave_anonima)
+            if not anonimo:
+                return None
+            lineas = self.obtener(clave)
+            for producto_id, cantidad in anonimo.items():
+                lineas[producto_id] = lineas.get(producto_id, 0) + cantidad
+            self.guardar(clave, lineas)
+            self.guardar(clave_anonima, {})
+            return lineas
+
+    def iniciar(self):
+        if self.hilo is not None:
+            return
+        with self.lock:
+            if self.hilo is None:
+                self.hilo = threading.Thread(target=self.ciclo, name='carritos-persistencia', daemon=True)
+                self.hilo.start()
+                atexit.register(self.persistir)
+
+    def ciclo(self):
+        while not self.detener.wait(self.config['INTERVALO_PERSISTENCIA']):
+            try:
+                self.persistir()
+            except Exception:
+                logger.exception('Fallo al persistir carritos')
+            finally:
+                close_old_connections()
+
+    def pendientes(self):
+        """Claves anotadas desde la última persistencia y hasta qué número llegan."""
+        desde = self.cache.get(f'{PREFIJO_PENDIENTES}persistido', 0)
+        total = self.cache.get(f'{PREFIJO_PENDIENTES}total', 0)
+        numeros = range(desde + 1, total + 1)
+        anotadas = self.cache.get_many([f'{PREFIJO_PENDIENTES}{numero}' for numero in numeros])
+        hasta, claves = desde, set()
+        for numero in numeros:
+            clave = anotadas.get(f'{PREFIJO_PENDIENTES}{numero}')
+            if clave is None and numero != self.hueco:
+                # Número reservado por otro proceso que todavía no escribe la clave: se espera
+                # al próximo ciclo. Si sigue faltando entonces, se perdió y se salta.
+                self.hueco = numero
+                break
+            if clave is not None:
+                claves.add(clave)
+            hasta = numero
+        return claves, desde, hasta
+
+    def persistir(self):
+        with self.lock:
+            claves, desde, hasta = self.pendientes()
+            fallidas = set()
+            for clave in claves:
+                lineas = self.cache.get(clave)
+                if lineas is None:
+                    # Venció en la cache antes de persistirse: la base conserva la última versión.
+                    continue
+                try:
+                    persistir_carrito(clave, lineas)
+                except Exception:
+                    logger.exception('No se pudo persistir %s', clave)
+                    fallidas.add(clave)
+            self.cache.set(f'{PREFIJO_PENDIENTES}persistido', hasta, None)
+            self.cache.delete_many([f'{PREFIJO_PENDIENTES}{numero}' for numero in range(desde + 1, hasta + 1)])
+        for clave in fallidas:
+            self.anotar(clave)
+        return len(claves) - len(fallidas)
+
+
+def persistir_carrito(clave, lineas):
+    filtro = filtro_de(clave)
+    # Corre en el hilo de persistencia, fuera de PrimarioMiddleware: una réplica atrasada podría no ver los productos.
+    with primario(), transaction.atomic():
+        # Los productos borrados desde el último cambio se descartan para no violar la FK.
+        existentes = set(Producto.objects.filter(pk__in=list(lineas)).values_list('id', flat=True))
+        lineas = {producto_id: cantidad for producto_id, cantidad in lineas.items() if producto_id in existentes}
+        if not lineas:
+            Carrito.objects.filter(**filtro).delete()
+            return
+        carrito, _ = Carrito.objects.update_or_create(**filtro)
+        CarritoItem.objects.filter(carrito=carrito).exclude(producto_id__in=list(lineas)).delete()
+        CarritoItem.objects.bulk_create(
+            [CarritoItem(carrito=carrito, producto_id=producto_id, cantidad=cantidad) for producto_id, cantidad in lineas.items()],
+            update_conflicts=True, unique_fields=['carrito', 'producto'], update_fields=['cantidad'],
+        )
+
+
+def cotizar(lineas):
+    """Precio y stock de todas las líneas con una sola consulta in_bulk."""
+    productos = Producto.objects.only('id', 'nombre', 'precio', 'stock', 'urlfoto').in_bulk(list(lineas)) if lineas else {}
+    items, total = [], Decimal('0')
+    for producto_id, cantidad in lineas.items():
+        producto = productos.get(producto_id)
+        if producto is None:
+            continue
+        subtotal = producto.precio * cantidad
+        total += subtotal
+        items.append({
+            'producto': producto_id,
+            'nombre': producto.nombre,
+            'urlfoto': producto.urlfoto,
+            'precio': decimal_a_texto(producto.precio),
+            'cantidad': decimal_a_texto(cantidad),
+            'subtotal': decimal_a_texto(subtotal),
+            'disponible': producto.stock >= cantidad,
+        })
+    return {
+        'items': items,
+        'total': decimal_a_texto(total),
+        'disponible': all(item['disponible'] for item in items),
+    }
+
+
+def podar_anonimos():
+    """Borra los carritos anónimos sin cambios desde hace más de TTL segundos."""
+    limite = timezone.now() - timedelta(seconds=settings.CARRITOS['TTL'])
+    _, borrados = Carrito.objects.filter(usuario__isnull=True, actualizado__lt=limite).delete()
+    return borrados.get(Carrito._meta.label, 0)
+
+
+almacen_carritos = AlmacenCarritos()
@@ -0,0 +1,105 @@
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Categoria, VersionTabla
+from .signals import catalogo_modificado
+
+
+class Categorias:
+    """Foto inmutable de la tabla de categorías: id -> nombre y nombre -> id."""
+
+    def __init__(self, version, por_id):
+        self.version = version
+        self.por_id = por_id
+        self.por_nombre = {nombre: categoria_id for categoria_id, nombre in por_id.items()}
+
+    def nombre_de(self, categoria_id):
+        return self.por_id.get(categoria_id)
+
+    def id_de(self, nombre):
+        return self.por_nombre.get(nombre)
+
+    def listado(self):
+        """Equivalente a CategoriaSerializer(many=True).data, ordenado por id."""
+        return [{'id': categoria_id, 'nombre': nombre} for categoria_id, nombre in self.por_id.items()]
+
+
+class RegistroCategorias:
+    """Categorías en memoria del proceso, para no consultarlas en cada petición.
+
+    Se cargan perezosamente y se descartan con las señales de Categoria del propio proceso.
+    Las escrituras de otros procesos se detectan comparando cada REVISAR_CADA segundos la
+    versión de la tabla, que incrementan esas señales y catalogo_modificado.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.categorias = None
+        self.generacion = 0
+        self.revisado = 0.0
+
+    @property
+    def config(self):
+        return settings.REGISTRO_CATEGORIAS
+
+    def cargar(self):
+        version = VersionTabla.objects.de(Categoria._meta.db_table)
+        return Categorias(version, dict(Categoria.objects.order_by('id').values_list('id', 'nombre')))
+
+    def vigentes(self):
+        categorias = self.categorias
+        if categorias is not None and time.monotonic() - self.revisado >= self.config['REVISAR_CADA']:
+            self.revisado = time.monotonic()
+            if VersionTabla.objects.de(Categoria._meta.db_table) != categorias.version:
+                self.invalidar()
+                categorias = None
+        if categorias is None:
+            generacion = self.generacion
+            categorias = self.cargar()
+            with self.lock:
+                # Si se invalidó mientras se cargaba, la carga puede ser anterior a la escritura.
+                if generacion == self.generacion:
+                    self.categorias = categorias
+                    self.revisado = time.monotonic()
+        return categorias
+
+    async def avigentes(self):
+        # El ORM síncrono no puede usarse desde el event loop; con el registro cargado no consulta.
+        categorias = self.categorias
+        if categorias is not None and time.monotonic() - self.revisado < self.config['REVISAR_CADA']:
+            return categorias
+        return await sync_to_async(self.vigentes)()
+
+    def invalidar(self):
+        with self.lock:
+            self.generacion += 1
+            self.categorias = None
+
+
+registro_categorias = RegistroCategorias()
+
+
+def invalidar_registro():
+    registro_categorias.invalidar()
+    # Otra vez al confirmar: una carga concurrente pudo leer la tabla antes del commit.
+    transaction.on_commit(registro_categorias.invalidar)
+
+
+@receiver(post_save, sender=Categoria)
+@receiver(post_delete, sender=Categoria)
+def invalidar_categoria(sender, **kwargs):
+    # También las escrituras del admin o la shell, que no envían catalogo_modificado, deben llegar a los demás procesos.
+    VersionTabla.objects.incrementar(Categoria._meta.db_table)
+    invalidar_registro()
+
+
+@receiver(catalogo_modificado)
+def invalidar_masivo(sender, **kwargs):
+    if sender is Categoria:
+        invalidar_registro()
@@ -0,0 +1,9 @@
+from django.conf import settings
+
+from backend.checks import requerir_cache_compartida
+
+requerir_cache_compartida('El carrito (CARRITOS)', lambda: settings.CARRITOS['ALIAS'], 'inventario.001')
+requerir_cache_compartida(
+    'La cache del catálogo (CATALOGO_CACHE)', lambda: settings.CATALOGO_CACHE['ALIAS'], 'inventario.002',
+    pista='Defina CATALOGO_CACHE_URL con una cache compartida, p. ej. redis://.',
+)
@@ -0,0 +1,53 @@
+import hashlib
+
+from django.utils.http import http_date, parse_etags, parse_http_date_safe, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+
+def etag_fuerte(*partes):
+    return quote_etag(hashlib.sha1('|'.join(map(str, partes)).encode()).hexdigest())
+
+
+def no_modificado(request, etag, modificado):
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match:
+        etags = parse_etags(if_none_match)
+        return '*' in etags or etag in etags
+    desde = parse_http_date_safe(request.headers.get('If-Modified-Since'))
+    return desde is not None and modificado is not None and int(modificado.timestamp()) <= desde
+
+
+class GetCondicionalMixin:
+    """Responde 304 sin serializar cuando el cliente ya tiene la versión vigente.
+
+    Las vistas implementan validadores(request), que devuelve (etag, modificado) o None. El ETag
+    vigente queda en etag_vigente para que CatalogoCacheMixin cachee la respuesta bajo él.
+    """
+
+    etag_vigente = None
+
+    def validadores(self, request):
+        return None
+
+    def respuesta_condicional(self, request, generar):
+        validadores = self.validadores(request)
+        if validadores is None:
+            return generar()
+        etag, modificado = validadores
+        self.etag_vigente = etag
+        if no_modificado(request, etag, modificado):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = generar()
+        if response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+            response['ETag'] = etag
+            if modificado is not None:
+                response['Last-Modified'] = http_date(modificado.timestamp())
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.respuesta_condicional(request, lambda: super(GetCondicionalMixin, self).list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.respuesta_condicional(request, lambda: super(GetCondicionalMixin, self).retrieve(request, *args, **kwargs))
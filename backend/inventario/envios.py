@@ -0,0 +1,210 @@
+import bisect
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from rest_framework import serializers
+
+from usuarios.models import Direccion, RangoPostal, TarifaEnvio
+from usuarios.serializers import RangoPostalImportacionSerializer, TarifaEnvioImportacionSerializer
+from .busqueda import plegar
+from .models import VersionTabla
+from .serializacion import decimal_a_texto
+
+# Una sola versión para ambas tablas: se cargan y se reemplazan juntas.
+TABLA = RangoPostal._meta.db_table
+
+
+def normalizar_pais(pais):
+    return plegar((pais or '').strip())
+
+
+def normalizar_codigo(codigo_postal):
+    """Sólo los dígitos: "8320000" y "832-0000" son el mismo código; sin dígitos no hay rango que aplique."""
+    digitos = ''.join(c for c in codigo_postal or '' if c.isdigit())
+    return int(digitos) if digitos else None
+
+
+def solapes(rangos):
+    """Números de fila de los rangos que se solapan con otro del mismo país (o repiten su cobertura total)."""
+    por_pais = defaultdict(list)
+    for numero, datos in rangos:
+        por_pais[normalizar_pais(datos['pais'])].append((datos.get('desde'), datos.get('hasta'), numero))
+    repetidos = []
+    for filas in por_pais.values():
+        completos = [numero for desde, _, numero in filas if desde is None]
+        repetidos.extend(completos[1:])
+        fin_anterior = None
+        for desde, hasta, numero in sorted(fila for fila in filas if fila[0] is not None):
+            if fin_anterior is not None and desde <= fin_anterior:
+                repetidos.append(numero)
+            fin_anterior = hasta if fin_anterior is None else max(fin_anterior, hasta)
+    return repetidos
+
+
+class IndiceEnvios:
+    """Zonas y tarifas precomputadas para cotizar sin consultar la base.
+
+    Por país, los rangos postales (que no se solapan) quedan ordenados por inicio y se resuelven
+    con bisect; las tarifas de cada zona, ordenadas por peso máximo. Cada cotización se memoriza
+    por (zona, tramo de peso).
+    """
+
+    def __init__(self, version, rangos, tarifas):
+        self.version = version
+        self.rangos = {}
+        self.paises = {}
+        por_pais = defaultdict(list)
+        for zona, pais, desde, hasta in rangos:
+            if desde is None:
+                self.paises[normalizar_pais(pais)] = zona
+            else:
+                por_pais[normalizar_pais(pais)].append((desde, hasta, zona))
+        for pais, filas in por_pais.items():
+            filas.sort()
+            self.rangos[pais] = tuple(list(columna) for columna in zip(*filas))
+        por_zona = defaultdict(list)
+        for zona, peso_hasta, precio in tarifas:
+            por_zona[zona].append((peso_hasta, precio))
+        self.tarifas = {zona: tuple(list(columna) for columna in zip(*sorted(filas))) for zona, filas in por_zona.items()}
+        self.cotizaciones = {}
+
+    def zona(self, pais, codigo_postal):
+        pais = normalizar_pais(pais)
+        codigo = normalizar_codigo(codigo_postal)
+        rangos = self.rangos.get(pais)
+        if rangos is not None and codigo is not None:
+            inicios, fines, zonas = rangos
+            i = bisect.bisect_right(inicios, codigo) - 1
+            if i >= 0 and codigo <= fines[i]:
+                return zonas[i]
+        return self.paises.get(pais)
+
+    def cotizar(self, zona, peso):
+        """Tarifa del menor tramo que admite el peso, o None si la zona no tiene o el peso los excede."""
+        tarifas = self.tarifas.get(zona)
+        if tarifas is None:
+            return None
+        pesos, precios = tarifas
+        tramo = bisect.bisect_left(pesos, peso)
+        if tramo == len(pesos):
+            return None
+        cotizacion = self.cotizaciones.get((zona, tramo))
+        if cotizacion is None:
+            cotizacion = {'zona': zona, 'peso_hasta': decimal_a_texto(pesos[tramo]), 'precio': decimal_a_texto(precios[tramo])}
+            self.cotizaciones[(zona, tramo)] = cotizacion
+        return cotizacion
+
+
+class RegistroEnvios:
+    """Índice de envíos del proceso, cargado perezosamente con una consulta por tabla.
+
+    Las tablas se escriben sólo con importar_envios, que lo descarta en el proceso y sube la
+    versión; los demás procesos la comparan cada REVISAR_CADA segundos.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.indice = None
+        self.generacion = 0
+        self.revisado = 0.0
+
+    @property
+    def config(self):
+        return settings.ENVIOS
+
+    def cargar(self):
+        version = VersionTabla.objects.de(TABLA)
+        rangos = RangoPostal.objects.values_list('zona', 'pais', 'desde', 'hasta')
+        tarifas = TarifaEnvio.objects.values_list('zona', 'peso_hasta', 'precio')
+        return IndiceEnvios(version, rangos, tarifas)
+
+    def vigente(self):
+        indice = self.indice
+        if indice is not None and time.monotonic() - self.revisado >= self.config['REVISAR_CADA']:
+            self.revisado = time.monotonic()
+            if VersionTabla.objects.de(TABLA) != indice.version:
+                self.invalidar()
+                indice = None
+        if indice is None:
+            generacion = self.generacion
+            indice = self.cargar()
+            with self.lock:
+                # Si se invalidó mientras se cargaba, la carga puede ser anterior a la escritura.
+                if generacion == self.generacion:
+                    self.indice = indice
+                    self.revisado = time.monotonic()
+        return indice
+
+    def invalidar(self):
+        with self.lock:
+            self.generacion += 1
+            self.indice = None
+
+
+registro_envios = RegistroEnvios()
+
+
+def cotizar_direcciones(direcciones, peso):
+    """Cotiza el envío de `peso` kilos a cada dirección en una pasada, sin consultas por dirección."""
+    indice = registro_envios.vigente()
+    cotizaciones = []
+    for direccion in direcciones:
+        zona = indice.zona(direccion.pais, direccion.codigo_postal)
+        cotizacion = indice.cotizar(zona, peso) if zona is not None else None
+        cotizaciones.append({
+            'direccion': direccion.id,
+            'zona': zona,
+            'peso_hasta': cotizacion['peso_hasta'] if cotizacion else None,
+            'precio': cotizacion['precio'] if cotizacion else None,
+            'disponible': cotizacion is not None,
+        })
+    return cotizaciones
+
+
+def cotizar_usuario(usuario_id, peso):
+    """Cotizaciones para todas las direcciones guardadas del usuario: una sola consulta."""
+    direcciones = Direccion.objects.filter(usuario_id=usuario_id).only('id', 'pais', 'codigo_postal').order_by('id')
+    return cotizar_direcciones(direcciones, peso)
+
+
+def validar_filas(filas, validador, archivo, resultado):
+    validas = []
+    for numero, fila in enumerate(filas, start=1):
+        try:
+            if isinstance(fila, Exception):
+                raise fila
+            validas.append((numero, validador.run_validation(fila)))
+        except serializers.ValidationError as e:
+            resultado['errores'].append({'archivo': archivo, 'fila': numero, 'errores': e.detail})
+    return validas
+
+
+def importar_envios(filas_zonas, filas_tarifas):
+    """Reemplaza rangos postales y tarifas; si alguna fila es inválida no se cambia nada."""
+    resultado = {'zonas': 0, 'tarifas': 0, 'errores': []}
+    rangos = validar_filas(filas_zonas, RangoPostalImportacionSerializer(), 'zonas', resultado)
+    tarifas = validar_filas(filas_tarifas, TarifaEnvioImportacionSerializer(), 'tarifas', resultado)
+    for numero in solapes(rangos):
+        resultado['errores'].append({'archivo': 'zonas', 'fila': numero, 'errores': ['El rango se solapa con otro del mismo país']})
+    vistas = set()
+    for numero, datos in tarifas:
+        clave = (datos['zona'], datos['peso_hasta'])
+        if clave in vistas:
+            resultado['errores'].append({'archivo': 'tarifas', 'fila': numero, 'errores': ['Tarifa repetida para la zona y el peso']})
+        vistas.add(clave)
+    if resultado['errores']:
+        resultado['errores'].sort(key=lambda error: (error['archivo'], error['fila']))
+        return resultado
+    with transaction.atomic():
+        RangoPostal.objects.all().delete()
+        TarifaEnvio.objects.all().delete()
+        RangoPostal.objects.bulk_create([RangoPostal(**datos) for _, datos in rangos])
+        TarifaEnvio.objects.bulk_create([TarifaEnvio(**datos) for _, datos in tarifas])
+        VersionTabla.objects.incrementar(TABLA)
+        transaction.on_commit(registro_envios.invalidar)
+    registro_envios.invalidar()
+    resultado['zonas'], resultado['tarifas'] = len(rangos), len(tarifas)
+    return resultado
@@ -0,0 +1,60 @@
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import Count, Max, Min, Q
+
+from .categorias import registro_categorias
+from .serializacion import decimal_a_texto
+
+
+def rangos_precio(cortes=None):
+    cortes = sorted(cortes if cortes is not None else settings.PRODUCTOS_RANGOS_PRECIO)
+    limites = [0, *cortes]
+    return list(zip(limites, [*cortes, None]))
+
+
+def filtro_rango(desde, hasta):
+    condicion = Q(precio__gte=desde)
+    if hasta is not None:
+        condicion &= Q(precio__lt=hasta)
+    return condicion
+
+
+def calcular_facetas(queryset, cortes=None):
+    """Conteos por categoría, con stock e histograma de precios en una sola consulta agrupada."""
+    rangos = rangos_precio(cortes)
+    filas = (
+        queryset.order_by()
+        .values('categoria_id')
+        .annotate(
+            total=Count('id'),
+            en_stock=Count('id', filter=Q(stock__gt=0)),
+            precio_min=Min('precio'),
+            precio_max=Max('precio'),
+            **{f'rango_{i}': Count('id', filter=filtro_rango(*rango)) for i, rango in enumerate(rangos)},
+        )
+    )
+    nombres = registro_categorias.vigentes()
+    categorias = [
+        {
+            'id': fila['categoria_id'],
+            'nombre': nombres.nombre_de(fila['categoria_id']),
+            'total': fila['total'],
+            'en_stock': fila['en_stock'],
+            'precio_min': decimal_a_texto(fila['precio_min']),
+            'precio_max': decimal_a_texto(fila['precio_max']),
+            'precios': [fila[f'rango_{i}'] for i in range(len(rangos))],
+        }
+        for fila in filas
+    ]
+    categorias.sort(key=lambda c: c['nombre'] or '')
+    # Los totales globales salen de sumar los grupos, sin una segunda consulta.
+    return {
+        'total': sum(c['total'] for c in categorias),
+        'en_stock': sum(c['en_stock'] for c in categorias),
+        'precio_min': min((c['precio_min'] for c in categorias), key=Decimal, default=None),
+        'precio_max': max((c['precio_max'] for c in categorias), key=Decimal, default=None),
+        'rangos': [{'desde': desde, 'hasta': hasta} for desde, hasta in rangos],
+        'precios': [sum(c['precios'][i] for c in categorias) for i in range(len(rangos))],
+        'categorias': categorias,
+    }
@@ -0,0 +1,31 @@
+import django_filters
+from .categorias import registro_categorias
+from .models import Producto
+
+
+class ProductoFilter(django_filters.FilterSet):
+    precio_min = django_filters.NumberFilter(field_name='precio', lookup_expr='gte')
+    precio_max = django_filters.NumberFilter(field_name='precio', lookup_expr='lte')
+    en_stock = django_filters.BooleanFilter(method='filtrar_en_stock')
+    categoria = django_filters.CharFilter(method='filtrar_categoria')
+    nombre = django_filters.CharFilter(field_name='nombre', lookup_expr='istartswith')
+
+    class Meta:
+        model = Producto
+        fields = ['precio_min', 'precio_max', 'en_stock', 'categoria', 'nombre']
+
+    def __init__(self, *args, categorias=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.categorias = categorias
+
+    def filtrar_categoria(self, queryset, name, value):
+        # Por id desde el registro: sin join con categorias.
+        categoria_id = (self.categorias or registro_categorias.vigentes()).id_de(value)
+        if categoria_id is None:
+            return queryset.none()
+        return queryset.filter(categoria_id=categoria_id)
+
+    def filtrar_en_stock(self, queryset, name, value):
+        if value:
+            return queryset.filter(stock__gt=0)
+        return queryset.filter(stock__lte=0)
@@ -0,0 +1,214 @@
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from backend.basedatos import primario
+from backend.instrumentacion import medir
+from .models import Producto
+from .signals import catalogo_modificado
+
+logger = logging.getLogger(__name__)
+
+
+class CloudinaryUploader:
+    def subir(self, ruta, carpeta, anchos=()):
+        from cloudinary.uploader import upload
+        # Las variantes se generan al subir (eager) para que la primera visita no pague la transformación.
+        eager = [{'width': ancho, 'crop': 'limit', 'fetch_format': 'auto', 'quality': 'auto'} for ancho in anchos]
+        return upload(ruta, folder=carpeta, eager=eager, eager_async=True)
+
+    @staticmethod
+    def url_variante(url, ancho):
+        return url.replace('/upload/', f'/upload/c_limit,f_auto,q_auto,w_{ancho}/', 1)
+
+    def borrar(self, public_id):
+        from cloudinary.uploader import destroy
+        destroy(public_id)
+
+
+class UploaderFalso:
+    """Uploader en memoria para pruebas y benchmarks; no sale a la red."""
+
+    subidas = []
+    borrados = []
+    fallos_pendientes = 0
+
+    def subir(self, ruta, carpeta, anchos=()):
+        if UploaderFalso.fallos_pendientes:
+            UploaderFalso.fallos_pendientes -= 1
+            raise ConnectionError('Fallo simulado de subida')
+        public_id = f'{carpeta}/{uuid.uuid4().hex}'
+        UploaderFalso.subidas.append((ruta, carpeta))
+        return {'public_id': public_id, 'secure_url': f'https://imagenes.test/{public_id}.jpg'}
+
+    def borrar(self, public_id):
+        UploaderFalso.borrados.append(public_id)
+
+    @staticmethod
+    def url_variante(url, ancho):
+        return url.replace('https://imagenes.test/', f'https://imagenes.test/w_{ancho}/', 1)
+
+    @classmethod
+    def reiniciar(cls):
+        cls.subidas, cls.borrados, cls.fallos_pendientes = [], [], 0
+
+
+@lru_cache
+def clase_uploader(ruta):
+    return import_string(ruta)
+
+
+def urls_variantes(urlfoto, variantes):
+    """URLs por variante a partir de la original y los anchos guardados en Producto.variantes."""
+    if not urlfoto or not variantes:
+        return {}
+    uploader = clase_uploader(settings.INVENTARIO_IMAGENES['UPLOADER'])
+    return {nombre: uploader.url_variante(urlfoto, ancho) for nombre, ancho in variantes.items()}
+
+
+def srcset(urlfoto, variantes):
+    if not urlfoto or not variantes:
+        return None
+    uploader = clase_uploader(settings.INVENTARIO_IMAGENES['UPLOADER'])
+    anchos = sorted(set(variantes.values()))
+    return ', '.join(f'{uploader.url_variante(urlfoto, ancho)} {ancho}w' for ancho in anchos)
+
+
+class ColaImagenes:
+    def __init__(self):
+        self.executor = None
+        self.lock = threading.Lock()
+
+    @property
+    def config(self):
+        return settings.INVENTARIO_IMAGENES
+
+    def uploader(self):
+        return import_string(self.config['UPLOADER'])()
+
+    def encolar(self, tarea, *args):
+        # Se encola al confirmar la transacción para que el worker vea el producto ya guardado.
+        transaction.on_commit(lambda: self.ejecutar(tarea, *args))
+
+    def ejecutar(self, tarea, *args):
+        if self.config['SINCRONO']:
+            return tarea(*args)
+        with self.lock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(self.config['HILOS'], thread_name_prefix='imagenes')
+        self.executor.submit(self.en_worker, tarea, *args)
+
+    def en_worker(self, tarea, *args):
+        try:
+            with primario():
+                tarea(*args)
+        except Exception:
+            logger.exception('Falló la tarea de imágenes %s', tarea.__name__)
+        finally:
+            close_old_connections()
+
+    def reintentar(self, funcion, *args):
+        intentos = self.config['REINTENTOS']
+        for intento in range(intentos):
+            try:
+                return funcion(*args)
+            except Exception:
+                if intento == intentos - 1:
+                    raise
+                time.sleep(self.config['ESPERA'] * 2 ** intento)
+
+
+cola_imagenes = ColaImagenes()
+
+
+def preparar_imagen(imagen):
+    directorio = cola_imagenes.config['DIRECTORIO']
+    os.makedirs(directorio, exist_ok=True)
+    extension = os.path.splitext(imagen.name)[1].lower()
+    ruta = os.path.join(directorio, f'{uuid.uuid4().hex}{extension}')
+    with open(ruta, 'wb') as destino:
+        for chunk in imagen.chunks():
+            destino.write(chunk)
+    return ruta
+
+
+def carpeta_de(producto):
+    return f"productos/{producto.id}-{producto.nombre}"
+
+
+def subir_imagen(producto_id, ruta, carpeta):
+    uploader = cola_imagenes.uploader()
+    variantes = cola_imagenes.config['VARIANTES']
+    try:
+        with medir('subida_imagen'):
+            respuesta = cola_imagenes.reintentar(uploader.subir, ruta, carpeta, list(variantes.values()))
+    except Exception:
+        logger.exception('No se pudo subir la imagen del producto %s', producto_id)
+        Producto.objects.filter(pk=producto_id).update(
+            estado_imagen=Producto.IMAGEN_ERROR, imagen_pendiente='', updated_at=timezone.now(),
+        )
+        catalogo_modificado.send(sender=Producto, ids=[producto_id], campos=['estado_imagen'])
+        return
+    finally:
+        if os.path.exists(ruta):
+            os.remove(ruta)
+    # La imagen que se reemplaza es la que figura al terminar la subida, no la de cuando se encoló.
+    anterior = Producto.objects.filter(pk=producto_id).values_list('public_id_foto', flat=True).first()
+    Producto.objects.filter(pk=producto_id).update(
+        urlfoto=respuesta['secure_url'], public_id_foto=respuesta['public_id'], variantes=variantes,
+        estado_imagen=Producto.IMAGEN_LISTA, imagen_pendiente='', updated_at=timezone.now(),
+    )
+    catalogo_modificado.send(sender=Producto, ids=[producto_id], campos=['urlfoto', 'variantes', 'estado_imagen'])
+    if anterior and anterior != respuesta['public_id']:
+        borrar_imagen(anterior)
+
+
+def borrar_imagen(public_id):
+    uploader = cola_imagenes.uploader()
+    try:
+        with medir('borrado_imagen'):
+            cola_imagenes.reintentar(uploader.borrar, public_id)
+    except Exception:
+        logger.exception('No se pudo borrar la imagen %s', public_id)
+
+
+def encolar_subida(producto):
+    """Encola la subida de producto.imagen_pendiente, ya guardada con preparar_imagen."""
+    cola_imagenes.encolar(subir_imagen, producto.id, producto.imagen_pendiente, carpeta_de(producto))
+
+
+def encolar_borrado(public_id):
+    cola_imagenes.encolar(borrar_imagen, public_id)
+
+
+def reanudar_subidas(antiguedad):
+    """Sube en este proceso las imágenes pendientes hace más de `antiguedad` segundos.
+
+    Son las que un reinicio sacó de la cola; las que ya no tienen archivo local quedan en error.
+    Devuelve (reanudadas, perdidas).
+    """
+    limite = timezone.now() - timedelta(seconds=antiguedad)
+    pendientes = Producto.objects.filter(estado_imagen=Producto.IMAGEN_PENDIENTE, updated_at__lt=limite)
+    reanudadas, perdidas = 0, []
+    for producto in pendientes.only('id', 'nombre', 'imagen_pendiente').order_by('id'):
+        if producto.imagen_pendiente and os.path.exists(producto.imagen_pendiente):
+            subir_imagen(producto.id, producto.imagen_pendiente, carpeta_de(producto))
+            reanudadas += 1
+        else:
+            perdidas.append(producto.id)
+    if perdidas:
+        Producto.objects.filter(pk__in=perdidas).update(
+            estado_imagen=Producto.IMAGEN_ERROR, imagen_pendiente='', updated_at=timezone.now(),
+        )
+        catalogo_modificado.send(sender=Producto, ids=perdidas, campos=['estado_imagen'])
+    return reanudadas, len(perdidas)
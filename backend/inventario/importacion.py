@@ -0,0 +1,139 @@
+import codecs
+import csv
+import json
+from itertools import islice
+
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+from rest_framework import serializers
+
+from .categorias import registro_categorias
+from .models import Producto, Categoria
+from .serializers import ProductoImportacionSerializer
+from .signals import catalogo_modificado
+
+COLUMNAS = ['id', 'nombre', 'categoria', 'descripcion', 'precio', 'stock', 'urlfoto']
+CAMPOS_ACTUALIZABLES = ['nombre', 'categoria_id', 'descripcion', 'precio', 'stock', 'urlfoto', 'updated_at']
+
+
+def formato_de(archivo, formato=None):
+    formato = (formato or archivo.name.rsplit('.', 1)[-1]).lower()
+    if formato not in ('csv', 'jsonl'):
+        raise serializers.ValidationError({'formato': 'Formato no soportado, use csv o jsonl'})
+    return formato
+
+
+def verificar_utf8(archivo):
+    """Recorre el archivo antes de importar: un error de codificación a mitad de camino dejaría lotes ya guardados."""
+    decodificador = codecs.getincrementaldecoder('utf-8-sig')()
+    try:
+        for bloque in iter(lambda: archivo.read(64 * 1024), b''):
+            decodificador.decode(bloque)
+        decodificador.decode(b'', final=True)
+    except UnicodeDecodeError as e:
+        raise serializers.ValidationError({'archivo': [f'El archivo no es UTF-8 válido: {e.reason}']})
+    finally:
+        archivo.seek(0)
+
+
+def leer_filas(archivo, formato):
+    verificar_utf8(archivo)
+    lineas = codecs.iterdecode(archivo, 'utf-8-sig')
+    if formato == 'csv':
+        for fila in csv.DictReader(lineas):
+            yield {columna: valor for columna, valor in fila.items() if valor != ''}
+        return
+    for linea in lineas:
+        if linea.strip():
+            try:
+                yield json.loads(linea)
+            except json.JSONDecodeError as e:
+                yield serializers.ValidationError({'non_field_errors': [f'JSON inválido: {e.msg}']})
+
+
+def lotes(iterable, tamano):
+    iterador = iter(iterable)
+    while lote := list(islice(iterador, tamano)):
+        yield lote
+
+
+def importar_productos(filas, tamano_lote):
+    categorias = dict(Categoria.objects.values_list('nombre', 'id'))
+    validador = ProductoImportacionSerializer(context={'categorias': categorias})
+    resultado = {'creados': 0, 'actualizados': 0, 'errores': []}
+    ids = []
+    numero = 0
+    for lote in lotes(filas, tamano_lote):
+        validas = []
+        for fila in lote:
+            numero += 1
+            try:
+                if isinstance(fila, Exception):
+                    raise fila
+                validas.append((numero, validador.run_validation(fila)))
+            except serializers.ValidationError as e:
+                resultado['errores'].append({'fila': numero, 'errores': e.detail})
+        ids.extend(guardar_lote(validas, resultado))
+    if ids:
+        catalogo_modificado.send(sender=Producto, ids=ids)
+    resultado['errores'].sort(key=lambda error: error['fila'])
+    return resultado
+
+
+def guardar_lote(validas, resultado):
+    existentes = Producto.objects.in_bulk([datos['id'] for _, datos in validas if datos.get('id') is not None])
+    nuevos, actualizados, numeros = [], [], []
+    ahora = timezone.now()
+    for numero, datos in validas:
+        if datos.get('id') is None:
+            datos.pop('id', None)
+            nuevos.append(Producto(**datos))
+            numeros.append(numero)
+            continue
+        producto = existentes.get(datos.pop('id'))
+        if producto is None:
+            resultado['errores'].append({'fila': numero, 'errores': {'id': ['Producto no encontrado']}})
+            continue
+        for campo, valor in datos.items():
+            setattr(producto, campo, valor)
+        producto.updated_at = ahora
+        actualizados.append(producto)
+        numeros.append(numero)
+    try:
+        with transaction.atomic():
+            Producto.objects.bulk_create(nuevos)
+            Producto.objects.bulk_update(actualizados, CAMPOS_ACTUALIZABLES)
+    except DatabaseError as e:
+        # Los lotes anteriores ya quedaron guardados: se informa el lote fallido y se sigue con el resto.
+        for numero in numeros:
+            resultado['errores'].append({'fila': numero, 'errores': {'non_field_errors': [f'No se pudo guardar el lote: {e}']}})
+        return []
+    resultado['creados'] += len(nuevos)
+    resultado['actualizados'] += len(actualizados)
+    return [producto.id for producto in nuevos + actualizados]
+
+
+class Eco:
+    """Buffer de solo escritura para que csv.writer devuelva cada línea en vez de acumularla."""
+
+    def write(self, valor):
+        return valor
+
+
+def exportar_productos(formato, tamano_lote):
+    categorias = registro_categorias.vigentes()
+    valores = (
+        Producto.objects.order_by('id')
+        .values_list('id', 'nombre', 'categoria_id', 'descripcion', 'precio', 'stock', 'urlfoto')
+        .iterator(chunk_size=tamano_lote)
+    )
+    # El nombre de la categoría sale del registro en vez de un join.
+    filas = ((producto_id, nombre, categorias.nombre_de(categoria_id), *resto) for producto_id, nombre, categoria_id, *resto in valores)
+    if formato == 'csv':
+        escritor = csv.writer(Eco())
+        yield escritor.writerow(COLUMNAS)
+        for fila in filas:
+            yield escritor.writerow(fila)
+        return
+    for fila in filas:
+        yield json.dumps(dict(zip(COLUMNAS, fila)), default=str, ensure_ascii=False) + '\n'
@@ -0,0 +1,208 @@
+import gzip
+import logging
+import os
+import threading
+from urllib.parse import quote
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.http import FileResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags, quote_etag
+
+from backend.basedatos import primario
+from .cambios import ultimo_seq
+from .models import Categoria, Producto
+from .renderers import json_compacto
+from .serializacion import valores_productos, filas_a_dicts
+from .signals import catalogo_modificado, solo_stock
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Codificación -> extensión, en orden de preferencia del servidor.
+EXTENSIONES = {'br': '.br', 'gzip': '.gz'}
+
+
+def nombre_listado(categoria=None):
+    # quote y no slugify: el nombre debe coincidir exactamente, igual que el filtro de la vista.
+    return f'categoria-{quote(categoria, safe="")}' if categoria else 'productos'
+
+
+def comprimir(contenido):
+    variantes = {'gzip': gzip.compress(contenido, compresslevel=settings.INSTANTANEAS['NIVEL_GZIP'], mtime=0)}
+    if brotli is not None:
+        variantes['br'] = brotli.compress(contenido, quality=settings.INSTANTANEAS['NIVEL_BROTLI'])
+    return variantes
+
+
+def escribir(directorio, nombre, contenido):
+    # Se escribe aparte y se reemplaza: quien esté leyendo la versión anterior no ve un archivo a medias.
+    ruta = os.path.join(directorio, nombre)
+    temporal = f'{ruta}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(temporal, 'wb') as archivo:
+        archivo.write(contenido)
+    os.replace(temporal, ruta)
+
+
+def construir_listado(directorio, nombre, queryset):
+    contenido = json_compacto(filas_a_dicts(valores_productos(queryset.order_by('id'))))
+    escribir(directorio, f'{nombre}.json', contenido)
+    for codificacion, comprimido in comprimir(contenido).items():
+        escribir(directorio, f'{nombre}.json{EXTENSIONES[codificacion]}', comprimido)
+    return len(contenido)
+
+
+class Instantaneas:
+    """Listados del catálogo pre-renderizados y comprimidos en disco.
+
+    Cada escritura del catálogo borra las instantáneas en el acto (mientras tanto se responde por
+    la ruta normal) y agenda una reconstrucción; varias escrituras seguidas se agrupan en una sola.
+    Los cambios que sólo tocan el stock no borran nada: servir el valor anterior hasta que la
+    reconstrucción las reemplaza es preferible a perder las instantáneas en cada venta.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.agendada = None
+
+    @property
+    def config(self):
+        return settings.INSTANTANEAS
+
+    def construir(self):
+        # Se lee del primario: en una réplica atrasada ultimo_seq y los listados podrían no ver la escritura que la agendó.
+        with primario():
+            return self.construir_listados()
+
+    def construir_listados(self):
+        directorio = self.config['DIRECTORIO']
+        os.makedirs(directorio, exist_ok=True)
+        for _ in range(self.config['INTENTOS']):
+            # Si otro proceso escribió mientras se construía, se vuelve a construir.
+            seq = ultimo_seq()
+            vigentes = {'productos'}
+            tamanos = {'productos': construir_listado(directorio, 'productos', Producto.objects.all())}
+            for categoria_id, nombre in Categoria.objects.values_list('id', 'nombre'):
+                archivo = nombre_listado(nombre)
+                vigentes.add(archivo)
+                tamanos[archivo] = construir_listado(directorio, archivo, Producto.objects.filter(categoria_id=categoria_id))
+            if ultimo_seq() == seq:
+                break
+        else:
+            # Con escrituras continuas no se insiste en este hilo: se deja lo construido y se reintenta más tarde.
+            logger.warning('El catálogo cambió en cada uno de los %s intentos; se reagenda la reconstrucción', self.config['INTENTOS'])
+            self.agendar()
+        for archivo in os.listdir(directorio):
+            if archivo.split('.', 1)[0] not in vigentes:
+                os.remove(os.path.join(directorio, archivo))
+        return tamanos
+
+    def invalidar(self):
+        directorio = self.config['DIRECTORIO']
+        if not os.path.isdir(directorio):
+            return
+        for archivo in os.listdir(directorio):
+            if not archivo.endswith('.tmp'):
+                try:
+                    os.remove(os.path.join(directorio, archivo))
+                except FileNotFoundError:
+                    pass
+
+    def reconstruir(self, invalidar=True):
+        if invalidar:
+            self.invalidar()
+        if self.config['SINCRONO']:
+            self.construir()
+            return
+        self.agendar()
+
+    def agendar(self):
+        with self.lock:
+            if self.agendada is not None:
+                return
+            self.agendada = threading.Timer(self.config['DEMORA'], self.construir_agendada)
+            self.agendada.daemon = True
+            self.agendada.start()
+
+    def construir_agendada(self):
+        with self.lock:
+            self.agendada = None
+        try:
+            self.construir()
+        except Exception:
+            logger.exception('No se pudieron reconstruir las instantáneas del catálogo')
+        finally:
+            close_old_connections()
+
+    def servir(self, request, categoria=None):
+        """FileResponse con la mejor codificación aceptada, o None si no hay instantánea."""
+        if not self.config['ACTIVAS']:
+            return None
+        base = os.path.join(self.config['DIRECTORIO'], f'{nombre_listado(categoria)}.json')
+        for codificacion in [*aceptadas(request.headers.get('Accept-Encoding', '')), None]:
+            try:
+                archivo = open(base + EXTENSIONES.get(codificacion, ''), 'rb')
+            except FileNotFoundError:
+                continue
+            estado = os.fstat(archivo.fileno())
+            etag = quote_etag(f'{codificacion or "identity"}-{estado.st_mtime_ns:x}-{estado.st_size:x}')
+            if etag in parse_etags(request.headers.get('If-None-Match', '')):
+                archivo.close()
+                response = HttpResponseNotModified()
+            else:
+                response = FileResponse(archivo, content_type='application/json')
+                # Es una respuesta de la API, no una descarga.
+                del response['Content-Disposition']
+                if codificacion:
+                    response['Content-Encoding'] = codificacion
+            response['ETag'] = etag
+            patch_vary_headers(response, ['Accept-Encoding'])
+            return response
+        return None
+
+
+def aceptadas(accept_encoding):
+    """Codificaciones disponibles que el cliente acepta, en el orden de preferencia del servidor."""
+    calidades = {}
+    for parte in accept_encoding.split(','):
+        codificacion, _, parametros = parte.strip().partition(';')
+        calidad = 1.0
+        parametros = parametros.strip()
+        if parametros.startswith('q='):
+            try:
+                calidad = float(parametros[2:])
+            except ValueError:
+                calidad = 0.0
+        calidades[codificacion.strip().lower()] = calidad
+    comodin = calidades.get('*', 0.0)
+    return [codificacion for codificacion in EXTENSIONES if calidades.get(codificacion, comodin) > 0]
+
+
+instantaneas = Instantaneas()
+
+
+@receiver(catalogo_modificado)
+def reconstruir_instantaneas(sender, campos=None, **kwargs):
+    if instantaneas.config['ACTIVAS']:
+        instantaneas.reconstruir(invalidar=not solo_stock(campos))
+
+
+@receiver(post_save, sender=Producto)
+@receiver(post_delete, sender=Producto)
+@receiver(post_save, sender=Categoria)
+@receiver(post_delete, sender=Categoria)
+def reconstruir_al_guardar(sender, update_fields=None, **kwargs):
+    # También las escrituras del admin o la shell, que no envían catalogo_modificado.
+    if not instantaneas.config['ACTIVAS']:
+        return
+    if not solo_stock(update_fields):
+        instantaneas.invalidar()
+    # Se reconstruye al confirmar: antes se leería el catálogo sin la escritura.
+    transaction.on_commit(lambda: instantaneas.reconstruir(invalidar=not solo_stock(update_fields)))
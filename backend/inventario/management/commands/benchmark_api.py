@@ -0,0 +1,175 @@
+import json
+import random
+import resource
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, close_old_connections
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from inventario.benchmarks import bd_temporal, sembrar_catalogo, percentiles
+from inventario.cache import catalogo_cache
+from inventario.categorias import registro_categorias
+from inventario.models import Categoria
+from usuarios.models import Usuario
+
+ESCALAS = {'1k': 1_000, '100k': 100_000, '1m': 1_000_000}
+CLAVE = 'clave-benchmark'
+
+
+def sembrar_usuarios(cantidad):
+    clave = make_password(CLAVE)
+    Usuario.objects.bulk_create([
+        Usuario(username=f'cliente{i}@bench.cl', email=f'cliente{i}@bench.cl', password=clave, nombre='Cliente', apellido=str(i))
+        for i in range(cantidad)
+    ], batch_size=1000)
+
+
+class Escenarios:
+    def __init__(self, usuarios):
+        self.usuarios = usuarios
+        self.tokens = {}
+        self.lock = threading.Lock()
+
+    def email(self):
+        return f'cliente{random.randrange(self.usuarios)}@bench.cl'
+
+    def productos(self, client):
+        return client.get('/api/productos/', {'page_size': 50, 'precio_min': random.randint(50, 4000)})
+
+    def filtrado_categoria(self, client):
+        categoria = random.choice(Categoria.CATEGORIAS_CHOICES)[0]
+        return client.get('/api/productos/filtrado_categoria/', {'categoria': categoria, 'page_size': 50})
+
+    def login(self, client):
+        return client.post('/auth/login/', {'email': self.email(), 'password': CLAVE})
+
+    def perfil(self, client):
+        email = self.email()
+        with self.lock:
+            token = self.tokens.get(email)
+        if token is None:
+            token = Client().post('/auth/login/', {'email': email, 'password': CLAVE}).json()['access']
+            with self.lock:
+                self.tokens[email] = token
+        return client.put(
+            '/auth/perfil/', json.dumps({'nombre': f'Cliente {random.randint(0, 999)}'}),
+            content_type='application/json', HTTP_AUTHORIZATION=f'Bearer {token}',
+        )
+
+    def todos(self):
+        return {
+            'productos': self.productos,
+            'filtrado_categoria': self.filtrado_categoria,
+            'login': self.login,
+            'perfil': self.perfil,
+        }
+
+
+class Command(BaseCommand):
+    help = 'Mide latencia, throughput, consultas por petición y memoria de la API con clientes concurrentes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--escala', default='1k', help='1k, 100k, 1m o un número de productos.')
+        parser.add_argument('--usuarios', type=int, default=200)
+        parser.add_argument('--clientes', type=int, default=8, help='Clientes concurrentes.')
+        parser.add_argument('--peticiones', type=int, default=200, help='Peticiones por escenario.')
+        parser.add_argument('--escenarios', nargs='*', help='Subconjunto de escenarios a ejecutar.')
+        parser.add_argument('--baseline', help='JSON con resultados previos contra el cual comparar.')
+        parser.add_argument('--guardar', help='Ruta donde guardar los resultados en JSON.')
+        parser.add_argument('--tolerancia', type=float, default=0.5, help='Aumento relativo de p95 tolerado.')
+
+    def handle(self, *args, **options):
+        escala = options['escala'].lower()
+        productos = ESCALAS.get(escala) or int(escala)
+        imagenes = {**settings.INVENTARIO_IMAGENES, 'UPLOADER': 'inventario.imagenes.UploaderFalso', 'SINCRONO': True}
+        with override_settings(ALLOWED_HOSTS=['testserver'], INVENTARIO_IMAGENES=imagenes), bd_temporal():
+            sembrar_catalogo(productos)
+            sembrar_usuarios(options['usuarios'])
+            catalogo_cache.invalidar()
+            # La carga inicial del registro ocurre una vez por proceso; medirla inflaría el máximo de consultas.
+            registro_categorias.vigentes()
+            escenarios = Escenarios(options['usuarios']).todos()
+            elegidos = options['escenarios'] or list(escenarios)
+            resultados = {
+                'escala': productos,
+                'clientes': options['clientes'],
+                'escenarios': {nombre: self.medir(escenarios[nombre], options) for nombre in elegidos},
+                'rss_pico_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+            }
+
+        self.reportar(resultados)
+        if options['guardar']:
+            with open(options['guardar'], 'w') as archivo:
+                json.dump(resultados, archivo, indent=2)
+        if options['baseline']:
+            self.comparar(resultados, options['baseline'], options['tolerancia'])
+
+    def medir(self, escenario, options):
+        latencias, consultas, errores = [], [], []
+        lock = threading.Lock()
+        clientes = threading.local()
+
+        def peticion(_):
+            client = getattr(clientes, 'client', None) or Client()
+            clientes.client = client
+            try:
+                with CaptureQueriesContext(connection) as contexto:
+                    inicio = time.perf_counter()
+                    estado = escenario(client).status_code
+            except Exception as e:
+                estado = type(e).__name__
+            finally:
+                duracion = time.perf_counter() - inicio
+                close_old_connections()
+            with lock:
+                latencias.append(duracion)
+                consultas.append(len(contexto))
+                if estado != 200:
+                    errores.append(estado)
+
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(options['clientes']) as executor:
+            list(executor.map(peticion, range(options['peticiones'])))
+        total = time.perf_counter() - inicio
+        return {
+            **{nombre: valor * 1000 for nombre, valor in percentiles(latencias).items()},
+            'throughput': len(latencias) / total,
+            'consultas_por_peticion': max(consultas),
+            'errores': len(errores),
+        }
+
+    def reportar(self, resultados):
+        self.stdout.write(f"escala: {resultados['escala']} productos, {resultados['clientes']} clientes")
+        self.stdout.write(f"{'escenario':<20}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}{'consultas':>11}{'errores':>9}")
+        for nombre, m in resultados['escenarios'].items():
+            self.stdout.write(
+                f"{nombre:<20}{m['p50']:>10.2f}{m['p95']:>10.2f}{m['p99']:>10.2f}"
+                f"{m['throughput']:>10.1f}{m['consultas_por_peticion']:>11}{m['errores']:>9}"
+            )
+        self.stdout.write(f"RSS pico: {resultados['rss_pico_mb']:.1f} MB")
+
+    def comparar(self, resultados, ruta, tolerancia):
+        with open(ruta) as archivo:
+            baseline = json.load(archivo)
+        regresiones = []
+        for nombre, actual in resultados['escenarios'].items():
+            previo = baseline['escenarios'].get(nombre)
+            if previo is None:
+                continue
+            if actual['p95'] > previo['p95'] * (1 + tolerancia):
+                regresiones.append(f"{nombre}: p95 {previo['p95']:.2f} -> {actual['p95']:.2f} ms")
+            if actual['consultas_por_peticion'] > previo['consultas_por_peticion']:
+                regresiones.append(
+                    f"{nombre}: consultas {previo['consultas_por_peticion']} -> {actual['consultas_por_peticion']}"
+                )
+            if actual['errores'] > previo['errores']:
+                regresiones.append(f"{nombre}: errores {previo['errores']} -> {actual['errores']}")
+        if regresiones:
+            raise CommandError('Regresiones respecto al baseline:\n' + '\n'.join(regresiones))
+        self.stdout.write(self.style.SUCCESS(f'Sin regresiones respecto a {ruta}'))
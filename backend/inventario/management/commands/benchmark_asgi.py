@@ -0,0 +1,102 @@
+import asyncio
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.test import AsyncClient, Client, override_settings
+
+from inventario.benchmarks import bd_temporal, sembrar_catalogo, percentiles
+from inventario.models import Categoria
+
+
+def rutas(prefijo):
+    categoria = random.choice(Categoria.CATEGORIAS_CHOICES)[0]
+    return random.choice([
+        (f'/api/{prefijo}productos/', {'page_size': 20, 'precio_min': random.randint(50, 4000)}),
+        (f'/api/{prefijo}productos/filtrado_categoria/', {'categoria': categoria, 'page_size': 20}),
+        (f'/api/{prefijo}productos/{random.randint(1, 1000)}/', {}),
+    ])
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara la ruta de lectura WSGI (DRF, pool de hilos) con la ASGI nativa (vistas async) '
+        'ante muchas conexiones concurrentes de clientes lentos.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--productos', type=int, default=10_000)
+        parser.add_argument('--conexiones', type=int, default=500)
+        parser.add_argument('--peticiones', type=int, default=2000)
+        parser.add_argument('--hilos-wsgi', type=int, default=32, help='Hilos del servidor WSGI simulado.')
+        parser.add_argument('--lento', type=float, default=50, help='Ms que cada cliente retiene la conexión.')
+
+    def handle(self, *args, **options):
+        with override_settings(ALLOWED_HOSTS=['testserver']), bd_temporal():
+            sembrar_catalogo(options['productos'])
+            resultados = {
+                'wsgi': self.medir_wsgi(options),
+                'asgi': self.medir_asgi(options),
+            }
+        self.stdout.write(
+            f"{options['conexiones']} conexiones, {options['peticiones']} peticiones, "
+            f"clientes lentos de {options['lento']:.0f} ms"
+        )
+        self.stdout.write(f"{'modo':<8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}{'errores':>9}")
+        for modo, r in resultados.items():
+            self.stdout.write(
+                f"{modo:<8}{r['p50']:>10.1f}{r['p95']:>10.1f}{r['p99']:>10.1f}{r['throughput']:>10.1f}{r['errores']:>9}"
+            )
+
+    def resumir(self, latencias, errores, duracion):
+        return {
+            **{nombre: valor * 1000 for nombre, valor in percentiles(latencias).items()},
+            'throughput': len(latencias) / duracion,
+            'errores': errores,
+        }
+
+    def medir_wsgi(self, options):
+        # Un cliente lento retiene su hilo mientras envía/recibe: se simula con sleep dentro del worker.
+        lento = options['lento'] / 1000
+        latencias, errores = [], 0
+        llegadas = time.perf_counter()
+
+        def atender(_):
+            try:
+                time.sleep(lento)
+                ruta, parametros = rutas('')
+                estado = Client().get(ruta, parametros).status_code
+            finally:
+                close_old_connections()
+            return time.perf_counter() - llegadas, estado
+
+        with ThreadPoolExecutor(options['hilos_wsgi']) as executor:
+            for latencia, estado in executor.map(atender, range(options['peticiones'])):
+                latencias.append(latencia)
+                errores += estado not in (200, 404)
+        return self.resumir(latencias, errores, time.perf_counter() - llegadas)
+
+    def medir_asgi(self, options):
+        lento = options['lento'] / 1000
+
+        async def correr():
+            limite = asyncio.Semaphore(options['conexiones'])
+            client = AsyncClient()
+            llegadas = time.perf_counter()
+
+            async def atender():
+                async with limite:
+                    await asyncio.sleep(lento)
+                    ruta, parametros = rutas('async/')
+                    response = await client.get(ruta, parametros)
+                    return time.perf_counter() - llegadas, response.status_code
+
+            respuestas = await asyncio.gather(*(atender() for _ in range(options['peticiones'])))
+            return respuestas, time.perf_counter() - llegadas
+
+        respuestas, duracion = asyncio.run(correr())
+        latencias = [latencia for latencia, _ in respuestas]
+        errores = sum(estado not in (200, 404) for _, estado in respuestas)
+        return self.resumir(latencias, errores, duracion)
@@ -0,0 +1,38 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from inventario import busqueda
+from inventario.benchmarks import NOMBRES, bd_temporal, sembrar_catalogo, percentiles
+
+
+class Command(BaseCommand):
+    help = 'Mide la latencia de la búsqueda full-text y del autocompletado sobre un catálogo sembrado.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--filas', type=int, default=1_000_000)
+        parser.add_argument('--consultas', type=int, default=2000)
+        parser.add_argument('--conservar', action='store_true', help='Reutiliza la base de prueba entre ejecuciones.')
+
+    def handle(self, *args, **options):
+        with bd_temporal(options['conservar']):
+            total = sembrar_catalogo(options['filas'])
+            inicio = time.perf_counter()
+            busqueda.actualizar_vectores()
+            busqueda.indice_productos.construir()
+            self.stdout.write(f'{total} productos indexados en {time.perf_counter() - inicio:.1f} s')
+
+            plegados = [busqueda.plegar(nombre) for nombre in NOMBRES]
+            modos = {
+                'búsqueda': lambda: busqueda.buscar(f'{random.choice(plegados)} seleccionada', 20),
+                'autocompletar': lambda: busqueda.autocompletar(random.choice(plegados)[:random.randint(2, 5)], 10),
+            }
+            for modo, consulta in modos.items():
+                latencias = []
+                for _ in range(options['consultas']):
+                    inicio = time.perf_counter()
+                    consulta()
+                    latencias.append(time.perf_counter() - inicio)
+                resumen = ', '.join(f'{nombre}: {valor * 1000:.2f} ms' for nombre, valor in percentiles(latencias).items())
+                self.stdout.write(f'{modo:<15}{resumen}')
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from inventario.benchmarks import bd_temporal, sembrar_catalogo
+from inventario.filters import ProductoFilter
+from inventario.models import Producto
+
+CONSULTAS = {
+    'categoria + rango de precio': {'categoria': 'Semillas', 'precio_min': '1000', 'precio_max': '1500'},
+    'solo con stock': {'en_stock': 'true'},
+    'prefijo de nombre': {'nombre': 'Almen'},
+}
+
+INDICES = {
+    'categoria + rango de precio': 'productos_cat_precio_idx',
+    'solo con stock': 'productos_stock_idx',
+    'prefijo de nombre': 'productos_nombre_',
+}
+
+
+class Command(BaseCommand):
+    help = 'Siembra una tabla de productos y muestra los planes de consulta de los filtros del catálogo.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--filas', type=int, default=1_000_000)
+        parser.add_argument('--conservar', action='store_true', help='Reutiliza la base de prueba entre ejecuciones.')
+
+    def handle(self, *args, **options):
+        with bd_temporal(options['conservar']):
+            total = sembrar_catalogo(options['filas'])
+            self.stdout.write(f'{total} productos sembrados')
+            fallos = 0
+            for nombre, parametros in CONSULTAS.items():
+                queryset = ProductoFilter(parametros, queryset=Producto.objects.all()).qs
+                plan = queryset.explain()
+                usa_indice = INDICES[nombre] in plan
+                fallos += not usa_indice
+                self.stdout.write(self.style.MIGRATE_HEADING(nombre))
+                self.stdout.write(plan)
+                estilo = self.style.SUCCESS if usa_indice else self.style.ERROR
+                self.stdout.write(estilo(f'usa {INDICES[nombre]}: {"sí" if usa_indice else "no"}'))
+            if fallos:
+                self.stderr.write(self.style.ERROR(f'{fallos} consultas no usan su índice'))
@@ -0,0 +1,52 @@
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+
+from inventario.benchmarks import bd_temporal, sembrar_catalogo, percentiles
+from inventario.cache import catalogo_cache
+from inventario.instantaneas import instantaneas, brotli
+
+
+class Command(BaseCommand):
+    help = 'Compara el listado de productos generado en cada petición con la instantánea pre-comprimida.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--filas', type=int, default=10_000)
+        parser.add_argument('--peticiones', type=int, default=200)
+
+    def handle(self, *args, **options):
+        if brotli is None:
+            self.stderr.write(self.style.WARNING('brotli no está instalado: se mide sólo gzip'))
+        directorio = tempfile.mkdtemp()
+        config = {**settings.INSTANTANEAS, 'ACTIVAS': True, 'DIRECTORIO': directorio}
+        with bd_temporal(), override_settings(INSTANTANEAS=config):
+            sembrar_catalogo(options['filas'])
+            inicio = time.perf_counter()
+            instantaneas.construir()
+            self.stdout.write(f"{options['filas']} productos; instantáneas construidas en {time.perf_counter() - inicio:.2f} s")
+
+            escenarios = [
+                # Sin caché del catálogo: el listado se arma en cada petición.
+                ('en vivo', False, 'gzip, br', catalogo_cache.invalidar),
+                ('en vivo (caché)', False, 'gzip, br', lambda: None),
+                ('instantánea gzip', True, 'gzip', lambda: None),
+                ('instantánea br', True, 'br, gzip', lambda: None),
+                ('instantánea sin comprimir', True, '', lambda: None),
+            ]
+            client = Client()
+            self.stdout.write(f"{'ruta':<28}{'p50 ms':>10}{'p95 ms':>10}{'bytes':>12}")
+            for nombre, activas, encoding, preparar in escenarios:
+                latencias, tamano = [], 0
+                with override_settings(INSTANTANEAS={**config, 'ACTIVAS': activas}):
+                    for _ in range(options['peticiones']):
+                        preparar()
+                        inicio = time.perf_counter()
+                        response = client.get('/api/productos/', HTTP_ACCEPT_ENCODING=encoding)
+                        contenido = b''.join(response.streaming_content) if response.streaming else response.content
+                        latencias.append(time.perf_counter() - inicio)
+                        tamano = len(contenido)
+                resumen = percentiles(latencias)
+                self.stdout.write(f"{nombre:<28}{resumen['p50'] * 1000:>10.2f}{resumen['p95'] * 1000:>10.2f}{tamano:>12}")
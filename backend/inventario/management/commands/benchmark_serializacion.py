@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from inventario.benchmarks import bd_temporal, sembrar_catalogo
+from inventario.models import Producto
+from inventario.renderers import ORJSONRenderer, orjson
+from inventario.serializacion import valores_productos, filas_a_dicts
+from inventario.serializers import ProductoSerializer
+
+
+def serializer_drf(queryset):
+    return JSONRenderer().render(ProductoSerializer(queryset.select_related('categoria'), many=True).data)
+
+
+def ruta_rapida(queryset):
+    return ORJSONRenderer().render(filas_a_dicts(valores_productos(queryset)))
+
+
+class Command(BaseCommand):
+    help = 'Compara ProductoSerializer + JSONRenderer con la ruta rápida (.values() + orjson) al listar productos.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--filas', type=int, nargs='*', default=[10_000, 100_000])
+        parser.add_argument('--repeticiones', type=int, default=3)
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            self.stderr.write(self.style.WARNING('orjson no está instalado: la ruta rápida usa el encoder de DRF'))
+        with bd_temporal():
+            sembrar_catalogo(max(options['filas']))
+            self.stdout.write(f"{'filas':>8}{'DRF ms':>12}{'rápida ms':>12}{'aceleración':>13}")
+            for filas in sorted(options['filas']):
+                queryset = Producto.objects.order_by('id')[:filas]
+                drf, contenido_drf = self.medir(serializer_drf, queryset, options['repeticiones'])
+                rapida, contenido_rapido = self.medir(ruta_rapida, queryset, options['repeticiones'])
+                if contenido_drf != contenido_rapido:
+                    raise CommandError(f'La ruta rápida no produce los mismos bytes con {filas} filas')
+                self.stdout.write(f'{filas:>8}{drf * 1000:>12.1f}{rapida * 1000:>12.1f}{drf / rapida:>12.1f}x')
+
+    def medir(self, ruta, queryset, repeticiones):
+        mejor, contenido = float('inf'), None
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            contenido = ruta(queryset.all())
+            mejor = min(mejor, time.perf_counter() - inicio)
+        return mejor, contenido
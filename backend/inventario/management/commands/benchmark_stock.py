@@ -0,0 +1,80 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, close_old_connections
+
+from inventario.benchmarks import bd_temporal, percentiles
+from inventario.models import Producto, Categoria, Reserva
+from inventario.reservas import reservar, StockInsuficiente
+
+
+class Command(BaseCommand):
+    help = 'Estresa la reserva de stock de un único producto desde muchos hilos y verifica que no haya sobreventa.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hilos', type=int, default=32)
+        parser.add_argument('--intentos', type=int, default=5000, help='Reservas totales a intentar.')
+        parser.add_argument('--stock', type=int, default=1000)
+        parser.add_argument('--cantidad', type=int, default=1, help='Unidades por reserva.')
+
+    def handle(self, *args, **options):
+        with bd_temporal():
+            categoria = Categoria.objects.create(nombre=Categoria.FRUTOS_SECOS)
+            producto = Producto.objects.create(
+                nombre='Almendra caliente', descripcion='SKU disputado', precio=1000,
+                stock=options['stock'], categoria=categoria,
+            )
+            resultados = self.estresar(producto.id, options)
+
+            producto.refresh_from_db()
+            reservado = sum(resultados['cantidades'])
+            self.stdout.write(f"reservas exitosas: {resultados['exitosas']}")
+            self.stdout.write(f"rechazadas por stock: {resultados['rechazadas']}")
+            self.stdout.write(f"reintentos por bloqueo: {resultados['reintentos']}")
+            self.stdout.write(f"throughput: {resultados['intentos'] / resultados['duracion']:.0f} intentos/s")
+            for nombre, valor in percentiles(resultados['latencias']).items():
+                self.stdout.write(f'{nombre}: {valor * 1000:.2f} ms')
+            self.stdout.write(f'stock final: {producto.stock} (inicial {options["stock"]}, reservado {reservado})')
+
+            sobreventa = producto.stock < 0 or producto.stock + reservado != options['stock']
+            sobreventa = sobreventa or Reserva.objects.count() != resultados['exitosas']
+            if sobreventa:
+                self.stderr.write(self.style.ERROR('Inconsistencia: hubo sobreventa o stock perdido'))
+            else:
+                self.stdout.write(self.style.SUCCESS('Sin sobreventa'))
+
+    def estresar(self, producto_id, options):
+        lock = threading.Lock()
+        resultados = {'exitosas': 0, 'rechazadas': 0, 'reintentos': 0, 'latencias': [], 'cantidades': []}
+
+        def intentar(_):
+            inicio = time.perf_counter()
+            try:
+                while True:
+                    try:
+                        reservar([(producto_id, options['cantidad'])])
+                        clave = 'exitosas'
+                        break
+                    except StockInsuficiente:
+                        clave = 'rechazadas'
+                        break
+                    except OperationalError:
+                        # SQLite serializa escrituras y puede devolver "database is locked".
+                        with lock:
+                            resultados['reintentos'] += 1
+            finally:
+                close_old_connections()
+            with lock:
+                resultados[clave] += 1
+                resultados['latencias'].append(time.perf_counter() - inicio)
+                if clave == 'exitosas':
+                    resultados['cantidades'].append(options['cantidad'])
+
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(options['hilos']) as executor:
+            list(executor.map(intentar, range(options['intentos'])))
+        resultados['duracion'] = time.perf_counter() - inicio
+        resultados['intentos'] = options['intentos']
+        return resultados
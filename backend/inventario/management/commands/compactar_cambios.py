@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from inventario.cambios import compactar
+
+
+class Command(BaseCommand):
+    help = 'Borra los registros de cambios superados por otro más nuevo y las lápidas vencidas.'
+
+    def handle(self, *args, **options):
+        superados, lapidas = compactar()
+        self.stdout.write(f'{superados} cambios superados y {lapidas} lápidas borradas')
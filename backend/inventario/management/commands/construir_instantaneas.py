@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from inventario.instantaneas import instantaneas, brotli
+
+
+class Command(BaseCommand):
+    help = 'Pre-renderiza el listado de productos y el de cada categoría en JSON, gzip y brotli.'
+
+    def handle(self, *args, **options):
+        if brotli is None:
+            self.stderr.write(self.style.WARNING('brotli no está instalado: sólo se generan JSON y gzip'))
+        tamanos = instantaneas.construir()
+        for nombre, tamano in tamanos.items():
+            self.stdout.write(f'{nombre}: {tamano} bytes')
@@ -0,0 +1,9 @@
+from django.core.management.base import BaseCommand
+from inventario.reservas import expirar_reservas
+
+
+class Command(BaseCommand):
+    help = 'Devuelve al stock las reservas pendientes que ya vencieron.'
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'{expirar_reservas()} reservas expiradas')
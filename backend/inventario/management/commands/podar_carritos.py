@@ -0,0 +1,9 @@
+from django.core.management.base import BaseCommand
+from inventario.carritos import podar_anonimos
+
+
+class Command(BaseCommand):
+    help = 'Borra los carritos anónimos que no cambiaron durante CARRITOS_TTL.'
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'{podar_anonimos()} carritos anónimos borrados')
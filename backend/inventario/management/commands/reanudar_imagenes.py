@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from inventario.imagenes import reanudar_subidas
+
+
+class Command(BaseCommand):
+    help = 'Sube las imágenes que quedaron pendientes, p. ej. porque el proceso se reinició antes de subirlas.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--antiguedad', type=int, default=600,
+            help='Segundos sin cambios para considerar abandonada una subida (evita repetir las que siguen en curso).',
+        )
+
+    def handle(self, *args, **options):
+        reanudadas, perdidas = reanudar_subidas(options['antiguedad'])
+        self.stdout.write(f'{reanudadas} subidas reanudadas, {perdidas} sin archivo marcadas con error')
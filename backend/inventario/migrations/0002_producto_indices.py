@@ -0,0 +1,55 @@
+# Generated by Django 5.1.7 on 2026-10-18 18:43
+
+from django.db import migrations, models
+
+
+# Índices de nombre dependientes del motor: trigram + prefijo en PostgreSQL
+# (Django compara con UPPER(nombre) en icontains/istartswith) y NOCASE en SQLite.
+INDICES_NOMBRE = {
+    'postgresql': (
+        [
+            'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+            'CREATE INDEX IF NOT EXISTS productos_nombre_trgm_idx '
+            'ON productos USING gin (UPPER(nombre::text) gin_trgm_ops)',
+            'CREATE INDEX IF NOT EXISTS productos_nombre_prefijo_idx '
+            'ON productos (UPPER(nombre::text) text_pattern_ops)',
+        ],
+        [
+            'DROP INDEX IF EXISTS productos_nombre_trgm_idx',
+            'DROP INDEX IF EXISTS productos_nombre_prefijo_idx',
+        ],
+    ),
+    'sqlite': (
+        ['CREATE INDEX IF NOT EXISTS productos_nombre_prefijo_idx ON productos (nombre COLLATE NOCASE)'],
+        ['DROP INDEX IF EXISTS productos_nombre_prefijo_idx'],
+    ),
+}
+
+
+def crear_indices_nombre(apps, schema_editor):
+    for sql in INDICES_NOMBRE.get(schema_editor.connection.vendor, ([], []))[0]:
+        schema_editor.execute(sql)
+
+
+def borrar_indices_nombre(apps, schema_editor):
+    for sql in INDICES_NOMBRE.get(schema_editor.connection.vendor, ([], []))[1]:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['categoria', 'precio'], name='productos_cat_precio_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['stock'], name='productos_stock_idx'),
+        ),
+        migrations.RunPython(crear_indices_nombre, borrar_indices_nombre),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.1.7 on 2026-10-18 19:02
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def crear_versiones(apps, schema_editor):
+    VersionTabla = apps.get_model('inventario', 'VersionTabla')
+    for tabla in ('productos', 'categorias'):
+        VersionTabla.objects.get_or_create(tabla=tabla)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0002_producto_indices'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.CreateModel(
+            name='VersionTabla',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tabla', models.CharField(max_length=64, unique=True)),
+                ('version', models.PositiveBigIntegerField(default=1)),
+                ('modificado', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'db_table': 'versiones_tabla',
+            },
+        ),
+        migrations.RunPython(crear_versiones, migrations.RunPython.noop),
+    ]
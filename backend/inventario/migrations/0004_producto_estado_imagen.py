@@ -0,0 +1,24 @@
+# Generated by Django 5.1.7 on 2026-10-18 18:47
+
+from django.db import migrations, models
+
+
+def marcar_imagenes_existentes(apps, schema_editor):
+    Producto = apps.get_model('inventario', 'Producto')
+    Producto.objects.exclude(urlfoto__isnull=True).exclude(urlfoto='').update(estado_imagen='lista')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0003_producto_updated_at_versiontabla'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='estado_imagen',
+            field=models.CharField(choices=[('sin_imagen', 'Sin imagen'), ('pendiente', 'Pendiente'), ('lista', 'Lista'), ('error', 'Error')], default='sin_imagen', max_length=20),
+        ),
+        migrations.RunPython(marcar_imagenes_existentes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.1.7 on 2026-10-18 18:49
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0004_producto_estado_imagen'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Reserva',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('confirmada', 'Confirmada'), ('liberada', 'Liberada'), ('expirada', 'Expirada')], default='pendiente', max_length=20)),
+                ('creada', models.DateTimeField(auto_now_add=True)),
+                ('expira', models.DateTimeField()),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='reservas', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'reservas',
+            },
+        ),
+        migrations.CreateModel(
+            name='ReservaItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cantidad', models.DecimalField(decimal_places=2, max_digits=20)),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservas', to='inventario.producto')),
+                ('reserva', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='inventario.reserva')),
+            ],
+            options={
+                'db_table': 'reserva_items',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='reserva',
+            index=models.Index(fields=['estado', 'expira'], name='reservas_estado_expira_idx'),
+        ),
+    ]
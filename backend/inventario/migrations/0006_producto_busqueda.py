@@ -0,0 +1,37 @@
+# Generated by Django 5.1.7 on 2026-10-18 18:59
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+def crear_indice_busqueda(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS unaccent')
+    schema_editor.execute('CREATE INDEX IF NOT EXISTS productos_busqueda_idx ON productos USING gin (busqueda)')
+    schema_editor.execute(
+        "UPDATE productos SET busqueda = "
+        "setweight(to_tsvector('spanish', unaccent(nombre)), 'A') || "
+        "setweight(to_tsvector('spanish', unaccent(descripcion)), 'B')"
+    )
+
+
+def borrar_indice_busqueda(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS productos_busqueda_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0005_reservas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='busqueda',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(crear_indice_busqueda, borrar_indice_busqueda),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.1.7 on 2026-10-18 19:14
+
+from django.db import migrations, models
+
+
+def variantes_existentes(apps, schema_editor):
+    # Cloudinary transforma bajo demanda, así que las imágenes ya subidas también admiten variantes.
+    Producto = apps.get_model('inventario', 'Producto')
+    Producto.objects.filter(urlfoto__contains='/image/upload/').update(
+        variantes={'miniatura': 160, 'tarjeta': 480, 'detalle': 1200},
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0006_producto_busqueda'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='variantes',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.RunPython(variantes_existentes, migrations.RunPython.noop),
+    ]
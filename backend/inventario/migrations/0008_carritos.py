@@ -0,0 +1,41 @@
+# Generated by Django 5.1.7 on 2026-10-18 19:17
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0007_producto_variantes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Carrito',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sesion', models.CharField(blank=True, max_length=40, null=True, unique=True)),
+                ('actualizado', models.DateTimeField(auto_now=True)),
+                ('usuario', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='carrito', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'carritos',
+            },
+        ),
+        migrations.CreateModel(
+            name='CarritoItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cantidad', models.DecimalField(decimal_places=2, max_digits=20)),
+                ('carrito', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='inventario.carrito')),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='carritos', to='inventario.producto')),
+            ],
+            options={
+                'db_table': 'carrito_items',
+                'constraints': [models.UniqueConstraint(fields=('carrito', 'producto'), name='carrito_items_unico')],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.7 on 2026-10-18 19:20
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0008_carritos'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Cambio',
+            fields=[
+                ('seq', models.BigAutoField(primary_key=True, serialize=False)),
+                ('tabla', models.CharField(max_length=64)),
+                ('objeto_id', models.BigIntegerField()),
+                ('borrado', models.BooleanField(default=False)),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'db_table': 'cambios',
+                'indexes': [models.Index(fields=['tabla', 'objeto_id'], name='cambios_objeto_idx'), models.Index(fields=['fecha'], name='cambios_fecha_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.1.7 on 2026-10-18 19:53
+
+import re
+from urllib.parse import unquote, urlparse
+
+from django.db import migrations, models
+
+
+def public_ids_existentes(apps, schema_editor):
+    # En las URLs de Cloudinary el public_id es lo que sigue a la versión (v123/), sin la extensión.
+    Producto = apps.get_model('inventario', 'Producto')
+    for producto in Producto.objects.filter(urlfoto__contains='/image/upload/').only('id', 'urlfoto'):
+        ruta = unquote(urlparse(producto.urlfoto).path).split('/image/upload/', 1)[1]
+        partes = ruta.split('/')
+        versiones = [i for i, parte in enumerate(partes) if re.fullmatch(r'v\d+', parte)]
+        if versiones:
+            partes = partes[versiones[0] + 1:]
+        Producto.objects.filter(pk=producto.pk).update(public_id_foto='/'.join(partes).rsplit('.', 1)[0])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0009_cambios'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='imagen_pendiente',
+            field=models.CharField(blank=True, default='', editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='public_id_foto',
+            field=models.CharField(blank=True, editable=False, max_length=255, null=True),
+        ),
+        migrations.RunPython(public_ids_existentes, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,7 @@
+from django.conf import settings
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from django.utils import timezone
 
 class Categoria(models.Model):
     FRUTOS_SECOS = 'Frutos secos'
@@ -31,15 +34,151 @@ class Categoria(models.Model):
 
 
 class Producto(models.Model):
+    IMAGEN_SIN_IMAGEN = 'sin_imagen'
+    IMAGEN_PENDIENTE = 'pendiente'
+    IMAGEN_LISTA = 'lista'
+    IMAGEN_ERROR = 'error'
+
+    ESTADOS_IMAGEN_CHOICES = [
+        (IMAGEN_SIN_IMAGEN, 'Sin imagen'),
+        (IMAGEN_PENDIENTE, 'Pendiente'),
+        (IMAGEN_LISTA, 'Lista'),
+        (IMAGEN_ERROR, 'Error'),
+    ]
+
     nombre = models.CharField(max_length=255)
     descripcion = models.CharField(max_length=255)
     precio = models.DecimalField(max_digits=20, decimal_places=2)
     stock = models.DecimalField(max_digits=20 ,decimal_places=2)
     categoria = models.ForeignKey(Categoria, on_delete=models.CASCADE)
     urlfoto = models.URLField(null=True, blank=True)
+    # Anchos de las variantes generadas al subir la imagen, p. ej. {"miniatura": 160, "tarjeta": 480}.
+    variantes = models.JSONField(default=dict, blank=True, editable=False)
+    estado_imagen = models.CharField(max_length=20, choices=ESTADOS_IMAGEN_CHOICES, default=IMAGEN_SIN_IMAGEN)
+    # public_id de Cloudinary para borrar la imagen: la URL no lo conserva con certeza (carpetas, versión).
+    public_id_foto = models.CharField(max_length=255, null=True, blank=True, editable=False)
+    # Archivo local que espera subirse; permite reanudar las subidas que un reinicio dejó pendientes.
+    imagen_pendiente = models.CharField(max_length=255, blank=True, default='', editable=False)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    busqueda = SearchVectorField(null=True, editable=False)
 
     class Meta:
         db_table = 'productos'
+        indexes = [
+            models.Index(fields=['categoria', 'precio'], name='productos_cat_precio_idx'),
+            models.Index(fields=['stock'], name='productos_stock_idx'),
+        ]
 
     def __str__(self):
         return self.nombre
+
+
+class VersionTablaManager(models.Manager):
+    def incrementar(self, tabla):
+        version, creada = self.get_or_create(tabla=tabla)
+        if not creada:
+            self.filter(pk=version.pk).update(version=models.F('version') + 1, modificado=timezone.now())
+
+    def de(self, tabla):
+        return self.filter(tabla=tabla).values_list('version', 'modificado').first()
+
+
+class VersionTabla(models.Model):
+    tabla = models.CharField(max_length=64, unique=True)
+    version = models.PositiveBigIntegerField(default=1)
+    modificado = models.DateTimeField(default=timezone.now)
+
+    objects = VersionTablaManager()
+
+    class Meta:
+        db_table = 'versiones_tabla'
+
+    def __str__(self):
+        return f"{self.tabla} v{self.version}"
+
+
+class Reserva(models.Model):
+    PENDIENTE = 'pendiente'
+    CONFIRMADA = 'confirmada'
+    LIBERADA = 'liberada'
+    EXPIRADA = 'expirada'
+
+    ESTADOS_CHOICES = [
+        (PENDIENTE, 'Pendiente'),
+        (CONFIRMADA, 'Confirmada'),
+        (LIBERADA, 'Liberada'),
+        (EXPIRADA, 'Expirada'),
+    ]
+
+    usuario = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='reservas')
+    estado = models.CharField(max_length=20, choices=ESTADOS_CHOICES, default=PENDIENTE)
+    creada = models.DateTimeField(auto_now_add=True)
+    expira = models.DateTimeField()
+
+    class Meta:
+        db_table = 'reservas'
+        indexes = [
+            models.Index(fields=['estado', 'expira'], name='reservas_estado_expira_idx'),
+        ]
+
+    def __str__(self):
+        return f"Reserva {self.id} ({self.estado})"
+
+
+class ReservaItem(models.Model):
+    reserva = models.ForeignKey(Reserva, on_delete=models.CASCADE, related_name='items')
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='reservas')
+    cantidad = models.DecimalField(max_digits=20, decimal_places=2)
+
+    class Meta:
+        db_table = 'reserva_items'
+
+    def __str__(self):
+        return f"{self.cantidad} x {self.producto_id}"
+
+
+class Carrito(models.Model):
+    # Un carrito pertenece a un usuario o, si es anónimo, a una sesión.
+    usuario = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True, related_name='carrito')
+    sesion = models.CharField(max_length=40, unique=True, null=True, blank=True)
+    actualizado = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'carritos'
+
+    def __str__(self):
+        return f"Carrito {self.id}"
+
+
+class CarritoItem(models.Model):
+    carrito = models.ForeignKey(Carrito, on_delete=models.CASCADE, related_name='items')
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='carritos')
+    cantidad = models.DecimalField(max_digits=20, decimal_places=2)
+
+    class Meta:
+        db_table = 'carrito_items'
+        constraints = [
+            models.UniqueConstraint(fields=['carrito', 'producto'], name='carrito_items_unico'),
+        ]
+
+    def __str__(self):
+        return f"{self.cantidad} x {self.producto_id}"
+
+
+class Cambio(models.Model):
+    """Registro secuencial de escrituras del catálogo; sólo guarda qué fila cambió, no su contenido."""
+    seq = models.BigAutoField(primary_key=True)
+    tabla = models.CharField(max_length=64)
+    objeto_id = models.BigIntegerField()
+    borrado = models.BooleanField(default=False)
+    fecha = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'cambios'
+        indexes = [
+            models.Index(fields=['tabla', 'objeto_id'], name='cambios_objeto_idx'),
+            models.Index(fields=['fecha'], name='cambios_fecha_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.seq} {self.tabla}:{self.objeto_id}{' (borrado)' if self.borrado else ''}"
@@ -0,0 +1,102 @@
+from django.conf import settings
+from django.core.exceptions import ValidationError as ValorInvalido
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import CursorPagination, _reverse_ordering
+from rest_framework.settings import api_settings
+
+
+class ProductoCursorPagination(CursorPagination):
+    """Paginación por cursor sobre la tupla completa del orden.
+
+    CursorPagination filtra sólo por el primer campo y resuelve los empates con un offset, que al
+    volver hacia atrás por precios repetidos pierde o repite filas. Aquí la posición guarda todos
+    los campos del orden (el último es el id, único), así que nunca hay empates ni offset.
+    """
+
+    page_size = settings.PRODUCTOS_PAGE_SIZE
+    max_page_size = settings.PRODUCTOS_MAX_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    ordering = ('id',)
+    ordenamientos = {
+        'id': ('id',),
+        '-id': ('-id',),
+        'precio': ('precio', 'id'),
+        '-precio': ('-precio', '-id'),
+    }
+    separador = '|'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        # La paginación es opcional: sin cursor ni page_size se responde completo.
+        if (self.cursor_query_param not in request.query_params
+                and self.page_size_query_param not in request.query_params):
+            return None
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        offset, reverse, posicion = self.cursor or (0, False, None)
+
+        orden = _reverse_ordering(self.ordering) if reverse else self.ordering
+        queryset = queryset.order_by(*orden)
+        if posicion is not None:
+            queryset = queryset.filter(self.despues_de(orden, self.valores_de(posicion, queryset.model)))
+
+        # Los cursores sin posición (o de enlaces anteriores) pueden traer offset.
+        resultados = list(queryset[offset:offset + self.page_size + 1])
+        self.page = resultados[:self.page_size]
+        siguiente = None
+        if len(resultados) > len(self.page):
+            siguiente = self._get_position_from_instance(resultados[-1], self.ordering)
+
+        if reverse:
+            self.page.reverse()
+            self.has_next = posicion is not None or offset > 0
+            self.has_previous = siguiente is not None
+            self.next_position, self.previous_position = posicion, siguiente
+        else:
+            self.has_next = siguiente is not None
+            self.has_previous = posicion is not None or offset > 0
+            self.next_position, self.previous_position = siguiente, posicion
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def get_ordering(self, request, queryset, view):
+        orden = request.query_params.get(api_settings.ORDERING_PARAM)
+        if orden is None:
+            return self.ordering
+        if orden not in self.ordenamientos:
+            # Otro orden que OrderingFilter acepte no coincidiría con el del cursor.
+            raise ValidationError({api_settings.ORDERING_PARAM: [f'Con paginación sólo se admite: {", ".join(self.ordenamientos)}']})
+        return self.ordenamientos[orden]
+
+    def _get_position_from_instance(self, instance, ordering):
+        campos = [campo.lstrip('-') for campo in ordering]
+        valores = [instance[campo] if isinstance(instance, dict) else getattr(instance, campo) for campo in campos]
+        return self.separador.join(str(valor) for valor in valores)
+
+    def valores_de(self, posicion, modelo):
+        partes = posicion.split(self.separador)
+        if len(partes) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        try:
+            return [modelo._meta.get_field(campo.lstrip('-')).to_python(parte) for campo, parte in zip(self.ordering, partes)]
+        except ValorInvalido:
+            raise NotFound(self.invalid_cursor_message)
+
+    @staticmethod
+    def despues_de(orden, valores):
+        """Filas estrictamente posteriores a la posición: (a, b) > (x, y) si a > x, o a = x y b > y."""
+        condicion = Q()
+        iguales = {}
+        for campo, valor in zip(orden, valores):
+            nombre = campo.lstrip('-')
+            operador = 'lt' if campo.startswith('-') else 'gt'
+            condicion |= Q(**iguales, **{f'{nombre}__{operador}': valor})
+            iguales[nombre] = valor
+        return condicion
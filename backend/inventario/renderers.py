@@ -0,0 +1,28 @@
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+_encoder = JSONEncoder()
+OPCIONES_ORJSON = (orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS) if orjson else 0
+
+
+def json_compacto(datos):
+    """Mismos bytes que JSONRenderer de DRF en modo compacto; usa orjson si está instalado."""
+    if orjson is None:
+        return JSONRenderer().render(datos)
+    # Fechas, Decimal y textos perezosos pasan por el encoder de DRF para conservar su formato.
+    contenido = orjson.dumps(datos, default=_encoder.default, option=OPCIONES_ORJSON)
+    return contenido.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
+
+
+class ORJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        renderer_context = renderer_context or {}
+        if (orjson is None or data is None or self.ensure_ascii or not self.compact
+                or self.get_indent(accepted_media_type, renderer_context)):
+            return super().render(data, accepted_media_type, renderer_context)
+        return json_compacto(data)
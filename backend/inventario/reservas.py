@@ -0,0 +1,101 @@
+import threading
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Producto, Reserva, ReservaItem
+from .signals import catalogo_modificado
+
+
+class StockInsuficiente(Exception):
+    def __init__(self, producto_id):
+        super().__init__(f'Stock insuficiente para el producto {producto_id}')
+        self.producto_id = producto_id
+
+
+class ReservaNoVigente(Exception):
+    pass
+
+
+def notificar_cambio_stock(ids):
+    # Tras el commit y sin propagar errores: la reserva ya es válida aunque falle la invalidación.
+    transaction.on_commit(lambda: catalogo_modificado.send(sender=Producto, ids=ids, campos=['stock']), robust=True)
+
+
+def agrupar(items):
+    cantidades = defaultdict(int)
+    for producto_id, cantidad in items:
+        cantidades[producto_id] += cantidad
+    # Orden fijo por id: todas las transacciones bloquean filas en la misma secuencia y no hay deadlocks.
+    return sorted(cantidades.items())
+
+
+def reservar(items, usuario_id=None, duracion=None):
+    duracion = duracion or timedelta(minutes=settings.RESERVAS_DURACION_MINUTOS)
+    ahora = timezone.now()
+    lineas = agrupar(items)
+    with transaction.atomic():
+        for producto_id, cantidad in lineas:
+            descontados = Producto.objects.filter(pk=producto_id, stock__gte=cantidad).update(
+                stock=F('stock') - cantidad, updated_at=ahora,
+            )
+            if not descontados:
+                raise StockInsuficiente(producto_id)
+        reserva = Reserva.objects.create(usuario_id=usuario_id, expira=ahora + duracion)
+        ReservaItem.objects.bulk_create([
+            ReservaItem(reserva=reserva, producto_id=producto_id, cantidad=cantidad)
+            for producto_id, cantidad in lineas
+        ])
+        notificar_cambio_stock([producto_id for producto_id, _ in lineas])
+    return reserva
+
+
+def confirmar(reserva_id):
+    confirmadas = Reserva.objects.filter(
+        pk=reserva_id, estado=Reserva.PENDIENTE, expira__gt=timezone.now(),
+    ).update(estado=Reserva.CONFIRMADA)
+    if not confirmadas:
+        raise ReservaNoVigente(reserva_id)
+
+
+def liberar(reserva_id, estado=Reserva.LIBERADA):
+    ahora = timezone.now()
+    with transaction.atomic():
+        # La transición condicional garantiza que el stock se devuelva una sola vez.
+        if not Reserva.objects.filter(pk=reserva_id, estado=Reserva.PENDIENTE).update(estado=estado):
+            raise ReservaNoVigente(reserva_id)
+        lineas = list(ReservaItem.objects.filter(reserva_id=reserva_id).order_by('producto_id').values_list('producto_id', 'cantidad'))
+        for producto_id, cantidad in lineas:
+            Producto.objects.filter(pk=producto_id).update(stock=F('stock') + cantidad, updated_at=ahora)
+        notificar_cambio_stock([producto_id for producto_id, _ in lineas])
+
+
+def expirar_reservas():
+    vencidas = Reserva.objects.filter(estado=Reserva.PENDIENTE, expira__lte=timezone.now()).values_list('id', flat=True)
+    expiradas = 0
+    for reserva_id in vencidas:
+        try:
+            liberar(reserva_id, Reserva.EXPIRADA)
+            expiradas += 1
+        except ReservaNoVigente:
+            pass
+    return expiradas
+
+
+_ultimo_barrido = 0.0
+_barrido_lock = threading.Lock()
+
+
+def barrer_vencidas():
+    """Expira reservas como máximo una vez por intervalo y por proceso, sin depender de un cron."""
+    global _ultimo_barrido
+    with _barrido_lock:
+        if time.monotonic() - _ultimo_barrido < settings.RESERVAS_INTERVALO_BARRIDO:
+            return 0
+        _ultimo_barrido = time.monotonic()
+    return expirar_reservas()
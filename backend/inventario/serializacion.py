@@ -0,0 +1,84 @@
+from decimal import Decimal
+
+from .categorias import registro_categorias
+from .imagenes import urls_variantes, srcset
+
+DOS_DECIMALES = Decimal('0.01')
+
+
+def decimal_a_texto(valor):
+    """Mismo formato que DecimalField(decimal_places=2) de DRF, sin pasar por el serializer."""
+    if not isinstance(valor, Decimal):
+        valor = Decimal(str(valor))
+    return '{:f}'.format(valor.quantize(DOS_DECIMALES))
+
+
+def producto_a_dict(producto, categorias=None):
+    """Equivalente a ProductoSerializer(producto).data."""
+    categorias = categorias or registro_categorias.vigentes()
+    return {
+        'id': producto.id,
+        'nombre': producto.nombre,
+        'categoria': producto.categoria_id,
+        'categoria_nombre': categorias.nombre_de(producto.categoria_id),
+        'descripcion': producto.descripcion,
+        'precio': decimal_a_texto(producto.precio),
+        'stock': decimal_a_texto(producto.stock),
+        'urlfoto': producto.urlfoto,
+        'variantes': urls_variantes(producto.urlfoto, producto.variantes),
+        'srcset': srcset(producto.urlfoto, producto.variantes),
+        'estado_imagen': producto.estado_imagen,
+    }
+
+
+# Campo del schema -> columna de .values(), en el orden de ProductoSerializer.Meta.fields.
+COLUMNAS_PRODUCTO = {
+    'id': 'id',
+    'nombre': 'nombre',
+    'categoria': 'categoria_id',
+    # El nombre sale del registro de categorías, no de un join.
+    'categoria_nombre': 'categoria_id',
+    'descripcion': 'descripcion',
+    'precio': 'precio',
+    'stock': 'stock',
+    'urlfoto': 'urlfoto',
+    'variantes': 'variantes',
+    'srcset': 'variantes',
+    'estado_imagen': 'estado_imagen',
+}
+DECIMALES_PRODUCTO = {'precio', 'stock'}
+# La paginación por cursor lee la posición desde la fila, así que siempre se traen.
+COLUMNAS_CURSOR = ['id', 'precio']
+
+
+def columnas_producto(campos=None):
+    return [(campo, columna) for campo, columna in COLUMNAS_PRODUCTO.items() if not campos or campo in campos]
+
+
+def valores_productos(queryset, campos=None):
+    columnas = list(dict.fromkeys(columna for _, columna in columnas_producto(campos)))
+    if 'variantes' in columnas:
+        # Las URLs de las variantes se derivan de la original.
+        columnas.append('urlfoto')
+    return queryset.values(*dict.fromkeys([*columnas, *COLUMNAS_CURSOR]))
+
+
+def filas_a_dicts(filas, campos=None, categorias=None):
+    """Equivalente a ProductoSerializer(many=True).data para filas de valores_productos()."""
+    columnas = columnas_producto(campos)
+    if not campos or 'categoria_nombre' in campos:
+        categorias = categorias or registro_categorias.vigentes()
+    decimales = [campo for campo, _ in columnas if campo in DECIMALES_PRODUCTO]
+    resultado = []
+    for fila in filas:
+        producto = {campo: fila[columna] for campo, columna in columnas}
+        for campo in decimales:
+            producto[campo] = decimal_a_texto(producto[campo])
+        if 'categoria_nombre' in producto:
+            producto['categoria_nombre'] = categorias.nombre_de(producto['categoria_nombre'])
+        if 'variantes' in producto:
+            producto['variantes'] = urls_variantes(fila['urlfoto'], fila['variantes'])
+        if 'srcset' in producto:
+            producto['srcset'] = srcset(fila['urlfoto'], fila['variantes'])
+        resultado.append(producto)
+    return resultado
@@ -1,14 +1,94 @@
+from decimal import Decimal
+
 from rest_framework import serializers
-from .models import Producto, Categoria
+from backend.instrumentacion import medir
+from .categorias import registro_categorias
+from .imagenes import urls_variantes, srcset
+from .models import Producto, Categoria, Reserva, ReservaItem
+
+class CamposDinamicosMixin:
+    def __init__(self, *args, **kwargs):
+        campos = kwargs.pop('campos', None)
+        super().__init__(*args, **kwargs)
+        if campos:
+            for nombre in set(self.fields) - set(campos):
+                self.fields.pop(nombre)
+
+class SerializacionMedidaMixin:
+    @property
+    def data(self):
+        with medir('serializer'):
+            return super().data
+
+class ListaMedida(SerializacionMedidaMixin, serializers.ListSerializer):
+    pass
+
+class ProductoSerializer(SerializacionMedidaMixin, CamposDinamicosMixin, serializers.ModelSerializer):
+    categoria_nombre = serializers.SerializerMethodField()
+    variantes = serializers.SerializerMethodField()
+    srcset = serializers.SerializerMethodField()
 
-class ProductoSerializer(serializers.ModelSerializer):
-    categoria_nombre = serializers.StringRelatedField(source='categoria')
-    
     class Meta:
         model = Producto
-        fields = ['id','nombre','categoria','categoria_nombre','descripcion','precio','stock','urlfoto']
-        
-class CategoriaSerializer(serializers.ModelSerializer):
+        fields = ['id','nombre','categoria','categoria_nombre','descripcion','precio','stock','urlfoto','variantes','srcset','estado_imagen']
+        read_only_fields = ['estado_imagen']
+        list_serializer_class = ListaMedida
+
+    def get_categoria_nombre(self, producto):
+        return registro_categorias.vigentes().nombre_de(producto.categoria_id)
+
+    def get_variantes(self, producto):
+        return urls_variantes(producto.urlfoto, producto.variantes)
+
+    def get_srcset(self, producto):
+        return srcset(producto.urlfoto, producto.variantes)
+
+class CategoriaPorNombreField(serializers.Field):
+    default_error_messages = {'no_existe': 'Categoría "{nombre}" no encontrada'}
+
+    def to_internal_value(self, data):
+        categorias = self.context['categorias']
+        if data not in categorias:
+            self.fail('no_existe', nombre=data)
+        return categorias[data]
+
+    def to_representation(self, value):
+        return value
+
+class ProductoImportacionSerializer(ProductoSerializer):
+    id = serializers.IntegerField(required=False, allow_null=True)
+    categoria = CategoriaPorNombreField(source='categoria_id')
+    categoria_nombre = None
+
+    class Meta(ProductoSerializer.Meta):
+        fields = ['id','nombre','categoria','descripcion','precio','stock','urlfoto']
+
+class CategoriaSerializer(SerializacionMedidaMixin, serializers.ModelSerializer):
     class Meta:
         model= Categoria
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
+        list_serializer_class = ListaMedida
+
+class ReservaItemSerializer(serializers.ModelSerializer):
+    cantidad = serializers.DecimalField(max_digits=20, decimal_places=2, min_value=Decimal('0.01'))
+
+    class Meta:
+        model = ReservaItem
+        fields = ['producto','cantidad']
+
+class ReservaSerializer(serializers.ModelSerializer):
+    items = ReservaItemSerializer(many=True)
+
+    class Meta:
+        model = Reserva
+        fields = ['id','estado','creada','expira','items']
+        read_only_fields = ['estado','creada','expira']
+
+    def validate_items(self, items):
+        if not items:
+            raise serializers.ValidationError('Debe reservar al menos un producto')
+        return items
+
+class CarritoItemSerializer(serializers.Serializer):
+    producto = serializers.IntegerField(min_value=1)
+    cantidad = serializers.DecimalField(max_digits=20, decimal_places=2, min_value=Decimal('0.01'))
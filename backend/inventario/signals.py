@@ -0,0 +1,52 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import Signal, receiver
+
+from . import busqueda
+from .cache import catalogo_cache
+from .models import Producto, VersionTabla
+
+# Se envía con sender=Producto o sender=Categoria tras cualquier escritura del catálogo,
+# incluidas las masivas que no disparan post_save; éstas pasan los ids afectados en `ids`
+# y, si sólo tocan algunas columnas, sus nombres en `campos`.
+catalogo_modificado = Signal()
+
+
+def solo_stock(campos):
+    """True para los cambios de las reservas, que no justifican descartar el catálogo entero."""
+    return bool(campos) and set(campos) <= {'stock'}
+
+
+@receiver(catalogo_modificado)
+def invalidar_cache(sender, campos=None, **kwargs):
+    # Las respuestas con ETag se cachean bajo él, y el ETag cambia con updated_at: sólo se
+    # descartan las que incluyen los productos reservados.
+    if not solo_stock(campos):
+        catalogo_cache.invalidar()
+
+
+@receiver(catalogo_modificado)
+def incrementar_version(sender, campos=None, **kwargs):
+    if not solo_stock(campos):
+        VersionTabla.objects.incrementar(sender._meta.db_table)
+
+
+@receiver(catalogo_modificado)
+def reindexar_masivo(sender, ids=None, campos=None, **kwargs):
+    if campos and not {'nombre', 'descripcion'} & set(campos):
+        return
+    if sender is Producto and ids:
+        busqueda.actualizar_vectores(ids)
+        busqueda.indice_productos.invalidar()
+
+
+@receiver(post_save, sender=Producto)
+def indexar_producto(sender, instance, update_fields=None, **kwargs):
+    if update_fields and not {'nombre', 'descripcion'} & set(update_fields):
+        return
+    busqueda.actualizar_vectores([instance.pk])
+    busqueda.indice_productos.actualizar(instance.pk, instance.nombre, instance.descripcion)
+
+
+@receiver(post_delete, sender=Producto)
+def desindexar_producto(sender, instance, **kwargs):
+    busqueda.indice_productos.eliminar(instance.pk)
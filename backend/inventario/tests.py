@@ -1,3 +1,1054 @@
-from django.test import TestCase
+import gzip
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.conf import settings
+from django.core import checks
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError, connection
+from django.http import HttpResponse
+from django.test import AsyncClient, RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient
+
+from backend import instrumentacion
+from backend.basedatos import COOKIE_PRIMARIO, PrimarioMiddleware, ReplicaRouter
+from usuarios.models import Direccion, Usuario
+from .busqueda import indice_productos
+from .carritos import AlmacenCarritos, CarritoOcupado, almacen_carritos, persistir_carrito
+from . import async_views, cambios
+from .instantaneas import instantaneas
+from .categorias import registro_categorias
+from .cache import catalogo_cache
+from .imagenes import UploaderFalso, cola_imagenes
+from .models import Producto, Categoria, Reserva, Carrito, CarritoItem, Cambio, VersionTabla
+from .serializers import ProductoSerializer
+from .signals import catalogo_modificado
+from .reservas import expirar_reservas
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ConsultasCatalogoTests(TestCase):
+    """Cada endpoint debe ejecutar un número de consultas independiente del tamaño del catálogo."""
+
+    def setUp(self):
+        self.semillas = Categoria.objects.create(nombre=Categoria.SEMILLAS)
+        self.mixes = Categoria.objects.create(nombre=Categoria.MIXES)
+        self.admin = Usuario.objects.create_user(username='admin@test.cl', email='admin@test.cl', password='clave', rol='admin')
+        self.client = APIClient()
+        self.admin_client = APIClient()
+        self.admin_client.force_authenticate(self.admin)
+        self.crear_productos(1)
+        # Las categorías se cargan una vez por proceso, no en cada petición.
+        registro_categorias.vigentes()
+
+    def crear_productos(self, cantidad):
+        for i in range(cantidad):
+            categoria = self.semillas if i % 2 == 0 else self.mixes
+            Producto.objects.create(nombre=f'Producto {i}', descripcion='desc', precio=100 + i, stock=i, categoria=categoria)
+
+    def consultas(self, cliente, url):
+        catalogo_cache.invalidar()
+        with CaptureQueriesContext(connection) as contexto:
+            response = cliente.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        return len(contexto)
+
+    def assertConsultasConstantes(self, url, cliente=None):
+        cliente = cliente or self.client
+        pocas = self.consultas(cliente, url)
+        self.crear_productos(10)
+        self.assertEqual(self.consultas(cliente, url), pocas)
+
+    def test_listado_productos(self):
+        self.assertConsultasConstantes('/api/productos/')
+
+    def test_listado_productos_paginado(self):
+        self.assertConsultasConstantes('/api/productos/?page_size=5&ordering=precio')
+
+    def test_listado_productos_con_campos(self):
+        self.assertConsultasConstantes('/api/productos/?fields=id,nombre,categoria_nombre')
+
+    def test_listado_rapido_igual_al_serializer(self):
+        Producto.objects.create(
+            nombre='Maní "japonés"\u2028', descripcion='ñandú\t<&>', precio='1234.5', stock=0,
+            categoria=self.mixes, urlfoto='https://imagenes.test/a.jpg', variantes={'miniatura': 160, 'detalle': 1200},
+        )
+        queryset = Producto.objects.select_related('categoria').order_by('id')
+        for url, campos in [('/api/productos/', None), ('/api/productos/?fields=nombre,precio,categoria_nombre', ['nombre', 'precio', 'categoria_nombre'])]:
+            esperado = JSONRenderer().render(ProductoSerializer(queryset, many=True, campos=campos).data)
+            catalogo_cache.invalidar()
+            self.assertEqual(self.client.get(url).content, esperado)
+        esperado = JSONRenderer().render({'next': None, 'results': ProductoSerializer(queryset, many=True).data})
+        self.assertEqual(self.client.get('/api/async/productos/?page_size=5').content, esperado)
+
+    def test_facetas(self):
+        self.assertConsultasConstantes('/api/productos/facetas/?en_stock=true')
+
+    def test_facetas_respetan_filtros(self):
+        self.crear_productos(4)
+        response = self.client.get('/api/productos/facetas/', {'precio_min': 101})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['total'], 3)
+        self.assertEqual(response.data['en_stock'], 3)
+        self.assertEqual(response.data['precio_min'], '101.00')
+        self.assertEqual(response.data['precios'], [3, 0, 0, 0, 0])
+        self.assertEqual(
+            [(c['nombre'], c['total']) for c in response.data['categorias']],
+            [(Categoria.MIXES, 2), (Categoria.SEMILLAS, 1)],
+        )
+
+    def test_listado_productos_autenticado(self):
+        self.assertConsultasConstantes('/api/productos/', self.admin_client)
+
+    def test_filtrado_categoria(self):
+        self.assertConsultasConstantes('/api/productos/filtrado_categoria/?categoria=Semillas')
+
+    def test_detalle_producto(self):
+        producto = Producto.objects.first()
+        self.assertConsultasConstantes(f'/api/productos/{producto.id}/')
+
+    def test_listado_categorias(self):
+        self.assertConsultasConstantes('/api/categorias/')
+
+    def test_crear_producto(self):
+        datos = {'nombre': 'Nuevo', 'descripcion': 'desc', 'precio': '10', 'stock': '5', 'categoria': self.semillas.id}
+        with self.assertNumQueries(5):
+            response = self.admin_client.post('/api/productos/', datos)
+        self.assertEqual(response.status_code, 201, response.content)
+
+    def test_actualizar_producto(self):
+        producto = Producto.objects.first()
+        datos = {'nombre': 'Editado', 'descripcion': 'desc', 'precio': '10', 'stock': '5', 'categoria': self.mixes.id}
+        with self.assertNumQueries(6):
+            response = self.admin_client.put(f'/api/productos/{producto.id}/', datos)
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.data['categoria_nombre'], Categoria.MIXES)
+
+    def test_borrar_producto(self):
+        producto = Producto.objects.first()
+        with self.assertNumQueries(7):
+            response = self.admin_client.delete(f'/api/productos/{producto.id}/')
+        self.assertEqual(response.status_code, 204)
+
+
+class FiltroProductosTests(TestCase):
+    def setUp(self):
+        semillas = Categoria.objects.create(nombre=Categoria.SEMILLAS)
+        mixes = Categoria.objects.create(nombre=Categoria.MIXES)
+        self.maravilla = Producto.objects.create(nombre='Maravilla', descripcion='desc', precio=100, stock=5, categoria=semillas)
+        self.mani = Producto.objects.create(nombre='Maní', descripcion='desc', precio=200, stock=0, categoria=mixes)
+        self.mix = Producto.objects.create(nombre='Mix tropical', descripcion='desc', precio=300, stock=2, categoria=mixes)
+        self.client = APIClient()
+
+    def ids(self, **filtros):
+        response = self.client.get('/api/productos/', filtros)
+        self.assertEqual(response.status_code, 200, response.content)
+        return [producto['id'] for producto in response.data]
+
+    def test_filtros(self):
+        casos = [
+            ({'precio_min': 200}, [self.mani, self.mix]),
+            ({'precio_max': 200}, [self.maravilla, self.mani]),
+            ({'precio_min': 150, 'precio_max': 250}, [self.mani]),
+            ({'en_stock': 'true'}, [self.maravilla, self.mix]),
+            ({'en_stock': 'false'}, [self.mani]),
+            ({'nombre': 'ma'}, [self.maravilla, self.mani]),
+            ({'nombre': 'tropical'}, []),
+            ({'categoria': Categoria.MIXES}, [self.mani, self.mix]),
+            ({'categoria': 'Inexistente'}, []),
+            ({'categoria': Categoria.MIXES, 'en_stock': 'true', 'precio_max': 300}, [self.mix]),
+        ]
+        for filtros, esperados in casos:
+            self.assertEqual(self.ids(**filtros), [producto.id for producto in esperados], filtros)
+
+    def test_filtro_invalido_responde_400(self):
+        for filtros in [{'precio_min': 'abc'}, {'precio_max': '1e'}, {'precio_min': 'NaN'}]:
+            response = self.client.get('/api/productos/', filtros)
+            self.assertEqual(response.status_code, 400, filtros)
+            self.assertIn(next(iter(filtros)), response.data)
+
+
+class PaginacionCursorTests(TestCase):
+    def setUp(self):
+        self.categoria = Categoria.objects.create(nombre=Categoria.SEMILLAS)
+        # Precios repetidos: el orden por precio necesita el id como desempate.
+        for i in range(11):
+            Producto.objects.create(nombre=f'Producto {i}', descripcion='desc', precio=100 + i % 4, stock=1, categoria=self.categoria)
+        self.client = APIClient()
+
+    def recorrer(self, url, enlace='next'):
+        paginas = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, response.content)
+            paginas.append([producto['id'] for producto in response.data['results']])
+            url = response.data[enlace]
+        return paginas, response.data
+
+    def test_recorre_sin_duplicados_ni_huecos(self):
+        for orden, esperado in [
+            ('id', list(Producto.objects.order_by('id').values_list('id', flat=True))),
+            ('-id', list(Producto.objects.order_by('-id').values_list('id', flat=True))),
+            ('precio', list(Producto.objects.order_by('precio', 'id').values_list('id', flat=True))),
+            ('-precio', list(Producto.objects.order_by('-precio', '-id').values_list('id', flat=True))),
+        ]:
+            paginas, ultima = self.recorrer(f'/api/productos/?page_size=3&ordering={orden}')
+            self.assertEqual([len(pagina) for pagina in paginas], [3, 3, 3, 2], orden)
+            self.assertEqual(sum(paginas, []), esperado, orden)
+
+            # Desde la última página, previous devuelve las mismas páginas en orden inverso.
+            previas, _ = self.recorrer(ultima['previous'], enlace='previous')
+            self.assertEqual(previas, paginas[-2::-1], orden)
+
+    def test_estable_ante_inserciones_entre_paginas(self):
+        primera = self.client.get('/api/productos/?page_size=4&ordering=precio').data
+        # Un producto más barato que todo lo ya visto no debe correr las páginas siguientes.
+        Producto.objects.create(nombre='Oferta', descripcion='desc', precio=1, stock=1, categoria=self.categoria)
+        paginas, _ = self.recorrer(primera['next'])
+        vistos = [producto['id'] for producto in primera['results']] + sum(paginas, [])
+        self.assertEqual(vistos, list(Producto.objects.exclude(nombre='Oferta').order_by('precio', 'id').values_list('id', flat=True)))
+
+    def test_orden_igual_con_y_sin_paginacion(self):
+        for orden, campo in [('id', 'id'), ('-id', 'id'), ('precio', 'precio'), ('-precio', 'precio')]:
+            # Sin paginar, los empates de precio no tienen un orden definido: se comparan los precios.
+            completo = [producto[campo] for producto in self.client.get('/api/productos/', {'ordering': orden}).data]
+            paginado = self.client.get('/api/productos/', {'ordering': orden, 'page_size': 20}).data['results']
+            self.assertEqual([producto[campo] for producto in paginado], completo, orden)
+        self.assertEqual(self.client.get('/api/productos/', {'ordering': 'precio,-id', 'page_size': 20}).status_code, 400)
+
+    def test_sin_cursor_ni_page_size_no_pagina(self):
+        self.assertEqual(len(self.client.get('/api/productos/').data), 11)
+        self.assertEqual(self.client.get('/api/productos/?cursor=basura').status_code, 404)
+        # Una posición con otra forma que la del orden pedido tampoco llega a la consulta.
+        siguiente = self.client.get('/api/productos/?page_size=3&ordering=precio').data['next']
+        self.assertEqual(self.client.get(siguiente.replace('ordering=precio', 'ordering=id')).status_code, 404)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class CatalogoCacheTests(TestCase):
+    def setUp(self):
+        self.semillas = Categoria.objects.create(nombre=Categoria.SEMILLAS)
+        self.producto = Producto.objects.create(nombre='Maravilla', descripcion='desc', precio=100, stock=5, categoria=self.semillas)
+        admin = Usuario.objects.create_user(username='admin@test.cl', email='admin@test.cl', password='clave', rol='admin')
+        self.client = APIClient()
+        self.admin_client = APIClient()
+        self.admin_client.force_authenticate(admin)
+        catalogo_cache.invalidar()
+
+    def estadisticas(self):
+        response = self.admin_client.get('/api/cache/estadisticas/')
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_fallo_acierto_e_invalidacion(self):
+        url = f'/api/productos/{self.producto.id}/'
+        antes = self.estadisticas()
+        self.assertEqual(self.client.get(url).data['nombre'], 'Maravilla')
+        self.assertEqual(self.client.get(url).data['nombre'], 'Maravilla')
+        despues = self.estadisticas()
+        self.assertEqual(despues['fallos'] - antes['fallos'], 1)
+        self.assertEqual(despues['aciertos'] - antes['aciertos'], 1)
+
+        response = self.admin_client.patch(url, {'nombre': 'Maravilla pelada'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.estadisticas()['version'], despues['version'] + 1)
+        self.assertEqual(self.client.get(url).data['nombre'], 'Maravilla pelada')
+        self.assertEqual(self.estadisticas()['fallos'] - despues['fallos'], 1)
+
+    def test_autenticados_no_usan_la_cache(self):
+        antes = self.estadisticas()
+        self.admin_client.get('/api/productos/')
+        self.admin_client.get('/api/productos/')
+        despues = self.estadisticas()
+        self.assertEqual((despues['aciertos'], despues['fallos']), (antes['aciertos'], antes['fallos']))
+
+    def test_estadisticas_solo_para_admin(self):
+        self.assertEqual(self.client.get('/api/cache/estadisticas/').status_code, 403)
+        self.assertEqual(set(self.estadisticas()), {'aciertos', 'fallos', 'expulsiones', 'entradas', 'version'})
+
+    def test_clave_distingue_parametros_repetidos(self):
+        def clave(url):
+            return catalogo_cache.clave(Request(RequestFactory().get(url)))
+
+        self.assertNotEqual(clave('/api/productos/?categoria=a&categoria=b'), clave('/api/productos/?categoria=b'))
+        self.assertEqual(clave('/api/productos/?b=1&a=2'), clave('/api/productos/?a=2&b=1'))
+        self.assertNotEqual(clave('/api/productos/?a=1%26b%3D2'), clave('/api/productos/?a=1&b=2'))
+
+    def test_check_exige_cache_compartida(self):
+        ids = lambda **kwargs: [error.id for error in checks.run_checks(tags=['caches'], **kwargs)]
+        with override_settings(CATALOGO_CACHE={**settings.CATALOGO_CACHE, 'ALIAS': None}):
+            self.assertIn('inventario.W002', ids())
+            self.assertIn('inventario.E002', ids(include_deployment_checks=True))
+        compartida = {**settings.CACHES, 'catalogo': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'cache'}}
+        with override_settings(CACHES=compartida, CATALOGO_CACHE={**settings.CATALOGO_CACHE, 'ALIAS': 'catalogo'}):
+            self.assertNotIn('inventario.W002', ids())
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class GetCondicionalTests(TestCase):
+    def setUp(self):
+        self.semillas = Categoria.objects.create(nombre=Categoria.SEMILLAS)
+        self.chia = Producto.objects.create(nombre='Chía', descripcion='desc', precio=10, stock=5, categoria=self.semillas)
+        admin = Usuario.objects.create_user(username='admin@test.cl', email='admin@test.cl', password='clave', rol='admin')
+        self.client = APIClient()
+        self.admin_client = APIClient()
+        self.admin_client.force_authenticate(admin)
+        self.url = f'/api/productos/{self.chia.id}/'
+
+    def test_304_con_etag_y_last_modified(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Last-Modified', response)
+        no_modificado = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(no_modificado.status_code, 304)
+        self.assertEqual(no_modificado['ETag'], response['ETag'])
+        self.assertEqual(self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304)
+
+    def test_pk_no_numerico_responde_404(self):
+        self.assertEqual(self.client.get('/api/productos/abc/').status_code, 404)
+        self.assertEqual(self.client.get('/api/productos/abc/', HTTP_IF_NONE_MATCH='"x"').status_code, 404)
+
+    def test_cambia_al_escribir_el_producto(self):
+        etag = self.client.get(self.url)['ETag']
+        self.admin_client.patch(self.url, {'precio': '20.00'}, format='json')
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['precio'], '20.00')
+
+    def test_cambia_al_renombrar_la_categoria(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.admin_client.patch(f'/api/categorias/{self.semillas.id}/', {'nombre': Categoria.CEREALES}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['categoria_nombre'], Categoria.CEREALES)
+
+
+class VistasAsincronasTests(TestCase):
+    def setUp(self):
+        semillas = Categoria.objects.create(nombre=Categoria.SEMILLAS)
+        mixes = Categoria.objects.create(nombre=Categoria.MIXES)
+        for i in range(5):
+            Producto.objects.create(nombre=f'Producto {i}', descripcion='desc', precio=100 + i, stock=i,
+                                    categoria=semillas if i % 2 == 0 else mixes)
+        self.client = APIClient()
+
+    def test_pagina_con_despues_hasta_agotar(self):
+        vistos, url = [], '/api/async/productos/?page_size=2'
+        while url:
+            datos = self.client.get(url).json()
+            vistos += [producto['id'] for producto in datos['results']]
+            url = datos['next']
+        self.assertEqual(vistos, sorted(Producto.objects.values_list('id', flat=True)))
+
+    def test_page_size_invalido_es_400(self):
+        for page_size in ['0', '-1', 'abc']:
+            self.assertEqual(self.client.get('/api/async/productos/', {'page_size': page_size}).status_code, 400, page_size)
+
+    def test_filtros_invalidos_igual_que_drf(self):
+        asincrona = self.client.get('/api/async/productos/', {'precio_min': 'abc'})
+        drf = self.client.get('/api/productos/', {'precio_min': 'abc'})
+        self.assertEqual((asincrona.status_code, asincrona.json()), (400, drf.json()))
+        url = f'/api/async/productos/filtrado_categoria/?categoria={Categoria.SEMILLAS}&precio_min=abc'
+        self.assertEqual(self.client.get(url).status_code, 400)
+
+    def test_filtra_detalle_y_categoria(self):
+        datos = self.client.get('/api/async/productos/', {'precio_min': 103}).json()
+        self.assertEqual([producto['nombre'] for producto in datos], ['Producto 3', 'Producto 4'])
+        url = f'/api/async/productos/filtrado_categoria/?categoria={Categoria.MIXES}'
+        self.assertEqual([producto['nombre'] for producto in self.client.get(url).json()], ['Producto 1', 'Producto 3'])
+        self.assertEqual(self.client.get('/api/async/productos/filtrado_categoria/?categoria=Nada').status_code, 404)
+        producto = Producto.objects.get(nombre='Producto 1')
+        self.assertEqual(self.client.get(f'/api/async/productos/{producto.id}/').json()['categoria_nombre'], Categoria.MIXES)
+        self.assertEqual(self.client.get('/api/async/productos/999/').status_code, 404)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'], PRODUCTOS_LOTE_IMPORTACION=2)
+class ImportacionProductosTests(TestCase):
+    def setUp(self):
+        self.semillas = Categoria.objects.create(nombre=Categoria.SEMILLAS)
+        Categoria.objects.create(nombre=Categoria.MIXES)
+        for i in range(3):
+            Producto.objects.create(nombre=f'Producto {i}', descripcion='desc', precio=100 + i, stock=i, categoria=self.semillas)
+        admin = Usuario.objects.create_user(username='admin@test.cl', email='admin@test.cl', password='clave', rol='admin')
+        self.client = APIClient()
+        self.client.force_authenticate(admin)
+
+    def exportar(self, formato):
+        response = self.client.get(f'/api/productos/exportar/?formato={formato}')
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content)
+
+    def importar(self, contenido, nombre):
+        return self.client.post('/api/productos/importar/', {'archivo': SimpleUploadedFile(nombre, contenido)})
+
+    def test_ida_y_vuelta_csv_y_jsonl(self):
+        for formato in ['csv', 'jsonl']:
+            exportado = self.exportar(formato)
+            response = self.importar(exportado, f'productos.{formato}')
+            self.assertEqual(response.data, {'creados': 0, 'actualizados': 3, 'errores': []}, formato)
+            self.assertEqual(self.exportar(formato), exportado)
+        linea = '{"nombre": "Nuevo", "categoria": "Mixes", "descripcion": "d", "precio": "5", "stock": "1"}\n'
+        self.assertEqual(self.importar(linea.encode(), 'nuevos.jsonl').data['creados'], 1)
+        self.assertEqual(Producto.objects.get(nombre='Nuevo').categoria.nombre, Categoria.MIXES)
+
+    def test_filas_invalidas_se_informan(self):
+        contenido = '\n'.join([
+            'id,nombre,categoria,descripcion,precio,stock',
+            ',Bien,Semillas,d,10,1',
+            ',Sin categoria,Nada,d,10,1',
+            '999,No existe,Semillas,d,10,1',
+            ',Precio malo,Semillas,d,abc,1',
+        ]).encode()
+        response = self.importar(contenido, 'productos.csv')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['creados'], 1)
+        self.assertEqual([error['fila'] for error in response.data['errores']], [2, 3, 4])
+        jsonl = self.importar(b'{"nombre": \n', 'productos.jsonl')
+        self.assertEqual(jsonl.data['errores'][0]['fila'], 1)
+
+    def test_no_utf8_es_400_sin_guardar_nada(self):
+        contenido = 'nombre,categoria,descripcion,precio,stock\nCastaña,Semillas,d,10,1\n'.encode('latin-1')
+        response = self.importar(contenido, 'productos.csv')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('archivo', response.data)
+        self.assertEqual(Producto.objects.count(), 3)
+
+    def test_error_de_base_en_un_lote_no_corta_la_importacion(self):
+        original = Producto.objects.bulk_create
+        llamadas = []
+
+        def bulk_create(objetos, *args, **kwargs):
+            llamadas.append(len(objetos))
+            if len(llamadas) == 2:
+                raise IntegrityError('conflicto simulado')
+            return original(objetos, *args, **kwargs)
+
+        contenido = 'nombre,categoria,descripcion,precio,stock\n' + ''.join(f'N{i},Semillas,d,10,1\n' for i in range(5))
+        with mock.patch.object(Producto.objects, 'bulk_create', bulk_create):
+            response = self.importar(contenido.encode(), 'productos.csv')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['creados'], 3)
+        self.assertEqual([error['fila'] for error in response.data['errores']], [3, 4])
+        self.assertIn('conflicto simulado', str(response.data['errores'][0]['errores']))
+
+
+@override_settings(
+    MIDDLEWARE=['backend.instrumentacion.InstrumentacionMiddleware', *settings.MIDDLEWARE],
+    INSTRUMENTACION={**settings.INSTRUMENTACION, 'ACTIVA': True, 'MUESTREO': 1.0, 'PERFILES_MAXIMOS': 1,
+                     'DIRECTORIO': tempfile.mkdtemp(), 'TOKEN': 'secreto'},
+)
+class InstrumentacionTests(TestCase):
+    def setUp(self):
+        for histograma in instrumentacion.HISTOGRAMAS:
+            histograma.reiniciar()
+        categoria = Categoria.objects.create(nombre=Categoria.SEMILLAS)
+        Producto.objects.create(nombre='Chía', descripcion='desc', precio=10, stock=5, categoria=categoria)
+        self.client = APIClient()
+
+    def test_server_timing_y_metricas(self):
+        catalogo_cache.invalidar()
+        response = self.client.get('/api/productos/')
+        self.assertEqual(response.status_code, 200)
+        timing = response['Server-Timing']
+        for componente in ('app;', 'db;', 'serializer;', 'render;'):
+            self.assertIn(componente, timing)
+
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        metricas = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secreto').content.decode()
+        self.assertIn('peticion_duracion_segundos_count{vista="producto-list",metodo="GET",estado="200"} 1', metricas)
+        self.assertIn('componente_duracion_segundos_count{componente="serializer"} 1', metricas)
+
+    def test_vistas_asincronas_sin_adaptar(self):
+        middleware = instrumentacion.InstrumentacionMiddleware(async_views.productos)
+        self.assertTrue(iscoroutinefunction(middleware))
+        registro_categorias.vigentes()
+        response = async_to_sync(AsyncClient().get)('/api/async/productos/')
+        self.assertEqual(response.status_code, 200)
+        # Las consultas corren en el hilo de sync_to_async y se cuentan igual.
+        self.assertRegex(response['Server-Timing'], r'db;dur=[\d.]+;desc="[1-9]\d* consultas"')
+
+    def test_conserva_solo_los_perfiles_mas_lentos(self):
+        for _ in range(3):
+            self.client.get('/api/productos/')
+        self.assertEqual(len(os.listdir(settings.INSTRUMENTACION['DIRECTORIO'])), 1)
+
+
+@override_settings(DATABASE_REPLICAS=['replica_0'], DATABASE_REPLICA_FIJACION=5)
+class ReplicasTests(SimpleTestCase):
+    def setUp(self):
+        self.router = ReplicaRouter()
+        self.factory = RequestFactory()
+        self.middleware = PrimarioMiddleware(lambda request: HttpResponse(self.router.db_for_read(Producto)))
+
+    def test_lecturas_a_replica_y_escrituras_al_primario(self):
+        response = self.middleware(self.factory.get('/api/productos/'))
+        self.assertEqual(response.content, b'replica_0')
+        self.assertNotIn(COOKIE_PRIMARIO, response.cookies)
+        self.assertEqual(self.router.db_for_write(Producto), 'default')
+        self.assertFalse(self.router.allow_migrate('replica_0', 'inventario'))
+
+    def test_peticion_que_escribe_fija_el_primario(self):
+        response = self.middleware(self.factory.post('/api/productos/'))
+        self.assertEqual(response.content, b'default')
+        self.assertEqual(response.cookies[COOKIE_PRIMARIO]['max-age'], 5)
+
+        siguiente = self.factory.get('/api/productos/')
+        siguiente.COOKIES[COOKIE_PRIMARIO] = '1'
+        self.assertEqual(self.middleware(siguiente).content, b'default')
+
+    def test_middleware_asincrono(self):
+        async def vista(request):
+            return HttpResponse(self.router.db_for_read(Producto))
+
+        middleware = PrimarioMiddleware(vista)
+        self.assertTrue(iscoroutinefunction(middleware))
+        self.assertEqual(async_to_sync(middleware)(self.factory.get('/api/productos/')).content, b'replica_0')
+        response = async_to_sync(middleware)(self.factory.post('/api/productos/'))
+        self.assertEqual(response.content, b'default')
+        self.assertEqual(response.cookies[COOKIE_PRIMARIO]['max-age'], 5)
+        self.assertEqual(self.router.db_for_read(Producto), 'replica_0')
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_sin_replicas_todo_va_al_primario(self):
+        self.assertEqual(self.router.db_for_read(Producto), 'default')
+
+    def test_trabajos_en_segundo_plano_leen_del_primario(self):
+        vistos = []
+
+        def registrar(*args, **kwargs):
+            vistos.append(self.router.db_for_read(Producto))
+            raise RuntimeError('fin')
+
+        with mock.patch.object(instantaneas, 'construir_listados', registrar), self.assertRaises(RuntimeError):
+            instantaneas.construir()
+        with mock.patch('inventario.carritos.transaction.atomic', registrar), self.assertRaises(RuntimeError):
+            persistir_carrito('carrito:usuario:1', {1: 1})
+        with self.assertLogs('inventario.imagenes', 'ERROR'):
+            cola_imagenes.en_worker(registrar)
+        self.assertEqual(vistos, ['default'] * 3)
+        self.assertEqual(self.router.db_for_read(Producto), 'replica_0')
+
+
+class BusquedaTests(TestCase):
+    def setUp(self):
+        indice_productos.invalidar()
+        categoria = Categoria.objects.create(nombre=Categoria.FRUTOS_SECOS)
+        datos = [
+            ('Almendras tostadas', 'Almendra chilena sin sal'),
+            ('Mix frutos secos', 'Almendras, nueces y castañas'),
+            ('Castañas de cajú', 'Castaña natural'),
+        ]
+        self.productos = [
+            Producto.objects.create(nombre=nombre, descripcion=descripcion, precio=10, stock=1, categoria=categoria)
+            for nombre, descripcion in datos
+        ]
+        self.client = APIClient()
+
+    def buscar(self, **parametros):
+        catalogo_cache.invalidar()
+        response = self.client.get('/api/productos/buscar/', parametros)
+        self.assertEqual(response.status_code, 200, response.content)
+        return [producto['nombre'] for producto in response.data]
+
+    def test_relevancia_plurales_y_tildes(self):
+        self.assertEqual(self.buscar(q='almendra'), ['Almendras tostadas', 'Mix frutos secos'])
+        self.assertEqual(self.buscar(q='CASTANA'), ['Castañas de cajú', 'Mix frutos secos'])
+
+    def test_autocompletar_por_prefijo(self):
+        self.assertEqual(self.buscar(q='frutos se', modo='autocompletar'), ['Mix frutos secos'])
+
+    def test_reindexa_al_guardar_y_borrar(self):
+        self.buscar(q='almendra')
+        producto = self.productos[0]
+        producto.nombre = 'Pistachos'
+        producto.save()
+        self.assertEqual(self.buscar(q='pistacho'), ['Pistachos'])
+        producto.delete()
+        self.assertEqual(self.buscar(q='pistacho'), [])
+
+    def test_sin_consulta(self):
+        self.assertEqual(self.client.get('/api/productos/buscar/').status_code, 400)
+
+    def test_limite(self):
+        self.assertEqual(self.buscar(q='almendra', limite=1), ['Almendras tostadas'])
+        self.assertEqual(len(self.buscar(q='almendra', limite=10 ** 6)), 2)
+        for limite in ['0', '-3', 'abc', '']:
+            response = self.client.get('/api/productos/buscar/', {'q': 'almendra', 'limite': limite})
+            self.assertEqual(response.status_code, 400, limite)
+
+    def test_actualizaciones_incrementales_equivalen_a_reconstruir(self):
+        indice_productos.asegurar()
+        producto = self.productos[0]
+        producto.nombre, producto.descripcion = 'Pistachos', 'Pistacho tostado'
+        producto.save()
+        self.productos[2].delete()
+        Producto.objects.create(nombre='Nueces mariposa', descripcion='Nuez', precio=10, stock=1, categoria=producto.categoria)
+        terminos, top = list(indice_productos.terminos), dict(indice_productos.top)
+        self.assertEqual(terminos, sorted(indice_productos.postings))
+        indice_productos.construir()
+        self.assertEqual(terminos, indice_productos.terminos)
+        self.assertEqual(top, indice_productos.top)
+
+
+@override_settings(INVENTARIO_IMAGENES={
+    **settings.INVENTARIO_IMAGENES,
+    'UPLOADER': 'inventario.imagenes.UploaderFalso',
+    'SINCRONO': True,
+    'ESPERA': 0,
+    'DIRECTORIO': tempfile.mkdtemp(),
+})
+class ImagenesProductoTests(TestCase):
+    def setUp(self):
+        UploaderFalso.reiniciar()
+        self.categoria = Categoria.objects.create(nombre=Categoria.SEMILLAS)
+        admin = Usuario.objects.create_user(username='admin@test.cl', email='admin@test.cl', password='clave', rol='admin')
+        self.client = APIClient()
+        self.client.force_authenticate(admin)
+
+    def datos(self, **extra):
+        imagen = SimpleUploadedFile('foto.jpg', b'bytes-de-imagen', content_type='image/jpeg')
+        return {'nombre': 'Almendras', 'descripcion': 'desc', 'precio': '10', 'stock': '5',
+                'categoria': self.categoria.id, 'imagen': imagen, **extra}
+
+    def test_crear_responde_pendiente_y_sube_en_segundo_plano(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post('/api/productos/', self.datos())
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.data['estado_imagen'], Producto.IMAGEN_PENDIENTE)
+        self.assertIsNone(response.data['urlfoto'])
+        self.assertEqual(UploaderFalso.subidas, [])
+
+        for callback in callbacks:
+            callback()
+        producto = Producto.objects.get(pk=response.data['id'])
+        self.assertEqual(producto.estado_imagen, Producto.IMAGEN_LISTA)
+        self.assertTrue(producto.urlfoto.startswith('https://imagenes.test/productos/'))
+        ruta, _ = UploaderFalso.subidas[0]
+        self.assertFalse(os.path.exists(ruta))
+
+    def test_expone_variantes_y_srcset(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/productos/', self.datos())
+        producto = Producto.objects.get(pk=response.data['id'])
+        self.assertEqual(producto.variantes, settings.INVENTARIO_IMAGENES['VARIANTES'])
+
+        datos = self.client.get(f'/api/productos/{producto.id}/?fields=id,srcset,variantes').data
+        miniatura = producto.urlfoto.replace('https://imagenes.test/', 'https://imagenes.test/w_160/')
+        self.assertEqual(datos['variantes']['miniatura'], miniatura)
+        self.assertTrue(datos['srcset'].startswith(f'{miniatura} 160w, '))
+        self.assertTrue(datos['srcset'].endswith(' 1200w'))
+        listado = self.client.get('/api/productos/?fields=id,srcset').data
+        self.assertEqual(listado, [{'id': producto.id, 'srcset': datos['srcset']}])
+
+    def test_reintenta_y_marca_error_sin_borrar_producto(self):
+        UploaderFalso.fallos_pendientes = 1
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/productos/', self.datos())
+        self.assertEqual(Producto.objects.get(pk=response.data['id']).estado_imagen, Producto.IMAGEN_LISTA)
+
+        UploaderFalso.fallos_pendientes = settings.INVENTARIO_IMAGENES['REINTENTOS']
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/productos/', self.datos(nombre='Nueces'))
+        producto = Producto.objects.get(pk=response.data['id'])
+        self.assertEqual(producto.estado_imagen, Producto.IMAGEN_ERROR)
+        self.assertIsNone(producto.urlfoto)
+
+    def test_actualizar_y_borrar_encolan_el_borrado_anterior(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/productos/', self.datos())
+        original = Producto.objects.get(pk=response.data['id'])
+        self.assertTrue(original.public_id_foto.startswith(f'productos/{original.id}-Almendras/'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.put(f"/api/productos/{response.data['id']}/", self.datos(nombre='Editado'))
+        self.assertEqual(response.status_code, 200, response.content)
+        producto = Producto.objects.get(pk=response.data['id'])
+        self.assertNotEqual(producto.urlfoto, original.urlfoto)
+        # Se borra con el public_id completo (carpeta incluida), no con el último tramo de la URL.
+        self.assertEqual(UploaderFalso.borrados, [original.public_id_foto])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.delete(f'/api/productos/{producto.id}/').status_code, 204)
+        self.assertEqual(UploaderFalso.borrados, [original.public_id_foto, producto.public_id_foto])
+
+    def test_reanuda_subidas_pendientes_tras_un_reinicio(self):
+        # Sin ejecutar los callbacks de commit: la cola se perdió con el proceso.
+        with self.captureOnCommitCallbacks():
+            response = self.client.post('/api/productos/', self.datos())
+        con_archivo = Producto.objects.get(pk=response.data['id'])
+        self.assertTrue(os.path.exists(con_archivo.imagen_pendiente))
+        sin_archivo = Producto.objects.create(
+            nombre='Nueces', descripcion='desc', precio=10, stock=1, categoria=self.categoria,
+            estado_imagen=Producto.IMAGEN_PENDIENTE, imagen_pendiente='/no/existe.jpg',
+        )
+        reciente = Producto.objects.create(
+            nombre='Pasas', descripcion='desc', precio=10, stock=1, categoria=self.categoria, estado_imagen=Producto.IMAGEN_PENDIENTE,
+        )
+        Producto.objects.exclude(pk=reciente.pk).update(updated_at=timezone.now() - timezone.timedelta(hours=1))
+
+        call_command('reanudar_imagenes', stdout=StringIO())
+        con_archivo.refresh_from_db()
+        self.assertEqual(con_archivo.estado_imagen, Producto.IMAGEN_LISTA)
+        self.assertEqual(con_archivo.imagen_pendiente, '')
+        self.assertEqual(len(UploaderFalso.subidas), 1)
+        self.assertEqual(Producto.objects.get(pk=sin_archivo.pk).estado_imagen, Producto.IMAGEN_ERROR)
+        self.assertEqual(Producto.objects.get(pk=reciente.pk).estado_imagen, Producto.IMAGEN_PENDIENTE)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ReservasTests(TestCase):
+    def setUp(self):
+        categoria = Categoria.objects.create(nombre=Categoria.SEMILLAS)
+        self.chia = Producto.objects.create(nombre='Chía', descripcion='desc', precio=10, stock=5, categoria=categoria)
+        self.linaza = Producto.objects.create(nombre='Linaza', descripcion='desc', precio=10, stock=1, categoria=categoria)
+        cliente = Usuario.objects.create_user(username='cliente@test.cl', email='cliente@test.cl', password='clave')
+        self.client = APIClient()
+        self.client.force_authenticate(cliente)
+
+    def reservar(self, *items):
+        datos = {'items': [{'producto': producto.id, 'cantidad': cantidad} for producto, cantidad in items]}
+        return self.client.post('/api/reservas/', datos, format='json')
+
+    def stock(self, producto):
+        producto.refresh_from_db()
+        return producto.stock
+
+    def test_reserva_descuenta_y_liberar_devuelve(self):
+        response = self.reservar((self.chia, 2), (self.linaza, 1), (self.chia, 1))
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(self.stock(self.chia), 2)
+        self.assertEqual(self.stock(self.linaza), 0)
+
+        self.assertEqual(self.client.post(f"/api/reservas/{response.data['id']}/liberar/").status_code, 200)
+        self.assertEqual(self.client.post(f"/api/reservas/{response.data['id']}/liberar/").status_code, 409)
+        self.assertEqual(self.stock(self.chia), 5)
+        self.assertEqual(self.stock(self.linaza), 1)
+
+    def test_reserva_no_invalida_el_catalogo_entero(self):
+        anonimo = APIClient()
+        catalogo_cache.invalidar()
+        for producto in (self.chia, self.linaza):
+            anonimo.get(f'/api/productos/{producto.id}/')
+        version_cache = catalogo_cache.version()
+        version_productos = VersionTabla.objects.de(Producto._meta.db_table)
+        aciertos = catalogo_cache.aciertos
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.reservar((self.chia, 2)).status_code, 201)
+        self.assertEqual(catalogo_cache.version(), version_cache)
+        self.assertEqual(VersionTabla.objects.de(Producto._meta.db_table), version_productos)
+        # El ETag del producto reservado cambió: su respuesta cacheada ya no se usa, la del otro sí.
+        self.assertEqual(anonimo.get(f'/api/productos/{self.chia.id}/').data['stock'], '3.00')
+        self.assertEqual(anonimo.get(f'/api/productos/{self.linaza.id}/').data['stock'], '1.00')
+        self.assertEqual(catalogo_cache.aciertos - aciertos, 1)
+
+    def test_stock_insuficiente_no_descuenta_nada(self):
+        response = self.reservar((self.chia, 2), (self.linaza, 2))
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['producto'], self.linaza.id)
+        self.assertEqual(self.stock(self.chia), 5)
+
+    def test_reservas_vencidas_expiran(self):
+        response = self.reservar((self.chia, 3))
+        Reserva.objects.filter(pk=response.data['id']).update(expira=timezone.now())
+        self.assertEqual(self.client.post(f"/api/reservas/{response.data['id']}/confirmar/").status_code, 409)
+        self.assertEqual(expirar_reservas(), 1)
+        self.assertEqual(self.stock(self.chia), 5)
+        self.assertEqual(Reserva.objects.get(pk=response.data['id']).estado, Reserva.EXPIRADA)
+
+
+@override_settings(
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+    CARRITOS={**settings.CARRITOS, 'ALIAS': 'default', 'SINCRONO': False, 'INTERVALO_PERSISTENCIA': 3600},
+)
+class CarritoTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        categoria = Categoria.objects.create(nombre=Categoria.SEMILLAS)
+        self.chia = Producto.objects.create(nombre='Chía', descripcion='desc', precio=1000, stock=5, categoria=categoria)
+        self.linaza = Producto.objects.create(nombre='Linaza', descripcion='desc', precio=500, stock=1, categoria=categoria)
+        self.usuario = Usuario.objects.create_user(username='cliente@test.cl', email='cliente@test.cl', password='clave')
+        self.client = APIClient()
+
+    def tearDown(self):
+        cache.clear()
+
+    def agregar(self, producto, cantidad):
+        return self.client.post('/api/carrito/items/', {'producto': producto.id, 'cantidad': cantidad}, format='json')
+
+    def test_cotiza_todas_las_lineas_en_una_consulta(self):
+        self.client.force_authenticate(self.usuario)
+        self.agregar(self.chia, 2)
+        self.agregar(self.linaza, '1.5')
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/carrito/')
+        self.assertNotIn('envios', response.data)
+        self.assertEqual(response.data['total'], '2750.00')
+        self.assertEqual([item['disponible'] for item in response.data['items']], [True, False])
+        self.assertFalse(response.data['disponible'])
+
+        self.assertEqual(self.client.put(f'/api/carrito/items/{self.linaza.id}/', {'cantidad': 1}, format='json').data['total'], '2500.00')
+        self.assertEqual(len(self.client.delete(f'/api/carrito/items/{self.chia.id}/').data['items']), 1)
+        self.assertEqual(self.agregar(Producto(id=999), 1).status_code, 400)
+
+    @override_settings(ENVIOS={**settings.ENVIOS, 'CARRITO_CANTIDADES_EN_KILOS': True})
+    def test_envios_a_pedido(self):
+        self.client.force_authenticate(self.usuario)
+        Direccion.objects.create(usuario=self.usuario, direccion='Alameda 1', ciudad='Santiago', codigo_postal='8320000', pais='Chile')
+        self.agregar(self.chia, 2)
+        self.client.get('/api/carrito/?envio=1')
+        # Otra consulta, sólo para las direcciones que se cotizan con el índice de envíos.
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/carrito/?envio=1')
+        self.assertEqual(len(response.data['envios']), 1)
+        with override_settings(ENVIOS={**settings.ENVIOS, 'CARRITO_CANTIDADES_EN_KILOS': False}):
+            # Por defecto: sin la confirmación de que las cantidades son kilos no hay peso que cotizar.
+            self.assertNotIn('envios', self.client.get('/api/carrito/?envio=1').data)
+        self.client.logout()
+        self.assertNotIn('envios', self.client.get('/api/carrito/?envio=1').data)
+
+    def test_escritura_diferida_y_lectura_desde_la_base(self):
+        self.client.force_authenticate(self.usuario)
+        self.agregar(self.chia, 3)
+        self.assertFalse(CarritoItem.objects.exists())
+        self.assertEqual(almacen_carritos.persistir(), 1)
+        self.assertEqual(Carrito.objects.get(usuario=self.usuario).items.get().cantidad, 3)
+
+        cache.clear()
+        self.assertEqual(self.client.get('/api/carrito/').data['items'][0]['cantidad'], '3.00')
+
+    def test_los_pendientes_sobreviven_a_un_reinicio(self):
+        self.client.force_authenticate(self.usuario)
+        self.agregar(self.chia, 2)
+        # Otro proceso (o el mismo tras reiniciar) persiste lo anotado en la cache compartida.
+        self.assertEqual(AlmacenCarritos().persistir(), 1)
+        self.assertEqual(Carrito.objects.get(usuario=self.usuario).items.get().cantidad, 2)
+        self.assertEqual(almacen_carritos.persistir(), 0)
+
+    def test_candado_evita_escrituras_concurrentes(self):
+        self.client.force_authenticate(self.usuario)
+        clave = f'carrito:usuario:{self.usuario.id}'
+        with override_settings(CARRITOS={**settings.CARRITOS, 'ESPERA_CANDADO': 0}):
+            with almacen_carritos.bloqueado(clave):
+                with self.assertRaises(CarritoOcupado):
+                    with almacen_carritos.bloqueado(clave):
+                        pass
+                self.assertEqual(self.agregar(self.chia, 1).status_code, 409)
+            self.assertEqual(self.agregar(self.chia, 1).status_code, 200)
+
+    def test_carrito_anonimo_se_fusiona_al_autenticarse(self):
+        self.agregar(self.chia, 1)
+        self.agregar(self.linaza, 1)
+        self.assertEqual(len(self.client.get('/api/carrito/').data['items']), 2)
+
+        almacen_carritos.guardar(f'carrito:usuario:{self.usuario.id}', {self.chia.id: 2})
+        self.client.force_authenticate(self.usuario)
+        response = self.client.get('/api/carrito/')
+        self.assertEqual({item['producto']: item['cantidad'] for item in response.data['items']},
+                         {self.chia.id: '3.00', self.linaza.id: '1.00'})
+
+        almacen_carritos.persistir()
+        self.assertEqual(Carrito.objects.count(), 1)
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get('/api/carrito/').data['items'], [])
+
+
+@override_settings(
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+    CAMBIOS={**settings.CAMBIOS, 'SSE_DURACION': 0},
+)
+class CambiosTests(TestCase):
+    def setUp(self):
+        self.categoria = Categoria.objects.create(nombre=Categoria.SEMILLAS)
+        self.chia = Producto.objects.create(nombre='Chía', descripcion='desc', precio=1000, stock=5, categoria=self.categoria)
+        self.linaza = Producto.objects.create(nombre='Linaza', descripcion='desc', precio=500, stock=1, categoria=self.categoria)
+        admin = Usuario.objects.create_user(username='admin@test.cl', email='admin@test.cl', password='clave', rol='admin')
+        self.client = APIClient()
+        self.admin_client = APIClient()
+        self.admin_client.force_authenticate(admin)
+
+    def test_delta_con_upserts_y_lapidas(self):
+        cursor = self.client.get('/api/cambios/').data['cursor']
+        self.admin_client.patch(f'/api/productos/{self.chia.id}/', {'precio': '1200.00'}, format='json')
+        self.admin_client.patch(f'/api/productos/{self.chia.id}/', {'stock': '4.00'}, format='json')
+        self.admin_client.delete(f'/api/productos/{self.linaza.id}/')
+
+        with self.assertNumQueries(3):
+            delta = self.client.get('/api/cambios/', {'since': cursor}).data
+        self.assertEqual([(p['id'], p['precio'], p['stock']) for p in delta['productos']['upserts']], [(self.chia.id, '1200.00', '4.00')])
+        self.assertEqual(delta['productos']['borrados'], [self.linaza.id])
+        self.assertEqual(delta['categorias'], {'upserts': [], 'borrados': []})
+        self.assertEqual(self.client.get('/api/cambios/', {'since': delta['cursor']}).data['productos']['upserts'], [])
+        self.assertEqual(self.client.get('/api/cambios/', {'since': 'x'}).status_code, 400)
+
+    def test_compactacion_y_cursor_vencido(self):
+        self.chia.save()
+        self.linaza.delete()
+        Cambio.objects.update(fecha=timezone.now() - timezone.timedelta(days=30))
+        self.assertEqual(cambios.compactar(), (2, 1))
+        self.assertEqual(list(Cambio.objects.values_list('objeto_id', flat=True)), [self.categoria.id, self.chia.id])
+        self.assertEqual(self.client.get('/api/cambios/', {'since': 0}).status_code, 410)
+
+    def test_stream_envia_precio_y_stock(self):
+        cursor = cambios.ultimo_seq()
+        with self.captureOnCommitCallbacks(execute=True):
+            reserva = self.admin_client.post('/api/reservas/', {'items': [{'producto': self.chia.id, 'cantidad': 2}]}, format='json')
+        self.assertEqual(reserva.status_code, 201)
+        response = self.client.get('/api/cambios/stream/', HTTP_LAST_EVENT_ID=str(cursor))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        contenido = self.stream(response)
+        self.assertIn('event: producto\n', contenido)
+        self.assertIn(f'"id":{self.chia.id},"precio":"1000.00","stock":"3.00"', contenido)
+
+    def stream(self, response):
+        async def leer():
+            return b''.join([parte async for parte in response.streaming_content]).decode()
+        return async_to_sync(leer)()
+
+    def test_stream_no_emite_lo_posterior_a_un_hueco_reciente(self):
+        cursor = cambios.ultimo_seq()
+        Cambio.objects.create(seq=cursor + 2, tabla=Producto._meta.db_table, objeto_id=self.chia.id)
+        contenido = self.stream(self.client.get('/api/cambios/stream/', {'since': cursor}))
+        self.assertNotIn('event: producto', contenido)
+        Cambio.objects.filter(seq=cursor + 2).update(fecha=timezone.now() - timezone.timedelta(minutes=1))
+        contenido = self.stream(self.client.get('/api/cambios/stream/', {'since': cursor}))
+        self.assertIn(f'id: {cursor + 2}\nevent: producto\n', contenido)
+
+
+@override_settings(
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+    INSTANTANEAS={**settings.INSTANTANEAS, 'ACTIVAS': True, 'SINCRONO': True, 'DIRECTORIO': tempfile.mkdtemp()},
+)
+class InstantaneasTests(TestCase):
+    def setUp(self):
+        instantaneas.invalidar()
+        self.categoria = Categoria.objects.create(nombre=Categoria.FRUTOS_SECOS)
+        self.nuez = Producto.objects.create(nombre='Nuez', descripcion='desc', precio=1000, stock=5, categoria=self.categoria)
+        admin = Usuario.objects.create_user(username='admin@test.cl', email='admin@test.cl', password='clave', rol='admin')
+        self.client = APIClient()
+        self.admin_client = APIClient()
+        self.admin_client.force_authenticate(admin)
+        instantaneas.construir()
+
+    def contenido(self, response):
+        contenido = b''.join(response.streaming_content)
+        return gzip.decompress(contenido) if response.get('Content-Encoding') == 'gzip' else contenido
+
+    def en_vivo(self, url):
+        with override_settings(INSTANTANEAS={**settings.INSTANTANEAS, 'ACTIVAS': False}):
+            return self.client.get(url).content
+
+    def test_sirve_la_instantanea_comprimida_sin_consultas(self):
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/productos/', HTTP_ACCEPT_ENCODING='gzip;q=1, br;q=0')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(self.contenido(response), self.en_vivo('/api/productos/'))
+
+        identidad = self.client.get('/api/productos/', HTTP_ACCEPT_ENCODING='identity')
+        self.assertNotIn('Content-Encoding', identidad)
+        self.assertEqual(self.client.get('/api/productos/', HTTP_IF_NONE_MATCH=identidad['ETag']).status_code, 304)
+
+        url = f'/api/productos/filtrado_categoria/?categoria={Categoria.FRUTOS_SECOS}'
+        self.assertEqual(self.contenido(self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')), self.en_vivo(url))
+
+    def test_se_reconstruye_al_escribir(self):
+        self.admin_client.patch(f'/api/productos/{self.nuez.id}/', {'precio': '1500.00'}, format='json')
+        response = self.client.get('/api/productos/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertIn(b'"precio":"1500.00"', self.contenido(response))
+
+    def test_se_reconstruye_al_guardar_por_el_orm(self):
+        self.nuez.precio = 1500
+        with self.captureOnCommitCallbacks(execute=True):
+            self.nuez.save()
+            # Hasta confirmar se responde por la ruta normal, ya con el cambio.
+            self.assertFalse(os.path.exists(os.path.join(instantaneas.config['DIRECTORIO'], 'productos.json')))
+            self.assertIn(b'"precio":"1500.00"', self.client.get('/api/productos/').content)
+        response = self.client.get('/api/productos/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn(b'"precio":"1500.00"', self.contenido(response))
+
+        self.categoria.nombre = Categoria.SEMILLAS
+        with self.captureOnCommitCallbacks(execute=True):
+            self.categoria.save()
+        url = f'/api/productos/filtrado_categoria/?categoria={Categoria.SEMILLAS}'
+        self.assertIn(b'"nombre":"Nuez"', self.contenido(self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')))
+
+    def test_cambio_de_stock_no_borra_las_instantaneas(self):
+        listado = os.path.join(instantaneas.config['DIRECTORIO'], 'productos.json')
+        with override_settings(INSTANTANEAS={**settings.INSTANTANEAS, 'SINCRONO': False}), \
+                mock.patch.object(instantaneas, 'agendar') as agendar:
+            catalogo_modificado.send(sender=Producto, ids=[self.nuez.id], campos=['stock'])
+            self.assertTrue(os.path.exists(listado))
+            catalogo_modificado.send(sender=Producto, ids=[self.nuez.id], campos=['precio'])
+            self.assertFalse(os.path.exists(listado))
+        self.assertEqual(agendar.call_count, 2)
+
+    def test_construir_limita_los_reintentos_y_reagenda(self):
+        secuencia = iter(range(1000))
+        with mock.patch('inventario.instantaneas.ultimo_seq', lambda: next(secuencia)), \
+                mock.patch.object(instantaneas, 'agendar') as agendar:
+            instantaneas.construir()
+        self.assertEqual(next(secuencia), 2 * instantaneas.config['INTENTOS'])
+        agendar.assert_called_once()
+        self.assertTrue(os.path.exists(os.path.join(instantaneas.config['DIRECTORIO'], 'productos.json')))
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class RegistroCategoriasTests(TestCase):
+    def setUp(self):
+        self.semillas = Categoria.objects.create(nombre=Categoria.SEMILLAS)
+        Producto.objects.create(nombre='Chía', descripcion='desc', precio=10, stock=5, categoria=self.semillas)
+        admin = Usuario.objects.create_user(username='admin@test.cl', email='admin@test.cl', password='clave', rol='admin')
+        self.client = APIClient()
+        self.admin_client = APIClient()
+        self.admin_client.force_authenticate(admin)
+        registro_categorias.vigentes()
+
+    def consultas_categorias(self, url):
+        catalogo_cache.invalidar()
+        with CaptureQueriesContext(connection) as contexto:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        return [consulta['sql'] for consulta in contexto if '"categorias"' in consulta['sql']]
+
+    def test_lecturas_sin_consultar_categorias(self):
+        for url in ['/api/productos/', '/api/productos/?fields=id,categoria_nombre', '/api/productos/facetas/',
+                    f'/api/productos/filtrado_categoria/?categoria={Categoria.SEMILLAS}', '/api/categorias/']:
+            self.assertEqual(self.consultas_categorias(url), [], url)
+        self.assertEqual(self.client.get('/api/productos/').data[0]['categoria_nombre'], Categoria.SEMILLAS)
+
+    def test_se_invalida_al_escribir(self):
+        response = self.admin_client.post('/api/categorias/', {'nombre': Categoria.MIXES})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(registro_categorias.vigentes().id_de(Categoria.MIXES), response.data['id'])
+        self.assertEqual(self.client.get('/api/categorias/').data, [
+            {'id': self.semillas.id, 'nombre': Categoria.SEMILLAS}, {'id': response.data['id'], 'nombre': Categoria.MIXES},
+        ])
+
+    def test_ve_escrituras_de_otros_procesos_por_la_version(self):
+        # Simula otro proceso: la fila cambia y la versión sube sin pasar por las señales de éste.
+        Categoria.objects.filter(pk=self.semillas.pk).update(nombre=Categoria.CEREALES)
+        VersionTabla.objects.incrementar(Categoria._meta.db_table)
+        self.assertEqual(registro_categorias.vigentes().nombre_de(self.semillas.id), Categoria.SEMILLAS)
+        with override_settings(REGISTRO_CATEGORIAS={'REVISAR_CADA': 0}):
+            self.assertEqual(registro_categorias.vigentes().nombre_de(self.semillas.id), Categoria.CEREALES)
+
+    def test_escrituras_por_orm_suben_la_version(self):
+        version = VersionTabla.objects.de(Categoria._meta.db_table)
+        self.semillas.nombre = Categoria.CEREALES
+        self.semillas.save()
+        self.assertGreater(VersionTabla.objects.de(Categoria._meta.db_table), version or (0,))
+        version = VersionTabla.objects.de(Categoria._meta.db_table)
+        Categoria.objects.create(nombre=Categoria.MIXES).delete()
+        self.assertGreater(VersionTabla.objects.de(Categoria._meta.db_table)[0], version[0])
@@ -2,12 +2,23 @@ from django.conf import settings
 from django.conf.urls.static import static
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import ProductoViewSet,CategoriaViewSet
+from . import async_views
+from .views import ProductoViewSet,CategoriaViewSet,ReservaViewSet,CatalogoCacheEstadisticas,CarritoView,CarritoItemsView,CarritoItemView,CambiosView
 
 router = DefaultRouter()
 router.register(r'productos', ProductoViewSet, basename='producto')
 router.register(r'categorias',CategoriaViewSet, basename='categoria')
+router.register(r'reservas', ReservaViewSet, basename='reserva')
 
 urlpatterns = [
     path('', include(router.urls)),
+    path('async/productos/', async_views.productos, name='async-productos'),
+    path('async/productos/filtrado_categoria/', async_views.filtrado_categoria, name='async-filtrado-categoria'),
+    path('async/productos/<int:pk>/', async_views.producto_detalle, name='async-producto-detalle'),
+    path('carrito/', CarritoView.as_view(), name='carrito'),
+    path('carrito/items/', CarritoItemsView.as_view(), name='carrito-items'),
+    path('carrito/items/<int:producto_id>/', CarritoItemView.as_view(), name='carrito-item'),
+    path('cambios/', CambiosView.as_view(), name='cambios'),
+    path('cambios/stream/', async_views.cambios_stream, name='cambios-stream'),
+    path('cache/estadisticas/', CatalogoCacheEstadisticas.as_view(), name='catalogo-cache-estadisticas'),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -1,87 +1,412 @@
-from rest_framework import viewsets
+from decimal import Decimal
+
+from rest_framework import viewsets, mixins, status
+from rest_framework.views import APIView
+from rest_framework.pagination import _positive_int
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
-from .models import Producto, Categoria
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Count, Max
+from django.http import StreamingHttpResponse
+from .models import Producto, Categoria, VersionTabla, Reserva
 from rest_framework.decorators import action
-from .serializers import ProductoSerializer, CategoriaSerializer
+from .serializers import ProductoSerializer, CategoriaSerializer, ReservaSerializer, CarritoItemSerializer
+from .pagination import ProductoCursorPagination
+from .filters import ProductoFilter
+from .cache import CatalogoCacheMixin, catalogo_cache
+from .signals import catalogo_modificado
+from .condicional import GetCondicionalMixin, etag_fuerte
 from usuarios.permissions import IsAdminUser, IsClienteUser
-from cloudinary.uploader import upload, destroy
-from urllib.parse import urlparse
+from .envios import cotizar_usuario
+from .imagenes import encolar_subida, encolar_borrado, preparar_imagen
+from .facetas import calcular_facetas
+from .serializacion import valores_productos, filas_a_dicts
+from backend.instrumentacion import medir
+from .importacion import formato_de, leer_filas, importar_productos, exportar_productos
+from . import reservas, busqueda
+from .carritos import CarritoOcupado, almacen_carritos, clave_usuario, clave_sesion, cotizar
+from . import cambios
+from .instantaneas import instantaneas
+from .categorias import registro_categorias
 
-class ProductoViewSet(viewsets.ModelViewSet):
+class ProductoViewSet(GetCondicionalMixin, CatalogoCacheMixin, viewsets.ModelViewSet):
     queryset = Producto.objects.all()
     serializer_class = ProductoSerializer
-    filterset_fields = ['nombre', 'categoria__nombre']
+    pagination_class = ProductoCursorPagination
+    filterset_class = ProductoFilter
     search_fields = ['nombre']
+    ordering_fields = ['id', 'precio']
+    ordering = ['id']
 
     def perform_create(self, serializer):
         self.crear_imagen(serializer)
+        catalogo_modificado.send(sender=Producto)
     def perform_update(self, serializer):
         self.actualizar_imagen(serializer)
+        catalogo_modificado.send(sender=Producto)
     def perform_destroy(self, instance):
         self.borrar_imagen(instance)
+        catalogo_modificado.send(sender=Producto)
 
     def get_permissions(self):
-        if self.action in ['list', 'retrieve','filtrado_categoria']:
+        if self.action in ['list', 'retrieve','filtrado_categoria','buscar','facetas']:
             return [AllowAny()]
-        elif self.action in ['create', 'update', 'destroy']:
+        elif self.action in ['create', 'update', 'destroy', 'importar', 'exportar']:
             return [IsAdminUser()]
         return [IsAuthenticated()]
 
+    def get_campos(self):
+        campos = self.request.query_params.get('fields')
+        if not campos or self.action not in ['list', 'retrieve', 'filtrado_categoria', 'buscar']:
+            return None
+        validos = ProductoSerializer.Meta.fields
+        return [campo for campo in campos.split(',') if campo in validos] or None
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs.setdefault('campos', self.get_campos())
+        return super().get_serializer(*args, **kwargs)
+
+    def proyectar(self, queryset):
+        campos = self.get_campos()
+        if not campos:
+            return queryset
+        columnas = set(campos) - {'categoria_nombre', 'srcset'}
+        if {'variantes', 'srcset'} & set(campos):
+            columnas |= {'urlfoto', 'variantes'}
+        if 'categoria_nombre' in campos:
+            # El nombre lo pone el registro de categorías a partir de categoria_id.
+            columnas.add('categoria')
+        return queryset.only('id', *columnas)
+
+    def get_queryset(self):
+        return self.proyectar(super().get_queryset())
+
+    def list(self, request, *args, **kwargs):
+        if not request.query_params:
+            # El listado por defecto es igual para todos: se sirve la instantánea ya comprimida si existe.
+            response = instantaneas.servir(request)
+            if response is not None:
+                return response
+        return self.respuesta_condicional(
+            request, lambda: self.respuesta_cacheada(request, lambda: self.listar(self.filter_queryset(self.get_queryset())))
+        )
+
+    def listar(self, queryset):
+        # Ruta rápida de sólo lectura: filas con .values() en vez de instancias y ProductoSerializer.
+        campos = self.get_campos()
+        filas = valores_productos(queryset, campos)
+        page = self.paginate_queryset(filas)
+        with medir('serializer'):
+            datos = filas_a_dicts(filas if page is None else page, campos)
+        if page is not None:
+            return self.get_paginated_response(datos)
+        return Response(datos)
 
     @action(detail=False, methods=['get'], permission_classes=[AllowAny])
     def filtrado_categoria(self, request):
+        if list(request.query_params) == ['categoria']:
+            response = instantaneas.servir(request, request.query_params['categoria'])
+            if response is not None:
+                return response
+        return self.respuesta_condicional(
+            request, lambda: self.respuesta_cacheada(request, lambda: self.filtrar_por_categoria(request))
+        )
+
+    def validadores(self, request):
+        queryset = self.filter_queryset(self.get_queryset())
+        if self.action == 'retrieve':
+            try:
+                queryset = queryset.filter(pk=self.kwargs['pk'])
+            except (ValueError, TypeError, ValidationError):
+                # Sin validadores: retrieve responde el 404 de get_object.
+                return None
+        elif self.action == 'filtrado_categoria':
+            categoria_id = registro_categorias.vigentes().id_de(request.query_params.get('categoria'))
+            queryset = queryset.filter(categoria_id=categoria_id)
+        resumen = queryset.aggregate(modificado=Max('updated_at'), total=Count('id'))
+        if not resumen['total']:
+            return None
+        # categoria_nombre sale del registro: renombrar una categoría cambia la respuesta sin tocar productos.
+        version, modificado_categorias = registro_categorias.vigentes().version or (0, None)
+        modificado = max(filter(None, [resumen['modificado'], modificado_categorias]))
+        etag = etag_fuerte(request.get_full_path(), resumen['modificado'].isoformat(), resumen['total'], version)
+        return etag, modificado
+
+    def filtrar_por_categoria(self, request):
         categoria_nombre = request.query_params.get('categoria', None)
         if categoria_nombre:
-            categoria = Categoria.objects.filter(nombre=categoria_nombre).first()
-            if categoria:
-                productos = Producto.objects.filter(categoria=categoria)
-                serializer = self.get_serializer(productos, many=True)
-                return Response(serializer.data)
+            categoria_id = registro_categorias.vigentes().id_de(categoria_nombre)
+            if categoria_id is not None:
+                productos = self.filter_queryset(self.get_queryset()).filter(categoria_id=categoria_id)
+                return self.listar(productos)
             return Response({'detail': 'Categoría no encontrada'}, status=404)
         return Response({'detail': 'Debe proporcionar un nombre de categoría'}, status=400)
 
+    @action(detail=False, methods=['get'], permission_classes=[AllowAny])
+    def facetas(self, request):
+        return self.respuesta_condicional(
+            request, lambda: self.respuesta_cacheada(
+                request, lambda: Response(calcular_facetas(self.filter_queryset(Producto.objects.all())))
+            )
+        )
+
+    @action(detail=False, methods=['get'], permission_classes=[AllowAny])
+    def buscar(self, request):
+        return self.respuesta_cacheada(request, lambda: self.resultados_busqueda(request))
+
+    def resultados_busqueda(self, request):
+        consulta = request.query_params.get('q', '').strip()
+        if not consulta:
+            return Response({'detail': 'Debe proporcionar un texto de búsqueda'}, status=400)
+        try:
+            # Como page_size: entero positivo, recortado al máximo de la paginación.
+            limite = _positive_int(request.query_params.get('limite', 20), strict=True, cutoff=settings.PRODUCTOS_MAX_PAGE_SIZE)
+        except ValueError:
+            return Response({'detail': 'limite debe ser un entero positivo'}, status=400)
+        if request.query_params.get('modo') == 'autocompletar':
+            return Response(busqueda.autocompletar(consulta, limite))
+        ids = busqueda.buscar(consulta, limite)
+        productos = self.get_queryset().in_bulk(ids)
+        serializer = self.get_serializer([productos[i] for i in ids if i in productos], many=True)
+        return Response(serializer.data)
+
+    @action(detail=False, methods=['post'])
+    def importar(self, request):
+        archivo = request.FILES.get('archivo')
+        if not archivo:
+            return Response({'detail': 'Debe adjuntar un archivo'}, status=400)
+        formato = formato_de(archivo, request.query_params.get('formato'))
+        resultado = importar_productos(leer_filas(archivo, formato), settings.PRODUCTOS_LOTE_IMPORTACION)
+        return Response(resultado)
+
+    @action(detail=False, methods=['get'])
+    def exportar(self, request):
+        formato = request.query_params.get('formato', 'csv')
+        if formato not in ('csv', 'jsonl'):
+            return Response({'detail': 'Formato no soportado, use csv o jsonl'}, status=400)
+        tipos = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson'}
+        response = StreamingHttpResponse(
+            exportar_productos(formato, settings.PRODUCTOS_LOTE_EXPORTACION), content_type=tipos[formato],
+        )
+        response['Content-Disposition'] = f'attachment; filename="productos.{formato}"'
+        return response
+
     def crear_imagen(self, serializer):
-        producto = serializer.save()
         imagen = self.request.FILES.get('imagen')
         if imagen:
-            try:
-                folder_path = f"productos/{producto.id}-{producto.nombre}"
-                response = upload(imagen, folder=folder_path)
-                producto.urlfoto = response['secure_url']
-                producto.save()
-            except Exception as e:
-                producto.delete()
-                raise e
+            producto = serializer.save(estado_imagen=Producto.IMAGEN_PENDIENTE, imagen_pendiente=preparar_imagen(imagen))
+            encolar_subida(producto)
+        else:
+            serializer.save(estado_imagen=Producto.IMAGEN_SIN_IMAGEN)
 
     def actualizar_imagen(self, serializer):
-        producto = self.get_object()
         imagen = self.request.FILES.get('imagen')
         if imagen:
-            try:
-                if producto.urlfoto:
-                    parsed_url = urlparse(producto.urlfoto)
-                    public_id_with_extension = parsed_url.path.split("/")[-1]
-                    public_id = public_id_with_extension.rsplit(".", 1)[0]
-                    destroy(public_id)
-                folder_path = f"productos/{producto.id}-{producto.nombre}"
-                response = upload(imagen, folder=folder_path)
-                producto.urlfoto = response['secure_url']
-            except Exception as e:
-                raise e
-        serializer.save()
+            # La imagen anterior se borra cuando termina la subida de la nueva.
+            producto = serializer.save(estado_imagen=Producto.IMAGEN_PENDIENTE, imagen_pendiente=preparar_imagen(imagen))
+            encolar_subida(producto)
+        else:
+            serializer.save()
 
     def borrar_imagen(self, instance):
-        if instance.urlfoto:
-            parsed_url = urlparse(instance.urlfoto)
-            public_id_with_extension = parsed_url.path.split("/")[-1]
-            public_id = public_id_with_extension.rsplit(".", 1)[0]
-            try:
-                destroy(public_id)
-            except Exception as e:
-                pass
+        if instance.public_id_foto:
+            encolar_borrado(instance.public_id_foto)
         super().perform_destroy(instance)
 
-class CategoriaViewSet(viewsets.ModelViewSet):
+class CategoriaViewSet(GetCondicionalMixin, CatalogoCacheMixin, viewsets.ModelViewSet):
     queryset = Categoria.objects.all()
     serializer_class = CategoriaSerializer
+
+    def validadores(self, request):
+        version = VersionTabla.objects.de(Categoria._meta.db_table)
+        if version is None:
+            return None
+        numero, modificado = version
+        return etag_fuerte(request.get_full_path(), numero), modificado
+
+    def list(self, request, *args, **kwargs):
+        if request.query_params:
+            return super().list(request, *args, **kwargs)
+        # Sin ordenamiento pedido, el listado sale del registro en memoria del proceso.
+        return self.respuesta_condicional(
+            request, lambda: self.respuesta_cacheada(request, lambda: Response(registro_categorias.vigentes().listado()))
+        )
+
+    def perform_create(self, serializer):
+        super().perform_create(serializer)
+        catalogo_modificado.send(sender=Categoria)
+
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        catalogo_modificado.send(sender=Categoria)
+
+    def perform_destroy(self, instance):
+        super().perform_destroy(instance)
+        catalogo_modificado.send(sender=Categoria)
+
+class ReservaViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin, mixins.ListModelMixin, viewsets.GenericViewSet):
+    serializer_class = ReservaSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        queryset = Reserva.objects.prefetch_related('items').order_by('-id')
+        if self.request.user.rol == 'admin':
+            return queryset
+        return queryset.filter(usuario_id=self.request.user.id)
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        reservas.barrer_vencidas()
+        items = [(item['producto'].id, item['cantidad']) for item in serializer.validated_data['items']]
+        try:
+            reserva = reservas.reservar(items, usuario_id=request.user.id)
+        except reservas.StockInsuficiente as e:
+            return Response({'detail': str(e), 'producto': e.producto_id}, status=status.HTTP_409_CONFLICT)
+        return Response(self.get_serializer(reserva).data, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['post'])
+    def confirmar(self, request, pk=None):
+        return self.transicion(reservas.confirmar)
+
+    @action(detail=True, methods=['post'])
+    def liberar(self, request, pk=None):
+        return self.transicion(reservas.liberar)
+
+    def transicion(self, operacion):
+        reserva = self.get_object()
+        try:
+            operacion(reserva.id)
+        except reservas.ReservaNoVigente:
+            return Response({'detail': 'La reserva no está pendiente o ya expiró'}, status=status.HTTP_409_CONFLICT)
+        reserva.refresh_from_db()
+        return Response(self.get_serializer(reserva).data)
+
+class CatalogoCacheEstadisticas(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(catalogo_cache.estadisticas())
+
+
+class CarritoMixin:
+    permission_classes = [AllowAny]
+
+    def clave(self, request, crear=False):
+        sesion = request.session.session_key
+        if request.user.is_authenticated:
+            clave = clave_usuario(request.user.id)
+            if sesion:
+                almacen_carritos.fusionar(clave_sesion(sesion), clave)
+            return clave
+        if sesion is None:
+            if not crear:
+                return None
+            # El carrito anónimo se identifica con la sesión; se crea con el primer producto.
+            request.session['carrito'] = True
+            request.session.save()
+            sesion = request.session.session_key
+        return clave_sesion(sesion)
+
+    def responder(self, lineas):
+        with medir('carrito'):
+            datos = cotizar(lineas)
+            if self.cotizar_envios():
+                # Las cantidades están en kilos (CARRITO_CANTIDADES_EN_KILOS): el peso del pedido es su suma.
+                peso = sum((lineas[item['producto']] for item in datos['items']), Decimal('0'))
+                datos['envios'] = cotizar_usuario(self.request.user.id, peso)
+            return Response(datos)
+
+    def cotizar_envios(self):
+        # A pedido (?envio=1): cada cotización consulta las direcciones del usuario.
+        return (
+            self.request.user.is_authenticated
+            and self.request.query_params.get('envio') == '1'
+            and settings.ENVIOS['CARRITO_CANTIDADES_EN_KILOS']
+        )
+
+    def handle_exception(self, exc):
+        if isinstance(exc, CarritoOcupado):
+            return Response({'detail': 'El carrito se está modificando, intente de nuevo'}, status=status.HTTP_409_CONFLICT)
+        return super().handle_exception(exc)
+
+    def fijar(self, request, producto_id, cantidad, sumar=False):
+        clave = self.clave(request, crear=True)
+        with almacen_carritos.bloqueado(clave):
+            lineas = almacen_carritos.obtener(clave)
+            if producto_id not in lineas and len(lineas) >= settings.CARRITOS['MAX_ITEMS']:
+                return Response({'detail': 'El carrito alcanzó el máximo de productos'}, status=status.HTTP_400_BAD_REQUEST)
+            lineas[producto_id] = lineas.get(producto_id, 0) + cantidad if sumar else cantidad
+            response = self.responder(lineas)
+            # La cotización ya trae los productos existentes: no hace falta otra consulta para validar.
+            if producto_id not in {item['producto'] for item in response.data['items']}:
+                return Response({'producto': ['El producto no existe']}, status=status.HTTP_400_BAD_REQUEST)
+            almacen_carritos.guardar(clave, lineas)
+        return response
+
+
+class CarritoView(CarritoMixin, APIView):
+    def get(self, request):
+        clave = self.clave(request)
+        return self.responder(almacen_carritos.obtener(clave) if clave else {})
+
+    def delete(self, request):
+        clave = self.clave(request)
+        if clave:
+            with almacen_carritos.bloqueado(clave):
+                almacen_carritos.guardar(clave, {})
+        return self.responder({})
+
+
+class CarritoItemsView(CarritoMixin, APIView):
+    def post(self, request):
+        """Suma la cantidad indicada a la línea del producto."""
+        serializer = CarritoItemSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return self.fijar(request, serializer.validated_data['producto'], serializer.validated_data['cantidad'], sumar=True)
+
+
+class CarritoItemView(CarritoMixin, APIView):
+    def put(self, request, producto_id):
+        """Reemplaza la cantidad de la línea."""
+        serializer = CarritoItemSerializer(data={'cantidad': request.data.get('cantidad'), 'producto': producto_id})
+        serializer.is_valid(raise_exception=True)
+        return self.fijar(request, producto_id, serializer.validated_data['cantidad'])
+
+    def delete(self, request, producto_id):
+        clave = self.clave(request)
+        if not clave:
+            return self.responder({})
+        with almacen_carritos.bloqueado(clave):
+            lineas = almacen_carritos.obtener(clave)
+            if lineas.pop(producto_id, None) is not None:
+                almacen_carritos.guardar(clave, lineas)
+        return self.responder(lineas)
+
+
+def seq_de(valor):
+    try:
+        seq = int(valor)
+    except (TypeError, ValueError):
+        return None
+    return seq if seq >= 0 else None
+
+
+class CambiosView(APIView):
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        """Sin `since` devuelve sólo el cursor actual, para sincronizar después de un listado completo."""
+        if 'since' not in request.query_params:
+            return Response({'cursor': cambios.ultimo_seq()})
+        desde = seq_de(request.query_params['since'])
+        if desde is None:
+            return Response({'detail': 'since debe ser un entero no negativo'}, status=status.HTTP_400_BAD_REQUEST)
+        if desde < cambios.compactado_hasta():
+            return Response(
+                {'detail': 'El cursor es anterior a la compactación; vuelva a listar el catálogo', 'cursor': cambios.ultimo_seq()},
+                status=status.HTTP_410_GONE,
+            )
+        with medir('serializer'):
+            return Response(cambios.delta(desde))
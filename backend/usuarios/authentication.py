@@ -0,0 +1,51 @@
+from django.utils.functional import cached_property
+from rest_framework.authentication import BasicAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication, JWTStatelessUserAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+
+from .limites import limitador
+from .models import Usuario
+from .revocacion import lista_revocacion
+
+
+class UsuarioToken(TokenUser):
+    """Usuario liviano construido desde los claims del JWT, sin consultar la base de datos."""
+
+    @cached_property
+    def rol(self):
+        # Tokens emitidos antes de incluir el claim: se resuelve una vez desde la base.
+        return self.token.get('rol') or self.usuario.rol
+
+    @cached_property
+    def usuario(self):
+        return Usuario.objects.get(pk=self.id)
+
+
+class RevocacionMixin:
+    def get_validated_token(self, raw_token):
+        token = super().get_validated_token(raw_token)
+        if lista_revocacion.esta_revocado(token):
+            raise InvalidToken('El token fue revocado')
+        return token
+
+
+class JWTRevocableAuthentication(RevocacionMixin, JWTStatelessUserAuthentication):
+    """Autenticación sin consultar la base que además rechaza tokens revocados."""
+
+
+class JWTRevocableUsuarioAuthentication(RevocacionMixin, JWTAuthentication):
+    """Igual que la anterior pero cargando el Usuario completo, para vistas que lo modifican."""
+
+
+class BasicAuthenticationLimitada(BasicAuthentication):
+    """Basic auth que pasa por el limitador antes de verificar la clave."""
+
+    def authenticate_credentials(self, userid, password, request=None):
+        limitador.verificar(request, userid, password)
+        try:
+            return super().authenticate_credentials(userid, password, request)
+        except AuthenticationFailed:
+            limitador.fallo(request, userid, password)
+            raise
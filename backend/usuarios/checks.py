@@ -0,0 +1,8 @@
+from django.conf import settings
+
+from backend.checks import requerir_cache_compartida
+
+requerir_cache_compartida('La lista de tokens revocados (TOKENS_REVOCADOS)', lambda: settings.TOKENS_REVOCADOS['ALIAS'], 'usuarios.001')
+requerir_cache_compartida(
+    'El limitador de credenciales (LIMITES_CREDENCIALES)', lambda: settings.LIMITES_CREDENCIALES['ALIAS'], 'usuarios.002',
+)
@@ -0,0 +1,120 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.contrib.auth.hashers import identify_hasher, make_password
+from django.db import DatabaseError, transaction
+from rest_framework import serializers
+
+from inventario.importacion import lotes
+from .models import Usuario
+from .serializers import UsuarioImportacionSerializer
+
+COLUMNAS = ['email', 'password', 'nombre', 'apellido', 'rol']
+
+
+def es_hash(password):
+    """True si ya viene en formato de Django (p. ej. "pbkdf2_sha256$...") y no hay que hashearla."""
+    try:
+        identify_hasher(password)
+    except ValueError:
+        return False
+    return True
+
+
+class Hasheador:
+    """Reparte el hash de contraseñas entre procesos; con un proceso o lotes chicos hashea en línea.
+
+    El pool sólo se crea con procesos > 1, que usa el comando importar_usuarios: un worker web
+    no debe abrir procesos hijos dentro de una petición.
+    """
+
+    def __init__(self, procesos=None):
+        self.procesos = procesos or os.cpu_count() or 1
+        self.pool = None
+
+    def hashear(self, claves):
+        if self.procesos == 1 or len(claves) < self.procesos:
+            return [make_password(clave) for clave in claves]
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(self.procesos)
+        return list(self.pool.map(make_password, claves, chunksize=max(1, len(claves) // (self.procesos * 4))))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if self.pool is not None:
+            self.pool.shutdown()
+
+
+def importar_usuarios(filas, tamano_lote, procesos=None, max_claves=None):
+    """Crea los usuarios por lotes; con `max_claves` sólo se hashean esa cantidad de contraseñas en texto plano."""
+    validador = UsuarioImportacionSerializer()
+    resultado = {'creados': 0, 'errores': []}
+    vistos = set()
+    numero = 0
+    with Hasheador(procesos) as hasheador:
+        for lote in lotes(filas, tamano_lote):
+            validas = []
+            for fila in lote:
+                numero += 1
+                try:
+                    if isinstance(fila, Exception):
+                        raise fila
+                    validas.append((numero, validador.run_validation(fila)))
+                except serializers.ValidationError as e:
+                    resultado['errores'].append({'fila': numero, 'errores': e.detail})
+            if max_claves is not None:
+                validas, max_claves = limitar_claves(validas, max_claves, resultado)
+            resultado['creados'] += guardar_lote(descartar_duplicados(validas, vistos, resultado), hasheador, resultado)
+    resultado['errores'].sort(key=lambda error: error['fila'])
+    return resultado
+
+
+def limitar_claves(validas, disponibles, resultado):
+    """Rechaza las filas con contraseña en texto plano que exceden el cupo; devuelve las demás y el cupo restante."""
+    aceptadas = []
+    for numero, datos in validas:
+        if not es_hash(datos['password']):
+            if disponibles == 0:
+                resultado['errores'].append({'fila': numero, 'errores': {'password': [
+                    'Demasiadas contraseñas en texto plano para una importación por HTTP; '
+                    'use python manage.py importar_usuarios o envíelas ya hasheadas',
+                ]}})
+                continue
+            disponibles -= 1
+        aceptadas.append((numero, datos))
+    return aceptadas, disponibles
+
+
+def descartar_duplicados(validas, vistos, resultado):
+    existentes = set(Usuario.objects.filter(email__in=[datos['email'] for _, datos in validas]).values_list('email', flat=True))
+    unicas = []
+    for numero, datos in validas:
+        if datos['email'] in existentes or datos['email'] in vistos:
+            resultado['errores'].append({'fila': numero, 'errores': {'email': ['Ya existe un usuario con este email']}})
+            continue
+        vistos.add(datos['email'])
+        unicas.append((numero, datos))
+    return unicas
+
+
+def guardar_lote(validas, hasheador, resultado):
+    planas = [datos for _, datos in validas if not es_hash(datos['password'])]
+    for datos, hash_ in zip(planas, hasheador.hashear([datos['password'] for datos in planas])):
+        datos['password'] = hash_
+    usuarios = [
+        Usuario(
+            username=datos['email'], is_staff=datos['rol'] == 'admin', is_superuser=datos['rol'] == 'admin', **datos,
+        )
+        for _, datos in validas
+    ]
+    try:
+        with transaction.atomic():
+            Usuario.objects.bulk_create(usuarios)
+    except DatabaseError as e:
+        # Los lotes anteriores ya quedaron guardados: se informa el lote fallido y se sigue con el resto.
+        for numero, _ in validas:
+            resultado['errores'].append({'fila': numero, 'errores': {'non_field_errors': [f'No se pudo guardar el lote: {e}']}})
+        return 0
+    return len(usuarios)
@@ -0,0 +1,161 @@
+import hashlib
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.exceptions import AuthenticationFailed, Throttled
+from rest_framework.throttling import BaseThrottle
+
+
+class BaldesLocales:
+    """Token bucket por clave en memoria del proceso, acotado a las claves más recientes."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.baldes = OrderedDict()
+
+    def espera(self, clave, capacidad, ritmo):
+        """Segundos hasta que la clave tenga un token (0 si ya tiene), sin consumirlo."""
+        with self.lock:
+            tokens, ultimo = self.baldes.get(clave, (capacidad, None))
+        if ultimo is not None:
+            tokens = min(capacidad, tokens + (time.monotonic() - ultimo) * ritmo)
+        return 0.0 if tokens >= 1 else (1 - tokens) / ritmo
+
+    def tomar(self, clave, capacidad, ritmo, max_claves):
+        ahora = time.monotonic()
+        with self.lock:
+            tokens, ultimo = self.baldes.pop(clave, (capacidad, ahora))
+            tokens = min(capacidad, tokens + (ahora - ultimo) * ritmo)
+            self.baldes[clave] = (max(tokens - 1, 0.0), ahora)
+            while len(self.baldes) > max_claves:
+                self.baldes.popitem(last=False)
+
+
+class LimitadorCredenciales:
+    """Frena los intentos de login, registro y Basic auth antes de llegar al hasher.
+
+    Por orden de costo: IPs bloqueadas recordadas en el proceso, un token bucket local por IP
+    que gastan los fallos (los logins correctos no lo consumen), y en una sola lectura a la cache
+    compartida las ventanas deslizantes de fallos por IP y por email más la huella de la
+    credencial exacta si ya falló hace poco.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reiniciar()
+
+    def reiniciar(self):
+        self.baldes = BaldesLocales()
+        self.bloqueadas = {}
+
+    @property
+    def config(self):
+        return settings.LIMITES_CREDENCIALES
+
+    @property
+    def cache(self):
+        return caches[self.config['ALIAS']]
+
+    @staticmethod
+    def ip(request):
+        # Respeta NUM_PROXIES de DRF para leer X-Forwarded-For detrás de un proxy.
+        return BaseThrottle().get_ident(request)
+
+    def huella(self, email, password):
+        clave = hashlib.sha256(settings.SECRET_KEY.encode()).digest()
+        credencial = f'{email.strip().lower()}\0{password}'.encode()
+        return f'limites:huella:{hashlib.blake2b(credencial, key=clave, digest_size=16).hexdigest()}'
+
+    def ventana(self, clave):
+        """Claves de la ventana anterior y la actual, y el peso de la anterior."""
+        duracion = self.config['VENTANA']
+        ahora = time.time()
+        numero = int(ahora // duracion)
+        peso = 1 - (ahora % duracion) / duracion
+        return f'limites:{clave}:{numero - 1}', f'limites:{clave}:{numero}', peso
+
+    def estimar(self, valores, ventana):
+        anterior, actual, peso = ventana
+        return valores.get(anterior, 0) * peso + valores.get(actual, 0)
+
+    def sumar(self, ventana):
+        _, actual, _ = ventana
+        # Dura dos ventanas porque la siguiente todavía la lee con peso.
+        self.cache.add(actual, 0, self.config['VENTANA'] * 2)
+        try:
+            return self.cache.incr(actual)
+        except ValueError:
+            self.cache.set(actual, 1, self.config['VENTANA'] * 2)
+            return 1
+
+    def frenar_local(self, ip):
+        bloqueo = self.bloqueadas.get(ip)
+        if bloqueo is not None:
+            if bloqueo > time.monotonic():
+                raise Throttled(math.ceil(bloqueo - time.monotonic()))
+            self.bloqueadas.pop(ip, None)
+        espera = self.baldes.espera(ip, self.config['RAFAGA'], self.config['RITMO'])
+        if espera:
+            raise Throttled(math.ceil(espera))
+
+    def gastar(self, ip):
+        self.baldes.tomar(ip, self.config['RAFAGA'], self.config['RITMO'], self.config['MAX_IPS_LOCALES'])
+
+    def bloquear(self, ip):
+        segundos = self.config['VENTANA']
+        with self.lock:
+            if len(self.bloqueadas) >= self.config['MAX_IPS_LOCALES']:
+                ahora = time.monotonic()
+                self.bloqueadas = {clave: hasta for clave, hasta in self.bloqueadas.items() if hasta > ahora}
+            self.bloqueadas[ip] = time.monotonic() + segundos
+        return segundos
+
+    def verificar(self, request, email, password):
+        """Lanza Throttled o AuthenticationFailed sin calcular ningún hash de contraseña."""
+        if not self.config['ACTIVO']:
+            return
+        ip = self.ip(request)
+        self.frenar_local(ip)
+        por_ip, por_email, huella = self.ventana(f'ip:{ip}'), self.ventana(f'email:{email.strip().lower()}'), self.huella(email, password)
+        valores = self.cache.get_many([*por_ip[:2], *por_email[:2], huella])
+        if self.estimar(valores, por_ip) >= self.config['FALLOS_IP']:
+            raise Throttled(self.bloquear(ip))
+        if self.estimar(valores, por_email) >= self.config['FALLOS_EMAIL']:
+            raise Throttled(self.config['VENTANA'])
+        if huella in valores:
+            # Misma credencial que ya falló: se rechaza igual que el hasher, pero sin pagarlo.
+            self.gastar(ip)
+            self.sumar(por_ip)
+            raise AuthenticationFailed('Credenciales inválidas')
+
+    def fallo(self, request, email, password):
+        if not self.config['ACTIVO']:
+            return
+        ip = self.ip(request)
+        self.gastar(ip)
+        self.sumar(self.ventana(f'ip:{ip}'))
+        self.sumar(self.ventana(f'email:{email.strip().lower()}'))
+        self.cache.set(self.huella(email, password), 1, self.config['HUELLAS_TTL'])
+
+    def olvidar(self, email, password):
+        """Borra la huella cuando la credencial pasa a ser válida (registro o cambio de clave)."""
+        self.cache.delete(self.huella(email, password))
+
+    def verificar_registro(self, request):
+        if not self.config['ACTIVO']:
+            return
+        ip = self.ip(request)
+        # Cada registro calcula un hash, así que aquí el balde se gasta siempre.
+        self.frenar_local(ip)
+        self.gastar(ip)
+        ventana = self.ventana(f'registro:{ip}')
+        actual = self.sumar(ventana)
+        if self.estimar({ventana[0]: self.cache.get(ventana[0], 0), ventana[1]: actual}, ventana) > self.config['REGISTROS_IP']:
+            raise Throttled(self.config['VENTANA'])
+
+
+limitador = LimitadorCredenciales()
@@ -0,0 +1,55 @@
+import random
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from inventario.benchmarks import bd_temporal, percentiles
+from inventario.envios import cotizar_usuario, importar_envios, registro_envios
+from usuarios.models import Direccion, Usuario
+
+
+class Command(BaseCommand):
+    help = 'Mide la latencia de cotizar el envío a todas las direcciones de un usuario con una tabla de zonas sembrada.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rangos', type=int, default=50_000, help='Rangos postales de la tabla.')
+        parser.add_argument('--direcciones', type=int, default=10, help='Direcciones del usuario.')
+        parser.add_argument('--cotizaciones', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        azar = random.Random(0)
+        ancho = 10_000_000 // options['rangos']
+        zonas = [
+            {'zona': f'Z{i % 200}', 'pais': 'Chile', 'desde': i * ancho, 'hasta': (i + 1) * ancho - 1}
+            for i in range(options['rangos'])
+        ]
+        tarifas = [
+            {'zona': f'Z{zona}', 'peso_hasta': peso, 'precio': 1000 + zona * 10 + peso * 100}
+            for zona in range(200) for peso in (1, 2, 5, 10, 20, 50)
+        ]
+        with bd_temporal():
+            resultado = importar_envios(zonas, tarifas)
+            usuario = Usuario.objects.create_user(username='bench@test.cl', email='bench@test.cl', password='clave')
+            Direccion.objects.bulk_create([
+                Direccion(usuario=usuario, ciudad='X', pais='Chile', direccion='Calle 1', codigo_postal=str(azar.randrange(10_000_000)))
+                for _ in range(options['direcciones'])
+            ])
+            inicio = time.perf_counter()
+            indice = registro_envios.vigente()
+            self.stdout.write(f"{resultado['zonas']} rangos y {resultado['tarifas']} tarifas cargados en {(time.perf_counter() - inicio) * 1000:.1f} ms")
+
+            direcciones = list(Direccion.objects.filter(usuario=usuario))
+            mediciones = {
+                'índice (sin base)': lambda peso: [indice.cotizar(indice.zona(d.pais, d.codigo_postal), peso) for d in direcciones],
+                'cotizar_usuario': lambda peso: cotizar_usuario(usuario.id, peso),
+            }
+            for nombre, cotizar in mediciones.items():
+                latencias = []
+                for _ in range(options['cotizaciones']):
+                    peso = Decimal(azar.randint(1, 400)) / 10
+                    inicio = time.perf_counter()
+                    cotizar(peso)
+                    latencias.append(time.perf_counter() - inicio)
+                resumen = ', '.join(f'{clave}: {valor * 1000:.3f} ms' for clave, valor in percentiles(latencias).items())
+                self.stdout.write(f'{nombre:<20}{resumen}')
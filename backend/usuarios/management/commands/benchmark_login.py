@@ -0,0 +1,101 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, make_password
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.test import Client, override_settings
+
+from inventario.benchmarks import bd_temporal, percentiles
+from usuarios.limites import limitador
+from usuarios.models import Usuario
+
+CLAVE = 'clave-benchmark'
+
+
+class PBKDF2Benchmark(PBKDF2PasswordHasher):
+    """PBKDF2 con iteraciones configurables, para que la prueba dure segundos y no minutos."""
+    algorithm = 'pbkdf2_benchmark'
+
+
+class Command(BaseCommand):
+    help = 'Mide la latencia de logins legítimos durante una inundación de credenciales robadas, con y sin límites.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--duracion', type=float, default=5.0, help='Segundos por escenario.')
+        parser.add_argument('--trabajadores', type=int, default=4, help='Hilos del servidor simulado.')
+        parser.add_argument('--ritmo-ataque', type=float, default=100.0, help='Intentos maliciosos por segundo.')
+        parser.add_argument('--ips-ataque', type=int, default=4)
+        parser.add_argument('--ritmo-legitimo', type=float, default=5.0, help='Logins legítimos por segundo.')
+        parser.add_argument('--iteraciones', type=int, default=20_000, help='Iteraciones de PBKDF2.')
+
+    def handle(self, *args, **options):
+        PBKDF2Benchmark.iterations = options['iteraciones']
+        hashers = ['usuarios.management.commands.benchmark_login.PBKDF2Benchmark']
+        with bd_temporal(), override_settings(ALLOWED_HOSTS=['testserver'], PASSWORD_HASHERS=hashers):
+            clave = make_password(CLAVE)
+            Usuario.objects.bulk_create([
+                Usuario(username=f'cliente{i}@bench.cl', email=f'cliente{i}@bench.cl', password=clave)
+                for i in range(50)
+            ])
+            self.stdout.write(f"{'límites':<10}{'ataque':<8}{'p50 ms':>10}{'p99 ms':>10}{'ok':>6}{'sin atender':>13}{'ataques 429/401':>18}")
+            for activo in (False, True):
+                for ataque in (False, True):
+                    limites = {**settings.LIMITES_CREDENCIALES, 'ACTIVO': activo}
+                    with override_settings(LIMITES_CREDENCIALES=limites):
+                        cache.clear()
+                        limitador.reiniciar()
+                        self.reportar(activo, ataque, self.escenario(options, ataque))
+
+    def escenario(self, options, ataque):
+        clientes = threading.local()
+        legitimas, estados_ataque, lock = [], [], threading.Lock()
+
+        def login(email, password, ip):
+            client = getattr(clientes, 'client', None) or Client()
+            clientes.client = client
+            try:
+                return client.post('/auth/login/', {'email': email, 'password': password}, REMOTE_ADDR=ip).status_code
+            finally:
+                close_old_connections()
+
+        def legitima(n, encolada):
+            estado = login(f'cliente{n % 50}@bench.cl', CLAVE, f'198.51.100.{n % 250}')
+            with lock:
+                legitimas.append((time.perf_counter() - encolada, estado))
+
+        def maliciosa(n):
+            # Pares email/clave filtrados de otro sitio: casi todos distintos entre sí.
+            estado = login(f'victima{random.randrange(10_000)}@bench.cl', f'filtrada{n}', f'203.0.113.{n % options["ips_ataque"]}')
+            with lock:
+                estados_ataque.append(estado)
+
+        # Las peticiones entran a una cola común al ritmo indicado, como en un servidor con pocos workers.
+        executor = ThreadPoolExecutor(options['trabajadores'])
+        inicio = time.perf_counter()
+        enviadas_legitimas = enviadas_ataque = 0
+        while (ahora := time.perf_counter()) - inicio < options['duracion']:
+            transcurrido = ahora - inicio
+            while enviadas_legitimas < transcurrido * options['ritmo_legitimo']:
+                executor.submit(legitima, enviadas_legitimas, time.perf_counter())
+                enviadas_legitimas += 1
+            while ataque and enviadas_ataque < transcurrido * options['ritmo_ataque']:
+                executor.submit(maliciosa, enviadas_ataque)
+                enviadas_ataque += 1
+            time.sleep(0.005)
+        executor.shutdown(wait=True, cancel_futures=True)
+        return legitimas, enviadas_legitimas, estados_ataque
+
+    def reportar(self, activo, ataque, resultado):
+        legitimas, enviadas, estados_ataque = resultado
+        latencias = [latencia for latencia, estado in legitimas if estado == 200]
+        resumen = percentiles(latencias)
+        rechazados = sum(1 for estado in estados_ataque if estado == 429)
+        self.stdout.write(
+            f"{'sí' if activo else 'no':<10}{'sí' if ataque else 'no':<8}{resumen['p50'] * 1000:>10.1f}{resumen['p99'] * 1000:>10.1f}"
+            f"{len(latencias):>6}{enviadas - len(legitimas):>13}{f'{rechazados}/{len(estados_ataque) - rechazados}':>18}"
+        )
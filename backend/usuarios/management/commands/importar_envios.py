@@ -0,0 +1,32 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework import serializers
+
+from inventario.envios import importar_envios
+from inventario.importacion import formato_de, leer_filas
+
+
+class Command(BaseCommand):
+    help = (
+        'Reemplaza la tabla de envíos desde dos CSV o JSONL: zonas (zona, pais, desde, hasta; sin desde/hasta '
+        'cubre todo el país) y tarifas (zona, peso_hasta en kilos, precio). Si hay errores no cambia nada.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('zonas')
+        parser.add_argument('tarifas')
+        parser.add_argument('--formato', choices=['csv', 'jsonl'])
+
+    def handle(self, *args, **options):
+        with open(options['zonas'], 'rb') as zonas, open(options['tarifas'], 'rb') as tarifas:
+            try:
+                formatos = formato_de(zonas, options['formato']), formato_de(tarifas, options['formato'])
+            except serializers.ValidationError as e:
+                raise CommandError(e.detail['formato'][0])
+            resultado = importar_envios(leer_filas(zonas, formatos[0]), leer_filas(tarifas, formatos[1]))
+        for error in resultado['errores'][:20]:
+            self.stderr.write(f"{error['archivo']} fila {error['fila']}: {json.dumps(error['errores'], ensure_ascii=False)}")
+        if resultado['errores']:
+            raise CommandError(f"{len(resultado['errores'])} filas con errores; no se importó nada")
+        self.stdout.write(f"{resultado['zonas']} rangos postales y {resultado['tarifas']} tarifas importados")
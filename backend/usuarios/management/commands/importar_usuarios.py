@@ -0,0 +1,37 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework import serializers
+
+from inventario.importacion import formato_de, leer_filas
+from usuarios.importacion import importar_usuarios
+
+
+class Command(BaseCommand):
+    help = (
+        'Importa usuarios desde un CSV o JSONL (email, password, nombre, apellido, rol). Las contraseñas '
+        'en texto plano se hashean en paralelo; las que ya vienen en formato de Django se guardan tal cual.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo')
+        parser.add_argument('--formato', choices=['csv', 'jsonl'])
+        parser.add_argument('--lote', type=int, default=settings.USUARIOS_LOTE_IMPORTACION)
+        parser.add_argument('--procesos', type=int, default=settings.USUARIOS_PROCESOS_HASH)
+        parser.add_argument('--errores', help='Ruta donde guardar el reporte de errores por fila en JSON.')
+
+    def handle(self, *args, **options):
+        with open(options['archivo'], 'rb') as archivo:
+            try:
+                formato = formato_de(archivo, options['formato'])
+            except serializers.ValidationError as e:
+                raise CommandError(e.detail['formato'][0])
+            resultado = importar_usuarios(leer_filas(archivo, formato), options['lote'], options['procesos'])
+        self.stdout.write(f"{resultado['creados']} usuarios creados, {len(resultado['errores'])} filas con errores")
+        if options['errores']:
+            with open(options['errores'], 'w') as salida:
+                json.dump(resultado['errores'], salida, indent=2, ensure_ascii=False)
+        else:
+            for error in resultado['errores'][:20]:
+                self.stderr.write(f"fila {error['fila']}: {json.dumps(error['errores'], ensure_ascii=False)}")
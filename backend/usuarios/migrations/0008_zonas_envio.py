@@ -0,0 +1,39 @@
+# Generated by Django 5.1.7 on 2026-10-18 19:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0007_alter_usuario_apellido_alter_usuario_nombre'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RangoPostal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('zona', models.CharField(max_length=100)),
+                ('pais', models.CharField(max_length=255)),
+                ('desde', models.PositiveIntegerField(blank=True, null=True)),
+                ('hasta', models.PositiveIntegerField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'rangos_postales',
+            },
+        ),
+        migrations.CreateModel(
+            name='TarifaEnvio',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('zona', models.CharField(max_length=100)),
+                ('peso_hasta', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('precio', models.DecimalField(decimal_places=2, max_digits=20)),
+            ],
+            options={
+                'db_table': 'tarifas_envio',
+                'constraints': [models.UniqueConstraint(fields=('zona', 'peso_hasta'), name='tarifas_envio_unica')],
+            },
+        ),
+    ]
@@ -38,3 +38,33 @@ class Direccion(models.Model):
 
     def __str__(self):
         return f"{self.direccion}, {self.ciudad}, {self.pais}, {self.codigo_postal}"
+
+
+class RangoPostal(models.Model):
+    """Códigos postales de un país que pertenecen a una zona de envío; sin rango cubre el país entero."""
+    zona = models.CharField(max_length=100)
+    pais = models.CharField(max_length=255)
+    desde = models.PositiveIntegerField(null=True, blank=True)
+    hasta = models.PositiveIntegerField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'rangos_postales'
+
+    def __str__(self):
+        return f"{self.zona}: {self.pais} {self.desde}-{self.hasta}"
+
+
+class TarifaEnvio(models.Model):
+    """Precio del envío a una zona para pedidos de hasta `peso_hasta` kilos."""
+    zona = models.CharField(max_length=100)
+    peso_hasta = models.DecimalField(max_digits=10, decimal_places=2)
+    precio = models.DecimalField(max_digits=20, decimal_places=2)
+
+    class Meta:
+        db_table = 'tarifas_envio'
+        constraints = [
+            models.UniqueConstraint(fields=['zona', 'peso_hasta'], name='tarifas_envio_unica'),
+        ]
+
+    def __str__(self):
+        return f"{self.zona} hasta {self.peso_hasta} kg: {self.precio}"
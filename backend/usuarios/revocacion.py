@@ -0,0 +1,134 @@
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework_simplejwt.settings import api_settings
+
+CLAVE_VERSION = 'revocacion:version'
+
+
+class FiltroBloom:
+    def __init__(self, bits, hashes):
+        self.bits = bits
+        self.hashes = hashes
+        self.arreglo = bytearray(bits // 8 + 1)
+
+    def posiciones(self, valor):
+        digest = hashlib.blake2b(valor.encode(), digest_size=16).digest()
+        # Doble hashing: k posiciones a partir de dos hashes de 64 bits.
+        h1, h2 = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.bits for i in range(self.hashes)]
+
+    def agregar(self, valor):
+        for posicion in self.posiciones(valor):
+            self.arreglo[posicion >> 3] |= 1 << (posicion & 7)
+
+    def __contains__(self, valor):
+        return all(self.arreglo[posicion >> 3] & (1 << (posicion & 7)) for posicion in self.posiciones(valor))
+
+
+class ListaRevocacion:
+    """Denylist de JWT por jti y corte por usuario, en la cache compartida.
+
+    Cada proceso mantiene un filtro de Bloom con lo revocado: si el token no aparece en él
+    (el caso normal) no se consulta la cache. Las revocaciones se publican como eventos
+    numerados; los demás procesos los incorporan al ver que subió la versión, como mucho
+    una vez por REFRESCO segundos. Todo vence con la vida del token, así que la lista se poda sola.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reiniciar()
+
+    @property
+    def config(self):
+        return settings.TOKENS_REVOCADOS
+
+    @property
+    def cache(self):
+        return caches[self.config['ALIAS']]
+
+    def reiniciar(self):
+        with self.lock:
+            self.filtro = FiltroBloom(self.config['BLOOM_BITS'], self.config['BLOOM_HASHES'])
+            self.version = 0
+            self.base = 1
+            self.sincronizado = 0.0
+            self.proxima_poda = time.monotonic() + self.config['PODA']
+
+    def revocar(self, token):
+        """Revoca un token puntual (logout, refresh rotado) hasta que expire."""
+        restante = int(token['exp'] - time.time()) + 1
+        if restante > 0:
+            self.cache.set(f"revocacion:jti:{token['jti']}", 1, restante)
+            self.publicar(f"jti:{token['jti']}", restante)
+
+    def revocar_usuario(self, usuario_id):
+        """Invalida todos los tokens del usuario emitidos hasta ahora (cambio de clave, desactivación)."""
+        vida = int(api_settings.REFRESH_TOKEN_LIFETIME.total_seconds()) + 1
+        self.cache.set(f'revocacion:usuario:{usuario_id}', time.time(), vida)
+        self.publicar(f'usuario:{usuario_id}', vida)
+
+    def publicar(self, clave, restante):
+        self.cache.add(CLAVE_VERSION, 0, None)
+        # El evento se escribe antes de subir la versión: quien vea la versión nueva ya lo encuentra.
+        # add reserva el primer número libre; si otro proceso lo tomó, se prueba el siguiente.
+        numero = self.cache.get(CLAVE_VERSION, 0) + 1
+        while not self.cache.add(f'revocacion:evento:{numero}', clave, restante):
+            numero += 1
+        self.cache.incr(CLAVE_VERSION)
+        with self.lock:
+            self.filtro.agregar(clave)
+        # El proceso que revoca lo ve de inmediato, sin esperar el próximo refresco.
+        self.sincronizado = 0.0
+
+    def sincronizar(self):
+        ahora = time.monotonic()
+        if ahora - self.sincronizado < self.config['REFRESCO']:
+            return
+        self.sincronizado = ahora
+        version = self.cache.get(CLAVE_VERSION, 0)
+        with self.lock:
+            if version < self.version:
+                # La cache se vació o reinició: se reconstruye desde cero.
+                self.version, self.base = 0, 1
+            if ahora >= self.proxima_poda:
+                self.podar(version)
+            elif version > self.version:
+                for clave in self.eventos(self.version + 1, version).values():
+                    self.filtro.agregar(clave)
+            self.version = version
+
+    def eventos(self, desde, hasta):
+        claves = [f'revocacion:evento:{n}' for n in range(desde, hasta + 1)]
+        return {int(clave.rsplit(':', 1)[1]): valor for clave, valor in self.cache.get_many(claves).items()}
+
+    def podar(self, version):
+        # Un Bloom no admite borrados: se reconstruye sólo con los eventos que no han vencido.
+        vigentes = self.eventos(self.base, version)
+        self.filtro = FiltroBloom(self.config['BLOOM_BITS'], self.config['BLOOM_HASHES'])
+        for clave in vigentes.values():
+            self.filtro.agregar(clave)
+        self.base = min(vigentes, default=version + 1)
+        self.proxima_poda = time.monotonic() + self.config['PODA']
+
+    def esta_revocado(self, token):
+        self.sincronizar()
+        claves = [f"jti:{token['jti']}"]
+        usuario_id = token.get(api_settings.USER_ID_CLAIM)
+        if usuario_id is not None:
+            claves.append(f'usuario:{usuario_id}')
+        if not any(clave in self.filtro for clave in claves):
+            return False
+        encontrados = self.cache.get_many([f'revocacion:{clave}' for clave in claves])
+        if f"revocacion:jti:{token['jti']}" in encontrados:
+            return True
+        corte = encontrados.get(f'revocacion:usuario:{usuario_id}')
+        # "emitido" es el instante del login con precisión sub-segundo; los access derivados de un
+        # refresh lo heredan, así que también caen los emitidos desde una sesión anterior al corte.
+        return corte is not None and token.get('emitido', token.get('iat', 0)) < corte
+
+
+lista_revocacion = ListaRevocacion()
@@ -1,6 +1,13 @@
+import time
+from decimal import Decimal
+
 from rest_framework import serializers
 from .models import Usuario
 from django.contrib.auth import authenticate
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from .revocacion import lista_revocacion
 
 class UsuarioSerializer(serializers.ModelSerializer):
     class Meta:
@@ -20,6 +27,45 @@ class UsuarioSerializer(serializers.ModelSerializer):
         )
         return user
 
+    def update(self, instance, validated_data):
+        password = validated_data.pop('password', None)
+        if password:
+            instance.set_password(password)
+        return super().update(instance, validated_data)
+
+class UsuarioImportacionSerializer(serializers.Serializer):
+    # Serializer plano: la unicidad del email se valida por lote, no con una consulta por fila.
+    email = serializers.EmailField(max_length=255)
+    password = serializers.CharField(max_length=128, trim_whitespace=False)
+    nombre = serializers.CharField(max_length=100, required=False, allow_blank=True, allow_null=True)
+    apellido = serializers.CharField(max_length=100, required=False, allow_blank=True, allow_null=True)
+    rol = serializers.ChoiceField(choices=Usuario.ROLE_CHOICES, default='cliente')
+
+    def validate_email(self, value):
+        return Usuario.objects.normalize_email(value)
+
+class RangoPostalImportacionSerializer(serializers.Serializer):
+    zona = serializers.CharField(max_length=100)
+    pais = serializers.CharField(max_length=255)
+    desde = serializers.IntegerField(min_value=0, required=False, allow_null=True)
+    hasta = serializers.IntegerField(min_value=0, required=False, allow_null=True)
+
+    def validate(self, data):
+        desde, hasta = data.get('desde'), data.get('hasta')
+        if (desde is None) != (hasta is None):
+            raise serializers.ValidationError('Indique desde y hasta, o ninguno para cubrir todo el país')
+        if desde is not None and desde > hasta:
+            raise serializers.ValidationError('desde no puede ser mayor que hasta')
+        return data
+
+class TarifaEnvioImportacionSerializer(serializers.Serializer):
+    zona = serializers.CharField(max_length=100)
+    peso_hasta = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal('0'))
+    precio = serializers.DecimalField(max_digits=20, decimal_places=2, min_value=Decimal('0'))
+
+class CotizacionEnvioSerializer(serializers.Serializer):
+    peso = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal('0'))
+
 class LoginSerializer(serializers.Serializer):
     email = serializers.EmailField()
     password = serializers.CharField(write_only=True)
@@ -28,4 +74,23 @@ class LoginSerializer(serializers.Serializer):
         user = authenticate(username=data['email'], password=data['password'])
         if not user:
             raise serializers.ValidationError('Credenciales inválidas')
-        return user
\ No newline at end of file
+        return user
+
+class TokenRolSerializer(TokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        token['rol'] = user.rol
+        token['emitido'] = round(time.time(), 3)
+        return token
+
+class TokenRefreshRevocableSerializer(TokenRefreshSerializer):
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        if lista_revocacion.esta_revocado(refresh):
+            raise InvalidToken('El token fue revocado')
+        data = super().validate(attrs)
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            # El refresh anterior queda inutilizable en cuanto se entrega el nuevo.
+            lista_revocacion.revocar(refresh)
+        return data
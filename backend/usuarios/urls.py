@@ -1,7 +1,7 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import UsuarioRegisterViewSet, UsuarioAdminViewSet, EditarPerfil
-from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+from .views import UsuarioRegisterViewSet, UsuarioAdminViewSet, EditarPerfil, EnviosView, Login, Logout
+from rest_framework_simplejwt.views import TokenRefreshView
 
 router = DefaultRouter()
 router.register(r'register', UsuarioRegisterViewSet, basename='register')
@@ -9,7 +9,9 @@ router.register(r'usuarios', UsuarioAdminViewSet, basename='usuarios-admin')
 
 urlpatterns = [
     path('', include(router.urls)),
-    path('login/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
+    path('login/', Login.as_view(), name='token_obtain_pair'),
+    path('logout/', Logout.as_view(), name='logout'),
     path('perfil/', EditarPerfil.as_view(), name='perfil'),
+    path('perfil/envios/', EnviosView.as_view(), name='perfil-envios'),
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
 ]
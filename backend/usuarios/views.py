@@ -1,13 +1,25 @@
 from rest_framework import viewsets, status, mixins
+from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.authentication import SessionAuthentication
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from django.conf import settings
 from django.contrib.auth import authenticate, login
-from .serializers import UsuarioSerializer, LoginSerializer
+from inventario.envios import cotizar_usuario
+from inventario.importacion import formato_de, leer_filas
+from .authentication import JWTRevocableUsuarioAuthentication, BasicAuthenticationLimitada
+from .importacion import importar_usuarios
+from .limites import limitador
+from .revocacion import lista_revocacion
+from .serializers import UsuarioSerializer, LoginSerializer, CotizacionEnvioSerializer
 from .models import Usuario
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from .permissions import IsAdminUser, IsClienteUser
-from rest_framework.exceptions import ValidationError
+from rest_framework.exceptions import AuthenticationFailed, ValidationError
 
 
 class UsuarioRegisterViewSet(mixins.CreateModelMixin, viewsets.GenericViewSet):
@@ -16,10 +28,13 @@ class UsuarioRegisterViewSet(mixins.CreateModelMixin, viewsets.GenericViewSet):
     permission_classes = [AllowAny]
 
     def create(self, request, *args, **kwargs):
+        # Crear el usuario calcula el hash de la clave: se limita por IP antes de validar.
+        limitador.verificar_registro(request)
         serializer = self.get_serializer(data=request.data)
         if serializer.is_valid():
             try:
                 user = serializer.save()
+                limitador.olvidar(user.email, serializer.validated_data['password'])
                 if user.rol == 'admin':
                     user.is_superuser = True
                     user.is_staff = True
@@ -39,6 +54,27 @@ class UsuarioAdminViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
     serializer_class = UsuarioSerializer
     permission_classes = [IsAuthenticated, IsAdminUser]
 
+    @action(detail=False, methods=['post'])
+    def importar(self, request):
+        archivo = request.FILES.get('archivo')
+        if not archivo:
+            return Response({'detail': 'Debe adjuntar un archivo'}, status=status.HTTP_400_BAD_REQUEST)
+        formato = formato_de(archivo, request.query_params.get('formato'))
+        # Se hashea en este proceso y con cupo: el pool de procesos queda para el comando importar_usuarios.
+        resultado = importar_usuarios(
+            leer_filas(archivo, formato), settings.USUARIOS_LOTE_IMPORTACION, procesos=1,
+            max_claves=settings.USUARIOS_MAX_CLAVES_HTTP,
+        )
+        return Response(resultado)
+
+    @action(detail=True, methods=['post'])
+    def desactivar(self, request, pk=None):
+        usuario = self.get_object()
+        usuario.is_active = False
+        usuario.save(update_fields=['is_active'])
+        lista_revocacion.revocar_usuario(usuario.id)
+        return Response({'message': 'Usuario desactivado'}, status=status.HTTP_200_OK)
+
 class LoginViewSet(viewsets.ViewSet):
     permission_classes = [IsAdminUser]
 
@@ -56,6 +92,8 @@ class LoginViewSet(viewsets.ViewSet):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 class EditarPerfil(APIView):
+    # Necesita el Usuario completo para editarlo, así que usa la autenticación JWT con consulta.
+    authentication_classes = [SessionAuthentication, BasicAuthenticationLimitada, JWTRevocableUsuarioAuthentication]
     permission_classes = [IsAuthenticated]
 
     def put(self, request, *args, **kwargs):
@@ -64,6 +102,45 @@ class EditarPerfil(APIView):
 
         if serializer.is_valid():
             serializer.save()
+            if 'password' in serializer.validated_data:
+                # Las sesiones abiertas con la clave anterior dejan de valer.
+                lista_revocacion.revocar_usuario(user.id)
+                limitador.olvidar(user.email, serializer.validated_data['password'])
             return Response({'message': 'Perfil actualizado correctamente', 'user': serializer.data}, status=status.HTTP_200_OK)
         
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+class EnviosView(APIView):
+    """Costo de enviar `peso` kilos a cada dirección guardada del usuario."""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        serializer = CotizacionEnvioSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        return Response(cotizar_usuario(request.user.id, serializer.validated_data['peso']))
+
+class Login(TokenObtainPairView):
+    def post(self, request, *args, **kwargs):
+        email, password = str(request.data.get('email', '')), str(request.data.get('password', ''))
+        limitador.verificar(request, email, password)
+        try:
+            return super().post(request, *args, **kwargs)
+        except AuthenticationFailed:
+            limitador.fallo(request, email, password)
+            raise
+
+class Logout(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        if request.auth is not None and 'jti' in request.auth:
+            lista_revocacion.revocar(request.auth)
+        if request.data.get('refresh'):
+            try:
+                refresh = RefreshToken(request.data['refresh'])
+            except TokenError as e:
+                return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            if str(refresh.get(api_settings.USER_ID_CLAIM)) != str(request.user.id):
+                return Response({'detail': 'El refresh no pertenece al usuario'}, status=status.HTTP_400_BAD_REQUEST)
+            lista_revocacion.revocar(refresh)
+        return Response({'message': 'Sesión cerrada'}, status=status.HTTP_200_OK)